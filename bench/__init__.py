@@ -0,0 +1 @@
+"""Benchmarks and load-testing tools for ProductAI (run from the repo root)."""
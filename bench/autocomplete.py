@@ -0,0 +1,125 @@
+"""Benchmark autocomplete: index load time and per-keystroke lookup latency.
+
+Compares compiling the index from the word corpora, mapping a prebuilt index
+file, and query latency with and without the precomputed per-prefix top-k
+table (without it, every matching word is scored per query). Typo-tolerant
+lookups are measured on the same keystrokes with one random edit each, along
+with the build time and heap footprint of the fuzzy lookup table.
+
+    uv run python -m bench.autocomplete --queries 20000
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from productai.ai import autocomplete as ac
+from productai.ai import fuzzy
+from productai.ai.wordindex import WordIndex, encode, write
+
+CONTEXTS = [None, "the", "should", "user", "key"]
+
+
+def keystrokes(words: list[str], n: int, rng: random.Random) -> list[tuple[str, str | None]]:
+    """Prefixes as typed: 2..6 characters of random words, with random contexts."""
+    out = []
+    while len(out) < n:
+        word = rng.choice(words)
+        for end in range(2, min(len(word), 6) + 1):
+            out.append((word[:end], rng.choice(CONTEXTS)))
+    return out[:n]
+
+
+def with_typo(prefix: str, rng: random.Random) -> str:
+    """``prefix`` with one random substitution, insertion, deletion or transposition."""
+    i = rng.randrange(len(prefix))
+    letter = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    edit = rng.choice("sidt")
+    if edit == "s":
+        return prefix[:i] + letter + prefix[i + 1:]
+    if edit == "i":
+        return prefix[:i] + letter + prefix[i:]
+    if edit == "d" and len(prefix) > fuzzy.MIN_LENGTH:
+        return prefix[:i] + prefix[i + 1:]
+    if i + 1 < len(prefix):
+        return prefix[:i] + prefix[i + 1] + prefix[i] + prefix[i + 2:]
+    return prefix + letter
+
+
+def fuzzy_footprint(index: WordIndex) -> dict:
+    tracemalloc.start()
+    start = time.perf_counter()
+    table = fuzzy.FuzzyIndex(index)
+    build_s = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"build_s": round(build_s, 3), "heap_bytes": size,
+            "keys": len(table.keys), "delete_entries": len(table.deletes)}
+
+
+def run_queries(index: WordIndex, queries, limit: int) -> dict:
+    original = ac._get_index
+    ac._get_index = lambda: index
+    try:
+        timings = []
+        for prefix, context in queries:
+            start = time.perf_counter()
+            ac.get_suggestions(prefix, context, limit)
+            timings.append(time.perf_counter() - start)
+    finally:
+        ac._get_index = original
+    timings.sort()
+    pick = lambda p: round(timings[min(len(timings) - 1, int(len(timings) * p))] * 1e6, 1)
+    return {"p50_us": pick(0.50), "p99_us": pick(0.99), "max_us": round(timings[-1] * 1e6, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    start = time.perf_counter()
+    words, scores = ac.compile_index()
+    compile_s = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "autocomplete.idx")
+        write(path, words, scores)
+        start = time.perf_counter()
+        mapped = WordIndex.open(path)
+        open_s = time.perf_counter() - start
+
+        rng = random.Random(args.seed)
+        queries = keystrokes(words, args.queries, rng)
+        long_words = [w for w in words if len(w) >= 6]
+        typos = []
+        for _ in range(args.queries // 4):
+            word = rng.choice(long_words)
+            typos.append((with_typo(word[:rng.randint(fuzzy.MIN_LENGTH, min(len(word), 10))], rng),
+                          rng.choice(CONTEXTS)))
+        fuzzy_table = fuzzy_footprint(mapped)
+        fuzzy.for_index(mapped)
+        result = {
+            "words": len(words),
+            "index_bytes": os.path.getsize(path),
+            "compile_from_corpora_s": round(compile_s, 3),
+            "open_mapped_index_ms": round(open_s * 1000, 3),
+            "scan_every_match": run_queries(WordIndex(encode(words, scores, min_matches=len(words))),
+                                            queries, args.limit),
+            "precomputed_top_k": run_queries(mapped, queries, args.limit),
+            "fuzzy_table": fuzzy_table,
+            "typo_keystrokes": run_queries(mapped, typos, args.limit),
+        }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
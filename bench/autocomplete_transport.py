@@ -0,0 +1,130 @@
+"""Compare autocomplete over HTTP POST with the WebSocket channel.
+
+Runs against a live server and replays typing: every word of a sample text is
+typed letter by letter, one suggestion request per keystroke from the second
+letter on. Each transport sends the same keystrokes sequentially (POST over a
+keep-alive connection, WebSocket over one long-lived socket) and reports
+latency percentiles. With ``--server-pid`` it also reads the server's CPU time
+from ``/proc`` (Linux) and reports CPU per suggestion.
+
+    ./run.sh &
+    uv run python -m bench.autocomplete_transport --server-pid $(pgrep -f 'uvicorn productai') --rounds 20
+
+``--burst`` additionally sends keystrokes without waiting for answers over the
+socket and reports how many superseded requests the server dropped.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+import websockets
+
+from bench.loadtest import summarize
+
+SAMPLE_TEXT = (
+    "The product team should define acceptance criteria for every requirement "
+    "before the sprint review so stakeholders can validate the roadmap and "
+    "engineering can estimate delivery against the release timeline"
+)
+
+
+def keystrokes() -> list[tuple[str, str]]:
+    """``(prefix, context)`` for every keystroke typing ``SAMPLE_TEXT``."""
+    words = SAMPLE_TEXT.split()
+    out = []
+    for n, word in enumerate(words):
+        context = " ".join(words[max(0, n - 2):n])
+        out.extend((word[:end], context) for end in range(2, len(word) + 1))
+    return out
+
+
+def cpu_seconds(pid: int | None) -> float | None:
+    if pid is None:
+        return None
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def run_post(url: str, keys, rounds: int) -> list[float]:
+    latencies = []
+    async with httpx.AsyncClient(base_url=url) as client:
+        for _ in range(rounds):
+            for prefix, context in keys:
+                start = time.perf_counter()
+                resp = await client.post("/api/autocomplete/words",
+                                         json={"prefix": prefix, "context": context, "limit": 8})
+                resp.json()
+                latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def run_ws(url: str, keys, rounds: int) -> list[float]:
+    latencies = []
+    async with websockets.connect(url.replace("http", "ws", 1) + "/api/autocomplete/ws") as ws:
+        seq = 0
+        for _ in range(rounds):
+            for prefix, context in keys:
+                seq += 1
+                start = time.perf_counter()
+                await ws.send(json.dumps({"i": seq, "p": prefix, "c": context, "l": 8}))
+                json.loads(await ws.recv())
+                latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def run_burst(url: str, keys) -> dict:
+    """Send every keystroke of each word back to back; count answered vs dropped."""
+    answered = 0
+    async with websockets.connect(url.replace("http", "ws", 1) + "/api/autocomplete/ws") as ws:
+        seq = 0
+        words = {}
+        for prefix, context in keys:
+            words.setdefault(context, []).append(prefix)
+        for context, prefixes in words.items():
+            for prefix in prefixes:
+                seq += 1
+                await ws.send(json.dumps({"i": seq, "p": prefix, "c": context, "l": 8}))
+            while True:  # drain until the last keystroke of the word is answered
+                reply = json.loads(await ws.recv())
+                answered += 1
+                if reply["i"] == seq:
+                    break
+    return {"sent": seq, "answered": answered, "dropped_superseded": seq - answered}
+
+
+async def measure(name: str, coro, pid: int | None, count: int) -> dict:
+    cpu_before = cpu_seconds(pid)
+    latencies = await coro
+    result = {"transport": name, "requests": count, "latency_ms": summarize(latencies)}
+    if pid is not None:
+        result["server_cpu_us_per_suggestion"] = round((cpu_seconds(pid) - cpu_before) / count * 1e6, 1)
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--rounds", type=int, default=10, help="times to replay the sample text")
+    parser.add_argument("--server-pid", type=int, help="read server CPU time from /proc")
+    parser.add_argument("--burst", action="store_true", help="also measure superseded-request dropping")
+    args = parser.parse_args()
+
+    keys = keystrokes()
+    count = len(keys) * args.rounds
+    await run_post(args.url, keys[:20], 1)  # warm up the index and connections
+    results = [
+        await measure("post", run_post(args.url, keys, args.rounds), args.server_pid, count),
+        await measure("websocket", run_ws(args.url, keys, args.rounds), args.server_pid, count),
+    ]
+    if args.burst:
+        results.append({"transport": "websocket-burst", **await run_burst(args.url, keys)})
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
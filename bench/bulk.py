@@ -0,0 +1,82 @@
+"""Compare PRD import throughput: one form POST per PRD vs the bulk JSON API.
+
+Runs against a live server and creates ``--count`` PRDs each way (the form
+endpoint answers every create with a redirect; the bulk endpoint takes
+``--batch-size`` items per request), then updates and deletes the bulk-created
+ones in batches. Reports items per second for each phase.
+
+    ./run.sh &
+    uv run python -m bench.bulk --count 2000 --batch-size 500
+
+The PRDs are deleted again at the end; run it against a scratch database.
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import time
+
+import httpx
+
+OVERVIEW = "Stakeholders need a faster way to review requirements before the sprint planning meeting."
+
+
+async def form_creates(client: httpx.AsyncClient, count: int) -> tuple[float, list[int]]:
+    ids = []
+    start = time.perf_counter()
+    for i in range(count):
+        resp = await client.post("/api/prds", data={"title": f"Form PRD {i}"})
+        match = re.search(r"/prds/(\d+)", resp.headers.get("location", ""))
+        if not match:
+            raise SystemExit(f"Form create failed: HTTP {resp.status_code}")
+        ids.append(int(match.group(1)))
+    return time.perf_counter() - start, ids
+
+
+async def bulk(client: httpx.AsyncClient, items: list[dict], batch_size: int) -> tuple[float, list[dict]]:
+    results = []
+    start = time.perf_counter()
+    for offset in range(0, len(items), batch_size):
+        resp = await client.post("/api/bulk/prds", json={"items": items[offset:offset + batch_size]})
+        resp.raise_for_status()
+        results.extend(resp.json()["results"])
+    failed = [r for r in results if not r["ok"]]
+    if failed:
+        raise SystemExit(f"{len(failed)} bulk items failed, e.g. {failed[0]}")
+    return time.perf_counter() - start, results
+
+
+def rate(count: int, seconds: float) -> dict:
+    return {"items": count, "seconds": round(seconds, 3), "items_per_s": round(count / seconds, 1)}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=120) as client:
+        form_s, form_ids = await form_creates(client, args.count)
+        creates = [{"op": "create", "fields": {"title": f"Bulk PRD {i}", "overview": OVERVIEW,
+                                               "user_stories": ["As a PM I want bulk imports"]}}
+                   for i in range(args.count)]
+        create_s, created = await bulk(client, creates, args.batch_size)
+        ids = [r["id"] for r in created]
+        update_s, _ = await bulk(client, [{"op": "update", "id": i, "fields": {"status": "review"}} for i in ids],
+                                 args.batch_size)
+        delete_s, _ = await bulk(client, [{"op": "delete", "id": i} for i in ids + form_ids], args.batch_size)
+
+    print(json.dumps({
+        "form_post_create": rate(args.count, form_s),
+        "bulk_create": rate(args.count, create_s),
+        "bulk_update": rate(args.count, update_s),
+        "bulk_delete": rate(len(ids) + len(form_ids), delete_s),
+        "create_speedup": round(form_s / create_s, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
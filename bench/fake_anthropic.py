@@ -0,0 +1,228 @@
+"""Local stand-in for the Anthropic Messages API.
+
+Serves ``POST /v1/messages`` in both streaming (SSE) and non-streaming form
+with configurable time-to-first-token, output rate, error and 429 injection,
+and prompt-cache accounting, so ``ai/service.py`` and the SSE routes can be
+load-tested offline and for free. Point the app at it with::
+
+    uv run python -m bench.fake_anthropic --port 8300 --ttft-ms 400 --tps 80
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8300 ANTHROPIC_API_KEY=fake ./run.sh
+
+Prompt caching follows the real API's rules closely enough for accounting: the
+prefix up to the last block marked ``cache_control`` is written to the cache on
+first use and read from it for ``--cache-ttl`` seconds afterwards. ``GET /stats``
+returns counters for everything the server has done.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+VOCABULARY = (
+    "the product team should prioritize onboarding metrics for enterprise users "
+    "while the roadmap keeps scope aligned with stakeholder goals and measurable "
+    "outcomes across every release milestone in the quarter"
+).split()
+
+
+@dataclass
+class FakeConfig:
+    ttft_ms: float = 400.0
+    ttft_jitter_ms: float = 100.0
+    tokens_per_second: float = 80.0
+    min_tokens: int = 80
+    max_tokens: int = 400
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: int = 1
+    cache_ttl: float = 300.0
+
+
+def _count_tokens(value) -> int:
+    """Rough token estimate (4 characters per token) over strings and content blocks."""
+    if isinstance(value, str):
+        return max(1, len(value) // 4) if value else 0
+    if isinstance(value, list):
+        return sum(_count_tokens(v) for v in value)
+    if isinstance(value, dict):
+        return _count_tokens(value.get("text") or value.get("content") or "")
+    return 0
+
+
+def _cache_prefix(body: dict) -> tuple[str | None, int]:
+    """Hash and size of the prompt prefix ending at the last ``cache_control`` block."""
+    blocks: list = []
+    system = body.get("system")
+    blocks.extend(system if isinstance(system, list) else [{"type": "text", "text": system or ""}])
+    for message in body.get("messages", []):
+        content = message.get("content")
+        blocks.extend(content if isinstance(content, list) else [{"type": "text", "text": content or ""}])
+    last = max((i for i, b in enumerate(blocks) if isinstance(b, dict) and b.get("cache_control")), default=-1)
+    if last < 0:
+        return None, 0
+    prefix = blocks[: last + 1]
+    digest = hashlib.sha256(json.dumps(prefix, sort_keys=True).encode()).hexdigest()
+    return digest, _count_tokens(prefix)
+
+
+def create_app(config: FakeConfig) -> FastAPI:
+    app = FastAPI(title="Fake Anthropic Messages API")
+    cache: dict[str, float] = {}
+    stats: Counter = Counter()
+
+    def usage_for(body: dict) -> dict:
+        input_tokens = _count_tokens(body.get("system")) + sum(
+            _count_tokens(m.get("content")) for m in body.get("messages", [])
+        )
+        digest, cached = _cache_prefix(body)
+        created = read = 0
+        if digest:
+            now = time.monotonic()
+            if cache.get(digest, 0) > now:
+                read = cached
+            else:
+                created = cached
+            cache[digest] = now + config.cache_ttl
+        stats["input_tokens"] += input_tokens - created - read
+        stats["cache_creation_input_tokens"] += created
+        stats["cache_read_input_tokens"] += read
+        return {
+            "input_tokens": input_tokens - created - read,
+            "cache_creation_input_tokens": created,
+            "cache_read_input_tokens": read,
+        }
+
+    def injected_failure() -> JSONResponse | None:
+        roll = random.random()
+        if roll < config.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                {"type": "error", "error": {"type": "rate_limit_error", "message": "Fake rate limit"}},
+                status_code=429,
+                headers={"retry-after": str(config.retry_after)},
+            )
+        if roll < config.rate_limit_rate + config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse(
+                {"type": "error", "error": {"type": "api_error", "message": "Fake internal error"}},
+                status_code=500,
+            )
+        return None
+
+    def completion_tokens(body: dict) -> list[str]:
+        n = random.randint(config.min_tokens, config.max_tokens)
+        n = min(n, int(body.get("max_tokens") or n))
+        return [random.choice(VOCABULARY) + " " for _ in range(n)]
+
+    async def first_token_delay():
+        delay = config.ttft_ms + random.uniform(-config.ttft_jitter_ms, config.ttft_jitter_ms)
+        await asyncio.sleep(max(0.0, delay) / 1000)
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        failure = injected_failure()
+        if failure is not None:
+            return failure
+        usage = usage_for(body)
+        tokens = completion_tokens(body)
+        stats["output_tokens"] += len(tokens)
+        message_id = f"msg_fake_{uuid.uuid4().hex[:20]}"
+        model = body.get("model", "claude-fake")
+
+        if not body.get("stream"):
+            await first_token_delay()
+            await asyncio.sleep(len(tokens) / config.tokens_per_second)
+            return {
+                "id": message_id,
+                "type": "message",
+                "role": "assistant",
+                "model": model,
+                "content": [{"type": "text", "text": "".join(tokens)}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": {**usage, "output_tokens": len(tokens)},
+            }
+
+        def event(name: str, data: dict) -> str:
+            return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+        async def stream():
+            stats["streams"] += 1
+            yield event("message_start", {"type": "message_start", "message": {
+                "id": message_id, "type": "message", "role": "assistant", "model": model,
+                "content": [], "stop_reason": None, "stop_sequence": None,
+                "usage": {**usage, "output_tokens": 1},
+            }})
+            yield event("content_block_start", {
+                "type": "content_block_start", "index": 0,
+                "content_block": {"type": "text", "text": ""},
+            })
+            await first_token_delay()
+            interval = 1 / config.tokens_per_second
+            for token in tokens:
+                yield event("content_block_delta", {
+                    "type": "content_block_delta", "index": 0,
+                    "delta": {"type": "text_delta", "text": token},
+                })
+                await asyncio.sleep(interval)
+            yield event("content_block_stop", {"type": "content_block_stop", "index": 0})
+            yield event("message_delta", {
+                "type": "message_delta",
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": len(tokens)},
+            })
+            yield event("message_stop", {"type": "message_stop"})
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def get_stats():
+        return dict(stats)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Anthropic Messages API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8300)
+    parser.add_argument("--ttft-ms", type=float, default=FakeConfig.ttft_ms)
+    parser.add_argument("--ttft-jitter-ms", type=float, default=FakeConfig.ttft_jitter_ms)
+    parser.add_argument("--tps", type=float, default=FakeConfig.tokens_per_second, help="output tokens per second")
+    parser.add_argument("--min-tokens", type=int, default=FakeConfig.min_tokens)
+    parser.add_argument("--max-tokens", type=int, default=FakeConfig.max_tokens)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=FakeConfig.retry_after)
+    parser.add_argument("--cache-ttl", type=float, default=FakeConfig.cache_ttl)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    config = FakeConfig(
+        ttft_ms=args.ttft_ms,
+        ttft_jitter_ms=args.ttft_jitter_ms,
+        tokens_per_second=args.tps,
+        min_tokens=args.min_tokens,
+        max_tokens=args.max_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        cache_ttl=args.cache_ttl,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
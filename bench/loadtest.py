@@ -0,0 +1,170 @@
+"""Load-test the streaming AI endpoints at a target concurrency.
+
+Runs against a live server, normally one pointed at ``bench.fake_anthropic``::
+
+    uv run python -m bench.fake_anthropic --ttft-ms 400 --tps 80 &
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8300 ANTHROPIC_API_KEY=fake ./run.sh &
+    uv run python -m bench.loadtest --endpoint plan-chat --concurrency 16 --requests 200
+
+Each virtual user sends its own ``X-Forwarded-For`` so the scheduler's
+per-client caps apply per user rather than to the whole run. Reports time to
+first token, total latency (p50/p95/p99), token throughput and how many
+requests were queued, rejected with 429 or failed, as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import time
+
+import httpx
+
+ENDPOINTS = ("enhance", "enhance-selection", "enhance-batch", "plan-chat", "prd-generate", "prd-chat")
+
+SAMPLE_TEXT = (
+    "Users need a faster way to onboard their team. We should add bulk invites "
+    "and a checklist that tracks setup progress across the first week."
+)
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    """Nearest-rank percentile; ``None`` for an empty sample."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "p50": _ms(percentile(values, 50)),
+        "p95": _ms(percentile(values, 95)),
+        "p99": _ms(percentile(values, 99)),
+        "max": _ms(max(values) if values else None),
+    }
+
+
+def _ms(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+async def _create(client: httpx.AsyncClient, path: str, data: dict) -> int:
+    resp = await client.post(path, data=data)
+    match = re.search(r"/(\d+)(?:/edit)?$", resp.headers.get("location", ""))
+    if not match:
+        raise SystemExit(f"Could not create fixture via {path}: HTTP {resp.status_code}")
+    return int(match.group(1))
+
+
+async def fixtures(client: httpx.AsyncClient, args) -> dict:
+    """Plan/PRD ids for the chat endpoints, created on the fly unless given."""
+    ids = {"plan_id": args.plan_id, "prd_id": args.prd_id}
+    if args.endpoint == "plan-chat" and not ids["plan_id"]:
+        ids["plan_id"] = await _create(client, "/api/plans", {"title": "Load test plan"})
+    if args.endpoint in ("prd-chat", "prd-generate") and not ids["prd_id"]:
+        ids["prd_id"] = await _create(client, "/api/prds", {"title": "Load test PRD"})
+    return ids
+
+
+def build_request(endpoint: str, ids: dict) -> tuple[str, dict]:
+    if endpoint == "enhance":
+        return "/api/ai/enhance", {"text": SAMPLE_TEXT, "field_label": "Problem", "intensity": "medium"}
+    if endpoint == "enhance-selection":
+        return "/api/ai/enhance-selection", {
+            "full_text": SAMPLE_TEXT, "selected_text": SAMPLE_TEXT[:40],
+            "field_label": "Problem", "intensity": "light",
+        }
+    if endpoint == "enhance-batch":
+        fields = [{"name": f"f{i}", "label": f"Field {i}", "text": SAMPLE_TEXT} for i in range(4)]
+        return "/api/ai/enhance-batch", {"fields": json.dumps(fields), "intensity": "medium"}
+    if endpoint == "plan-chat":
+        return f"/api/ai/plan/{ids['plan_id']}/chat", {"message": "What should we build first?"}
+    if endpoint == "prd-generate":
+        return "/api/ai/prd/generate", {"context": SAMPLE_TEXT, "prd_id": str(ids["prd_id"])}
+    return f"/api/ai/prd/{ids['prd_id']}/chat", {"message": "Tighten the success metrics."}
+
+
+async def one_request(client: httpx.AsyncClient, path: str, data: dict, user: int) -> dict:
+    """Send one streaming request and time it from the client's point of view."""
+    result = {"status": None, "ttft": None, "total": None, "chars": 0, "queued": False, "error": None}
+    start = time.perf_counter()
+    try:
+        async with client.stream("POST", path, data=data,
+                                 headers={"X-Forwarded-For": f"10.0.{user // 256}.{user % 256}"}) as resp:
+            result["status"] = resp.status_code
+            if resp.status_code != 200:
+                await resp.aread()
+                return result
+            async for line in resp.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                event = json.loads(line[6:])
+                if "queued" in event:
+                    result["queued"] = True
+                token = event.get("token")
+                if token:
+                    if result["ttft"] is None:
+                        result["ttft"] = time.perf_counter() - start
+                    result["chars"] += len(token)
+                if event.get("error"):
+                    result["error"] = event["error"]
+                if event.get("done"):
+                    break
+    except httpx.HTTPError as exc:
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    finally:
+        result["total"] = time.perf_counter() - start
+    return result
+
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        ids = await fixtures(client, args)
+        path, data = build_request(args.endpoint, ids)
+        remaining = iter(range(args.requests))
+        results: list[dict] = []
+
+        async def user(n: int):
+            for _ in remaining:
+                results.append(await one_request(client, path, data, n))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user(n) for n in range(args.concurrency)))
+        wall = time.perf_counter() - start
+
+    ok = [r for r in results if r["status"] == 200 and not r["error"]]
+    return {
+        "endpoint": args.endpoint,
+        "concurrency": args.concurrency,
+        "requests": len(results),
+        "ok": len(ok),
+        "queued": sum(1 for r in results if r["queued"]),
+        "rejected_429": sum(1 for r in results if r["status"] == 429),
+        "failed": sum(1 for r in results if r["error"] or (r["status"] not in (200, 429))),
+        "wall_s": round(wall, 2),
+        "requests_per_s": round(len(ok) / wall, 2) if wall else None,
+        "chars_per_s": round(sum(r["chars"] for r in ok) / wall, 1) if wall else None,
+        "ttft_ms": summarize([r["ttft"] for r in ok if r["ttft"] is not None]),
+        "latency_ms": summarize([r["total"] for r in ok]),
+        "errors": sorted({r["error"] for r in results if r["error"]})[:5],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="plan-chat")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent virtual users")
+    parser.add_argument("--requests", type=int, default=100, help="total requests across all users")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--plan-id", type=int, help="existing plan for plan-chat (created if omitted)")
+    parser.add_argument("--prd-id", type=int, help="existing PRD for prd-chat/prd-generate (created if omitted)")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
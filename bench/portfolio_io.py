@@ -0,0 +1,95 @@
+"""Benchmark NDJSON export and import of the whole portfolio.
+
+Builds a synthetic portfolio in a scratch database with ``bench.seed``
+(projects, plans, PRDs with AI sessions and several versions each), exports
+it with versions, imports the file into a second scratch database, and
+reports rows per second, throughput and peak Python heap for both directions. Import time includes
+learning autocomplete n-grams from the imported documents, which dominates.
+
+    uv run python -m bench.portfolio_io --projects 100 --plans 5 --prds 10
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+
+from productai.db import models, schema
+
+from bench.seed import add_arguments, scale_from, seed
+
+
+async def export_to(path: str) -> tuple[float, int, int]:
+    rows = 0
+    start = time.perf_counter()
+    with open(path, "w") as f:
+        async for line in models.export_rows(include_versions=True):
+            f.write(json.dumps(line, separators=(",", ":")) + "\n")
+            rows += 1
+    return time.perf_counter() - start, rows, os.path.getsize(path)
+
+
+async def file_lines(path: str):
+    with open(path, "rb") as f:
+        for line in f:
+            yield line.rstrip(b"\n")
+
+
+async def peak_heap(coro) -> int:
+    tracemalloc.start()
+    try:
+        await coro
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measured(seconds: float, rows: int, size: int, peak: int) -> dict:
+    return {"rows": rows, "seconds": round(seconds, 3), "rows_per_s": round(rows / seconds),
+            "mb_per_s": round(size / seconds / 1e6, 1), "peak_heap_mb": round(peak / 1e6, 1)}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        schema.DB_PATH = os.path.join(tmp, "source.db")
+        await schema.init_db()
+        start = time.perf_counter()
+        await seed(scale_from(args))
+        generate_s = time.perf_counter() - start
+
+        # Timed runs first; tracing allocations slows Python down several
+        # times, so peak heap is measured in a second run of each.
+        path = os.path.join(tmp, "export.ndjson")
+        export_s, rows, size = await export_to(path)
+        export_peak = await peak_heap(export_to(os.path.join(tmp, "again.ndjson")))
+
+        schema.DB_PATH = os.path.join(tmp, "target.db")
+        await schema.init_db()
+        start = time.perf_counter()
+        result = await models.import_lines("bench", file_lines(path))
+        import_s = time.perf_counter() - start
+
+        schema.DB_PATH = os.path.join(tmp, "again.db")
+        await schema.init_db()
+        import_peak = await peak_heap(models.import_lines("bench", file_lines(path)))
+
+    print(json.dumps({
+        "generate_s": round(generate_s, 1),
+        "file_mb": round(size / 1e6, 1),
+        "export": measured(export_s, rows, size, export_peak),
+        "import": {**measured(import_s, sum(result["counts"].values()), size, import_peak),
+                   "status": result["status"], "counts": result["counts"]},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,193 @@
+"""Seed a database with a synthetic, reproducible portfolio.
+
+Projects with plans, plans with PRDs, every PRD saved ``--versions`` more
+times, and an AI chat session of ``--messages`` messages per plan and PRD.
+Text fields get realistic sizes (a PRD is a few thousand words across its
+sections). The same arguments and ``--seed`` always produce the same rows.
+
+    uv run python -m bench.seed --db /tmp/portfolio.db --projects 20 --plans 4 --prds 6
+
+Benchmarks import ``seed`` and ``Scale`` to build their scratch databases.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+from dataclasses import asdict, dataclass
+
+from productai.db import models, schema
+
+WORDS = (
+    "user onboarding checkout latency roadmap stakeholder requirement release "
+    "dashboard metric retention pricing integration workflow sprint review "
+    "search mobile billing export analytics permission notification customer "
+    "team account report should must support reduce improve increase the a "
+    "for with when during each every new existing admin api data flow page"
+).split()
+
+STATUSES = {
+    "project": ["planning", "active", "active", "on_hold", "completed"],
+    "plan": ["draft", "active", "active", "completed"],
+    "prd": ["draft", "draft", "review", "approved"],
+}
+PRIORITIES = ["low", "medium", "medium", "high", "critical"]
+
+
+@dataclass
+class Scale:
+    projects: int = 20
+    plans: int = 4  # per project
+    prds: int = 6  # per plan
+    versions: int = 3  # extra saves per PRD
+    messages: int = 12  # chat messages per plan and PRD session
+    seed: int = 1
+
+    @property
+    def rows(self) -> dict:
+        plans = self.projects * self.plans
+        prds = plans * self.prds
+        return {"projects": self.projects, "plans": plans, "prds": prds,
+                "versions": self.projects + plans + prds * (1 + self.versions),
+                "ai_sessions": plans + prds}
+
+
+def sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def paragraph(rng: random.Random, sentences: int) -> str:
+    return " ".join(sentence(rng, rng.randint(8, 24)) for _ in range(sentences))
+
+
+def document(rng: random.Random, sections: int) -> str:
+    """Markdown body with headed sections, like generated PRD content."""
+    return "\n\n".join(
+        f"## {sentence(rng, 3)[:-1]}\n\n{paragraph(rng, rng.randint(3, 6))}" for _ in range(sections)
+    )
+
+
+def items(rng: random.Random, n: int, words: int) -> list[str]:
+    return [sentence(rng, rng.randint(words // 2, words)) for _ in range(n)]
+
+
+async def bulk(entity_type: str, rows: list[dict]) -> list[int]:
+    ids = []
+    for start in range(0, len(rows), 1000):
+        results = await models.bulk_write(entity_type, rows[start:start + 1000])
+        ids.extend(r["id"] for r in results)
+    return ids
+
+
+def _project(rng: random.Random, i: int) -> dict:
+    return {
+        "title": f"Project {i} {sentence(rng, 2)[:-1]}",
+        "description": paragraph(rng, 3),
+        "status": rng.choice(STATUSES["project"]),
+        "priority": rng.choice(PRIORITIES),
+        "lead": f"lead{rng.randrange(10)}@example.com",
+        "members": [f"member{rng.randrange(40)}@example.com" for _ in range(rng.randint(2, 6))],
+        "milestones": [{"title": sentence(rng, 4), "date": f"2026-{m:02d}-01",
+                        "status": "completed" if m < 4 else "in_progress" if m < 6 else "pending"}
+                       for m in range(1, rng.randint(3, 9))],
+    }
+
+
+def _plan(rng: random.Random, project_id: int, i: int) -> dict:
+    return {
+        "title": f"Plan {project_id}.{i} {sentence(rng, 2)[:-1]}",
+        "project_id": project_id,
+        "description": paragraph(rng, 2),
+        "status": rng.choice(STATUSES["plan"]),
+        "vision": paragraph(rng, 4),
+        "goals": items(rng, rng.randint(3, 6), 14),
+        "target_audience": paragraph(rng, 1),
+        "success_metrics": items(rng, rng.randint(2, 5), 10),
+    }
+
+
+def _prd(rng: random.Random, plan_id: int, i: int) -> dict:
+    return {
+        "title": f"PRD {plan_id}.{i} {sentence(rng, 3)[:-1]}",
+        "plan_id": plan_id,
+        "status": rng.choice(STATUSES["prd"]),
+        "overview": paragraph(rng, 4),
+        "problem_statement": paragraph(rng, 3),
+        "proposed_solution": paragraph(rng, 5),
+        "user_stories": [f"As a user, I want {sentence(rng, 10)[:-1].lower()} so that {sentence(rng, 8).lower()}"
+                         for _ in range(rng.randint(4, 10))],
+        "requirements_functional": items(rng, rng.randint(5, 12), 16),
+        "requirements_nonfunctional": items(rng, rng.randint(2, 6), 12),
+        "success_metrics": items(rng, rng.randint(2, 5), 10),
+        "timeline": paragraph(rng, 1),
+        "content": document(rng, rng.randint(4, 8)),
+    }
+
+
+def _chat(rng: random.Random, n: int) -> str:
+    return json.dumps([
+        {"role": "user" if m % 2 == 0 else "assistant",
+         "content": sentence(rng, 20) if m % 2 == 0 else paragraph(rng, rng.randint(3, 8))}
+        for m in range(n)
+    ])
+
+
+async def seed(scale: Scale) -> dict:
+    """Fill the current ``schema.DB_PATH`` (already initialised); returns the row counts."""
+    rng = random.Random(scale.seed)
+    projects = await bulk("project", [{"op": "create", "fields": _project(rng, i)}
+                                      for i in range(scale.projects)])
+    plans = await bulk("plan", [{"op": "create", "fields": _plan(rng, p, i)}
+                                for p in projects for i in range(scale.plans)])
+    prds = await bulk("prd", [{"op": "create", "fields": _prd(rng, p, i)}
+                              for p in plans for i in range(scale.prds)])
+    for _ in range(scale.versions):
+        await bulk("prd", [{"op": "update", "id": i,
+                            "fields": {"proposed_solution": paragraph(rng, 5), "status": rng.choice(STATUSES["prd"])}}
+                           for i in prds])
+    if scale.messages:
+        db = await schema.get_db()
+        try:
+            await db.executemany(
+                "INSERT INTO ai_sessions (entity_type, entity_id, messages) VALUES (?, ?, ?)",
+                [("plan", i, _chat(rng, scale.messages)) for i in plans]
+                + [("prd", i, _chat(rng, scale.messages)) for i in prds],
+            )
+            await db.commit()
+        finally:
+            await db.close()
+    return scale.rows
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    defaults = Scale()
+    parser.add_argument("--projects", type=int, default=defaults.projects)
+    parser.add_argument("--plans", type=int, default=defaults.plans, help="plans per project")
+    parser.add_argument("--prds", type=int, default=defaults.prds, help="PRDs per plan")
+    parser.add_argument("--versions", type=int, default=defaults.versions, help="extra versions per PRD")
+    parser.add_argument("--messages", type=int, default=defaults.messages,
+                        help="chat messages per plan and PRD (0 for none)")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def scale_from(args) -> Scale:
+    return Scale(**{k: getattr(args, k) for k in asdict(Scale())})
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", required=True, help="database file to create (must not have data)")
+    add_arguments(parser)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    schema.DB_PATH = args.db
+    await schema.init_db()
+    if await models.list_projects():
+        raise SystemExit(f"{args.db} already has projects; seed an empty database")
+    print(json.dumps(await seed(scale_from(args)), indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""Benchmark SSE framing: one event per token vs. the coalescing emitter.
+
+Simulates an upstream model delivering tokens in network-sized bursts, pushes
+the frames through a Starlette ``StreamingResponse`` (so per-write ASGI cost is
+included) and measures, per streamed response, the server CPU, the number of
+events and bytes written, and the client-side cost of parsing those events.
+
+    uv run python -m bench.sse_framing --tokens 3000 --burst 6 --interval-ms 8
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from starlette.responses import StreamingResponse
+
+from productai.routes import sse
+
+WORDS = (
+    "The onboarding flow should let new users connect their calendar, "
+    "invite teammates and **create a first project** within two minutes.\n"
+).split(" ")
+
+
+async def upstream(n_tokens: int, burst: int, interval: float):
+    for i in range(n_tokens):
+        if i % burst == 0:
+            await asyncio.sleep(interval)
+        yield {"token": WORDS[i % len(WORDS)] + " "}
+    yield {"done": True, "content": ""}
+
+
+async def per_token(events):
+    """The framing every endpoint used before: one json.dumps and write per token."""
+    async for event in events:
+        yield f"data: {json.dumps(event)}\n\n"
+
+
+def parse_client(frames: list[str]) -> float:
+    start = time.process_time()
+    text = []
+    for frame in frames:
+        data = json.loads(frame[6:])
+        if "token" in data:
+            text.append(data["token"])
+    return time.process_time() - start
+
+
+async def serve(body) -> list[str]:
+    """Run a body iterator through StreamingResponse and collect what it writes."""
+    frames: list[str] = []
+
+    async def receive():
+        await asyncio.Event().wait()
+
+    async def send(message):
+        chunk = message.get("body")
+        if chunk and not chunk.startswith(b":"):
+            frames.append(chunk.decode())
+
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}, "method": "POST", "headers": []}
+    await StreamingResponse(body, media_type="text/event-stream")(scope, receive, send)
+    return frames
+
+
+async def run(name: str, framer, args) -> dict:
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    frames = await serve(framer(upstream(args.tokens, args.burst, args.interval_ms / 1000)))
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    return {
+        "framing": name,
+        "events": len(frames),
+        "bytes": sum(len(f) for f in frames),
+        "server_cpu_ms": round(cpu * 1000, 2),
+        "client_parse_ms": round(parse_client(frames) * 1000, 2),
+        "wall_s": round(wall, 3),
+        "events_per_s": round(len(frames) / wall, 1),
+    }
+
+
+async def main(args):
+    results = [
+        await run("per-token", per_token, args),
+        await run(
+            f"coalesced-{int(args.window_ms)}ms",
+            lambda ev: sse.coalesce(ev, window=args.window_ms / 1000),
+            args,
+        ),
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=3000)
+    parser.add_argument("--burst", type=int, default=6, help="tokens per upstream chunk")
+    parser.add_argument("--interval-ms", type=float, default=8, help="delay between chunks")
+    parser.add_argument("--window-ms", type=float, default=sse.FRAME_WINDOW * 1000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,208 @@
+"""Reproducible request benchmarks against a seeded portfolio, with a baseline check.
+
+Seeds a scratch database with ``bench.seed`` and drives the app in-process
+(no server, no network) through the hot paths: the dashboard, project, plan
+and PRD pages, mindmap data, PRD complexity analytics, autocomplete lookups,
+a PRD form save and a bulk save. Each scenario runs ``--warmup`` untimed then
+``--iterations`` timed requests; the report has p50/p95/mean latency plus the
+SQLite queries and connections per request, read from the ``Server-Timing``
+header.
+
+    uv run python -m bench.suite --output results.json
+    uv run python -m bench.suite --baseline bench/baseline.json      # exit 1 on regression
+    uv run python -m bench.suite --update-baseline bench/baseline.json
+
+A scenario regresses when its p50 is more than ``--tolerance`` slower than
+the baseline and at least ``--min-delta-ms`` slower, or when it runs more
+queries or opens more connections per request. Query counts do not depend on
+the machine; latencies do, so keep a baseline per machine (or CI runner) and
+compare at the same scale, which the check enforces.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+
+import httpx
+
+from productai.ai import autocomplete as ac
+from productai.app import app
+from productai.db import models, schema
+
+from bench.seed import add_arguments, scale_from, seed
+
+_TIMING = re.compile(r'(\d+) queries, (\d+) connections')
+
+# (prefix, context) pairs typed into the editors
+KEYSTROKES = [
+    ("re", None), ("req", "the"), ("requ", "the"), ("st", "key"), ("stak", "key"),
+    ("on", "user"), ("onbo", "user"), ("mi", "should"), ("mile", None), ("anal", "usage"),
+]
+
+
+def scenarios(rows: dict) -> dict:
+    """Name -> ``request(i)`` returning ``(method, path, kwargs)`` for iteration ``i``.
+
+    Ids are spread over the portfolio so reads do not hit one row only; the
+    seeded ids are deterministic for a given scale.
+    """
+    projects, plans, prds = rows["projects"], rows["plans"], rows["prds"]
+
+    def pick(n: int, i: int) -> int:
+        return 1 + (i * 7919) % n
+
+    return {
+        "dashboard": lambda i: ("GET", "/", {}),
+        "project_detail": lambda i: ("GET", f"/projects/{pick(projects, i)}", {}),
+        "plan_detail": lambda i: ("GET", f"/plans/{pick(plans, i)}", {}),
+        "prd_detail": lambda i: ("GET", f"/prds/{pick(prds, i)}", {}),
+        "mindmap_data": lambda i: ("GET", "/api/mindmap/data", {}),
+        "prd_complexity": lambda i: ("GET", "/api/analytics/prd-complexity", {}),
+        "autocomplete": lambda i: ("POST", "/api/autocomplete/words", {"json": {
+            "prefix": KEYSTROKES[i % len(KEYSTROKES)][0],
+            "context": KEYSTROKES[i % len(KEYSTROKES)][1], "limit": 8}}),
+        "prd_save": lambda i: ("POST", f"/api/prds/{pick(prds, i)}", {"data": {
+            "overview": f"Benchmark save {i}: stakeholders review the onboarding requirement."}}),
+        "bulk_save": lambda i: ("POST", "/api/bulk/prds", {"json": {"items": [
+            {"op": "update", "id": pick(prds, i * 50 + n), "fields": {"timeline": f"Q{1 + (i + n) % 4} rollout"}}
+            for n in range(50)
+        ]}}),
+    }
+
+
+async def measure(client: httpx.AsyncClient, request, warmup: int, iterations: int) -> dict:
+    times, queries, connections = [], 0, 0
+    for i in range(warmup + iterations):
+        method, path, kwargs = request(i)
+        start = time.perf_counter()
+        resp = await client.request(method, path, **kwargs)
+        elapsed = (time.perf_counter() - start) * 1000
+        if resp.is_error:
+            raise SystemExit(f"{method} {path}: HTTP {resp.status_code}")
+        if i < warmup:
+            continue
+        times.append(elapsed)
+        match = _TIMING.search(resp.headers.get("server-timing", ""))
+        if match:
+            queries = max(queries, int(match.group(1)))
+            connections = max(connections, int(match.group(2)))
+    times.sort()
+    return {
+        "p50_ms": round(statistics.median(times), 2),
+        "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))], 2),
+        "mean_ms": round(statistics.fmean(times), 2),
+        "queries": queries,
+        "connections": connections,
+    }
+
+
+async def run(args) -> dict:
+    scale = scale_from(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        schema.DB_PATH = os.path.join(tmp, "bench.db")
+        await schema.init_db()
+        start = time.perf_counter()
+        rows = await seed(scale)
+        seed_s = time.perf_counter() - start
+        await models.load_ngrams()
+        if args.index and os.path.exists(args.index):
+            ac.INDEX_PATH = args.index
+            ac.load_index()
+
+        # ASGITransport skips the lifespan: no telemetry flusher or index reloader
+        transport = httpx.ASGITransport(app=app)
+        results = {}
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, request in scenarios(rows).items():
+                if args.only and name not in args.only:
+                    continue
+                results[name] = await measure(client, request, args.warmup, args.iterations)
+                print(f"{name:16} p50 {results[name]['p50_ms']:8.2f} ms  "
+                      f"p95 {results[name]['p95_ms']:8.2f} ms  "
+                      f"{results[name]['queries']:4} queries", file=sys.stderr)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "autocomplete_words": ac.status()["words"],
+            "seed_s": round(seed_s, 1),
+            "warmup": args.warmup,
+            "iterations": args.iterations,
+        },
+        "scale": asdict(scale),
+        "rows": rows,
+        "scenarios": results,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list[str]:
+    """Regressions of ``report`` against ``baseline``, as readable lines."""
+    if report["scale"] != baseline["scale"]:
+        raise SystemExit(f"Scale {report['scale']} differs from the baseline's {baseline['scale']}; "
+                         "rerun with the baseline's arguments")
+    if report["meta"]["autocomplete_words"] != baseline["meta"]["autocomplete_words"]:
+        print("warning: autocomplete index differs from the baseline's "
+              f"({report['meta']['autocomplete_words']} vs {baseline['meta']['autocomplete_words']} words)",
+              file=sys.stderr)
+    problems = []
+    for name, base in baseline["scenarios"].items():
+        now = report["scenarios"].get(name)
+        if now is None:
+            continue  # not run (--only)
+        slower = now["p50_ms"] - base["p50_ms"]
+        if slower > base["p50_ms"] * tolerance and slower >= min_delta_ms:
+            problems.append(f"{name}: p50 {now['p50_ms']} ms vs {base['p50_ms']} ms "
+                            f"(+{slower / base['p50_ms']:.0%})")
+        for key in ("queries", "connections"):
+            if now[key] > base[key]:
+                problems.append(f"{name}: {now[key]} {key} per request vs {base[key]}")
+    return problems
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--only", nargs="+", help="run these scenarios only")
+    parser.add_argument("--index", default=ac.INDEX_PATH,
+                        help="autocomplete index file (PM vocabulary only if missing)")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="baseline report to compare with; exit 1 on regression")
+    parser.add_argument("--update-baseline", metavar="PATH", help="write the report as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="ignore p50 slowdowns smaller than this")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    report = await run(args)
+    text = json.dumps(report, indent=2) + "\n"
+    for path in filter(None, (args.output, args.update_baseline)):
+        with open(path, "w") as f:
+            f.write(text)
+    if not args.output and not args.update_baseline:
+        sys.stdout.write(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.tolerance, args.min_delta_ms)
+        for line in problems:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,12 +1,58 @@
-"""Word autocomplete engine — full English dictionary with frequency ranking."""
+"""Word autocomplete engine — full English dictionary with frequency ranking.
 
-import bisect
+The dictionary, its ranking scores and the top suggestions for every common
+prefix are compiled ahead of time into a memory-mapped index (see
+``wordindex``)::
+
+    python -m productai.ai.autocomplete build [--output PATH]
+
+At runtime the index at ``AUTOCOMPLETE_INDEX_PATH`` is mapped read-only, so
+NLTK is only needed to build it. ``run_loader`` does this in the background
+at startup (compiling in a worker process if there is no file) and swaps in a
+new index whenever the file is replaced; until the first load finishes,
+suggestions come from the PM vocabulary alone.
+
+Prefixes of four or more letters that complete to nothing get typo-tolerant
+matches instead (``fuzzy``), ranked by edit distance first and the same
+scores second.
+
+Browsers mostly rank suggestions themselves: ``shard`` publishes every word
+under a two-letter prefix in rank order, and ``associations`` the context
+table, both cacheable for as long as ``shard_version`` is unchanged. Learned
+n-grams (``ngrams``) change with every save and are published separately.
+"""
+
+import argparse
+import asyncio
+import heapq
+import json
 import logging
+import multiprocessing
+import os
+import re
 import ssl
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from functools import lru_cache
 
+from .. import metrics
+from . import fuzzy, ngrams
+from .wordindex import IndexFormatError, WordIndex, encode, write
+
 log = logging.getLogger(__name__)
 
+INDEX_PATH = os.environ.get(
+    "AUTOCOMPLETE_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "autocomplete.idx"),
+)
+
+RELOAD_INTERVAL = float(os.environ.get("AUTOCOMPLETE_RELOAD_SECONDS", "30"))
+
+# Ranking weights; all but the context boost are baked into the index scores.
+CONTEXT_BOOST = 200000
+PM_BOOST = 100000
+FREQUENCY_SCALE = 30000
+
 # ── Product Management vocabulary (boosted in ranking) ────────────────
 PM_VOCABULARY = {
     'product', 'feature', 'requirement', 'requirements', 'specification',
@@ -155,9 +201,8 @@ def _load_english_words() -> set[str]:
         return set()
 
 
-@lru_cache(maxsize=1)
-def _build_index() -> tuple[list[str], dict[str, int]]:
-    """Build sorted word list and frequency scores. Called once, cached forever."""
+def compile_index() -> tuple[list[str], list[int]]:
+    """Sorted words and their context-independent scores, from the word corpora."""
     # Combine word sources
     all_words = _load_nltk_words() | _load_english_words() | PM_VOCABULARY
     sorted_words = sorted(all_words)
@@ -166,62 +211,291 @@ def _build_index() -> tuple[list[str], dict[str, int]]:
     brown_freq = _load_nltk_frequencies()
     # Normalize: map raw count to 0-30000 range (log scale would be ideal but linear is fine)
     max_freq = max(brown_freq.values()) if brown_freq else 1
-    scores: dict[str, int] = {}
-    for word, count in brown_freq.items():
-        scores[word] = int((count / max_freq) * 30000)
 
-    log.info("Autocomplete index: %d words, %d with frequency data", len(sorted_words), len(scores))
+    scores = []
+    for word in sorted_words:
+        # PM vocabulary boost
+        score = PM_BOOST if word in PM_VOCABULARY else 0
+        if word in brown_freq:
+            # Brown corpus frequency (0-30000)
+            score += int((brown_freq[word] / max_freq) * FREQUENCY_SCALE)
+        else:
+            # Length penalty for very long words without frequency data
+            score -= len(word) * 10
+        scores.append(score)
+
+    log.info("Autocomplete index: %d words, %d with frequency data",
+             len(sorted_words), sum(w in brown_freq for w in sorted_words))
     return sorted_words, scores
 
 
+def build_index_file(path: str = INDEX_PATH):
+    words, scores = compile_index()
+    write(path, words, scores)
+
+
+# ── Loading and hot swap ──────────────────────────────
+
+_index: WordIndex | None = None
+_index_source = "vocabulary"
+_index_stat: tuple | None = None  # (inode, mtime, size) of the mapped file
+_index_version: str | None = None  # shard_version of _index, set by swap
+_reload_lock = asyncio.Lock()
+
+
+def _get_index() -> WordIndex:
+    """The live index; a PM-vocabulary-only index until the full one is loaded."""
+    return _index if _index is not None else _vocabulary_index()
+
+
+@lru_cache(maxsize=1)
+def _vocabulary_index() -> WordIndex:
+    words = sorted(PM_VOCABULARY)
+    return WordIndex(encode(words, [PM_BOOST - len(w) * 10 for w in words]))
+
+
+def _file_stat() -> tuple | None:
+    try:
+        st = os.stat(INDEX_PATH)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _open_file() -> tuple[WordIndex | None, tuple | None]:
+    stat = _file_stat()
+    if stat is None:
+        log.info("No autocomplete index at %s; compiling in the background "
+                 "(build it with `python -m productai.ai.autocomplete build`)", INDEX_PATH)
+        return None, None
+    try:
+        return _prepared(WordIndex.open(INDEX_PATH)), stat
+    except (IndexFormatError, ValueError) as e:
+        log.warning("Ignoring autocomplete index at %s: %s", INDEX_PATH, e)
+        return None, None
+
+
+def _prepared(index: WordIndex) -> WordIndex:
+    """Build the index's fuzzy lookup table now, so no request pays for it."""
+    fuzzy.for_index(index)
+    return index
+
+
+def _compile_bytes() -> bytes:
+    """Runs in a worker process: corpus loading (and any NLTK download) is slow and holds the GIL."""
+    return encode(*compile_index())
+
+
+def swap(index: WordIndex, source: str, stat: tuple | None = None):
+    """Atomically replace the live index; in-flight lookups finish on the old one."""
+    global _index, _index_source, _index_stat, _index_version
+    version = _version_of(index)  # about 1 ms for the full index, once per swap
+    _index, _index_source, _index_stat, _index_version = index, source, stat, version
+    _shard.cache_clear()
+    log.info("Autocomplete index ready: %d words (%s)", len(index), source)
+
+
+def load_index():
+    """Load the index file, or compile one, in the calling thread."""
+    index, stat = _open_file()
+    if index is None:
+        swap(_prepared(WordIndex(_compile_bytes())), "compiled")
+    else:
+        swap(index, "file", stat)
+
+
+async def reload():
+    """Load or compile the index off the event loop and swap it in."""
+    async with _reload_lock:
+        index, stat = await asyncio.to_thread(_open_file)
+        if index is not None:
+            swap(index, "file", stat)
+            return
+        if _index is not None and _index_source == "compiled":
+            return  # nothing newer to load
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                data = await asyncio.get_running_loop().run_in_executor(pool, _compile_bytes)
+        except Exception as exc:
+            # A dead worker (BrokenProcessPool) or no usable spawn context
+            # (RuntimeError/OSError): the index still has to load.
+            log.warning("Autocomplete compile worker failed (%r); compiling in a thread instead", exc)
+            data = await asyncio.to_thread(_compile_bytes)
+        swap(await asyncio.to_thread(_prepared, WordIndex(data)), "compiled")
+
+
+async def run_loader():
+    """Background task: load the index, then reload whenever the file is replaced."""
+    try:
+        with metrics.startup_phase("autocomplete_index", background=True):
+            await reload()
+    except Exception:
+        log.exception("Failed to load the autocomplete index; serving PM vocabulary only")
+    if RELOAD_INTERVAL <= 0:
+        return
+    while True:
+        await asyncio.sleep(RELOAD_INTERVAL)
+        stat = _file_stat()
+        if stat is not None and stat != _index_stat:
+            try:
+                await reload()
+            except Exception:
+                log.exception("Failed to reload the autocomplete index")
+
+
+def status() -> dict:
+    return {
+        "ready": _index is not None,
+        "source": _index_source,
+        "words": len(_get_index()),
+        "version": shard_version(),
+    }
+
+
 def _next_prefix(prefix: str) -> str:
     """Get the string boundary after prefix for bisect (e.g. 'req' -> 'rer')."""
     return prefix[:-1] + chr(ord(prefix[-1]) + 1)
 
 
 def get_suggestions(prefix: str, context: str | None = None, limit: int = 8) -> list[str]:
-    """Return ranked word suggestions for a prefix, optionally boosted by context."""
+    """Return ranked word suggestions for a prefix, optionally boosted by context.
+
+    ``context`` is the text before the word being typed; its last two words
+    select learned n-gram continuations, which fill up to half the results
+    ahead of the dictionary ranking. When nothing starts with ``prefix``,
+    typo-tolerant matches are returned instead.
+    """
     prefix = prefix.lower().strip()
     if len(prefix) < 2:
         return []
+    context_words = context.lower().split()[-2:] if context else []
+    learned = ngrams.model.suggest(context_words, prefix, max(1, limit // 2))
+    ranked = [w for w in _dictionary_suggestions(prefix, context_words, limit) if w not in learned]
+    if not learned and not ranked and len(prefix) >= fuzzy.MIN_LENGTH:
+        return _fuzzy_suggestions(prefix, context_words, limit)
+    return (learned + ranked)[:limit]
 
-    words, freq_scores = _build_index()
+
+def _dictionary_suggestions(prefix: str, context_words: list[str], limit: int) -> list[str]:
+    index = _get_index()
 
     # Fast bisect-based prefix lookup
-    lo = bisect.bisect_left(words, prefix)
-    hi = bisect.bisect_left(words, _next_prefix(prefix))
-    matches = words[lo:hi]
+    lo, hi = index.range(prefix, _next_prefix(prefix))
 
     # Remove exact match
-    if matches and matches[0] == prefix:
-        matches = matches[1:]
+    if lo < hi and index.word(lo) == prefix:
+        lo += 1
 
-    if not matches:
+    if lo >= hi:
         return []
 
-    # Build context boost set
-    context_boost = set()
-    if context:
-        ctx = context.lower()
-        if ctx in WORD_ASSOCIATIONS:
-            context_boost = set(WORD_ASSOCIATIONS[ctx])
-
-    # Score candidates
-    scored: list[tuple[str, int]] = []
-    for word in matches:
-        score = 0
-        # Context association — highest boost
-        if word in context_boost:
-            score += 200000
-        # PM vocabulary boost
-        if word in PM_VOCABULARY:
-            score += 100000
-        # Brown corpus frequency (0-30000)
-        score += freq_scores.get(word, 0)
-        # Length penalty for very long words without frequency data
-        if word not in freq_scores:
-            score -= len(word) * 10
-        scored.append((word, score))
+    # Context association — highest boost
+    boosted = set()
+    if context_words:
+        for word in WORD_ASSOCIATIONS.get(context_words[-1], ()):
+            if not word.startswith(prefix):
+                continue
+            i = index.find(word)
+            if i is not None and lo <= i < hi:
+                boosted.add(i)
+
+    # Large ranges have their top-k precomputed; only context-boosted words
+    # can overtake those, so the candidates are the two merged.
+    best = index.best(prefix) if limit <= index.k else None
+    candidates = range(lo, hi) if best is None else boosted.union(best)
+
+    scores = index.scores
+    ranked = heapq.nsmallest(
+        limit, candidates,
+        key=lambda i: (-(scores[i] + (CONTEXT_BOOST if i in boosted else 0)), i),
+    )
+    return [index.word(i) for i in ranked]
+
+
+def _fuzzy_suggestions(prefix: str, context_words: list[str], limit: int) -> list[str]:
+    """Words within a few edits of ``prefix``: closest first, then by score."""
+    index = _get_index()
+    if index.find(prefix) is not None:
+        return []  # a complete word with no longer completions, not a typo
+    distance: dict[int, int] = {}
+    for dist, i in fuzzy.for_index(index).candidates(prefix, limit):
+        distance[i] = min(dist, distance.get(i, dist))
+    if not distance:
+        return []
+
+    boosted = set(WORD_ASSOCIATIONS.get(context_words[-1], ())) if context_words else set()
+    scores = index.scores
+    ranked = heapq.nsmallest(
+        limit, distance,
+        key=lambda i: (distance[i], -(scores[i] + (CONTEXT_BOOST if index.word(i) in boosted else 0)), i),
+    )
+    return [index.word(i) for i in ranked]
+
+
+# ── Client shards ─────────────────────────────────────
+
+SHARD_KEY_LENGTH = 2
+# Shards exist for ASCII prefixes only; isalpha() would let any Unicode pair in.
+_SHARD_KEY = re.compile(f"[a-z]{{{SHARD_KEY_LENGTH}}}")
+
+
+def shard_version() -> str:
+    """Changes whenever the index or the association table does.
+
+    Rendered into every page, so it is computed once per ``swap`` rather
+    than checksummed per call.
+    """
+    return _index_version if _index_version is not None else _vocabulary_version()
+
+
+def _version_of(index: WordIndex) -> str:
+    crc = zlib.crc32(index.buffer)
+    crc = zlib.crc32(associations(), crc)
+    return f"{crc:08x}"
+
+
+@lru_cache(maxsize=1)
+def _vocabulary_version() -> str:
+    return _version_of(_vocabulary_index())
+
+
+@lru_cache(maxsize=1)
+def associations() -> bytes:
+    return json.dumps(WORD_ASSOCIATIONS, separators=(",", ":")).encode()
+
+
+def shard(key: str) -> bytes | None:
+    """All words starting with ``key``, best first, as suffixes after ``key``.
+
+    Context-boosted words always outrank the rest, so a client reproduces
+    ``get_suggestions`` by taking matching boosted words in shard order, then
+    the other matches in shard order. ``None`` for keys that are not two
+    lowercase ASCII letters, checked before the cache so they take no slot.
+    """
+    if not _SHARD_KEY.fullmatch(key):
+        return None
+    return _shard(key)
+
+
+@lru_cache(maxsize=1024)
+def _shard(key: str) -> bytes:
+    index = _get_index()
+    lo, hi = index.range(key, _next_prefix(key))
+    scores = index.scores
+    ranked = sorted(range(lo, hi), key=lambda i: (-scores[i], i))
+    words = [index.word(i)[SHARD_KEY_LENGTH:] for i in ranked]
+    return json.dumps({"key": key, "words": words}, separators=(",", ":")).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Autocomplete index tools")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--output", default=INDEX_PATH, help="index file to write")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    build_index_file(args.output)
+    log.info("Wrote %s (%d bytes)", args.output, os.path.getsize(args.output))
+
 
-    scored.sort(key=lambda x: (-x[1], x[0]))
-    return [w for w, _ in scored[:limit]]
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Typo-tolerant prefix lookup over a ``WordIndex`` (symmetric delete).
+
+Every distinct ``KEY_LENGTH``-character word prefix (a key) is indexed under
+itself and each string obtained by deleting one character from it. A typed
+prefix looks up its own first ``KEY_LENGTH`` characters and their
+one-character deletes, which finds every key within one edit (insert, delete,
+substitute, or transpose) without scanning the dictionary.
+
+The words under each matched key are then walked as a trie, extending one
+optimal string alignment row per character and dropping a branch as soon as
+no column is within bounds, so the verification is shared by all words with a
+common stem. Bounds are at most 1 edit for prefixes shorter than
+``LONG_PREFIX`` and at most 2 from there on.
+
+The table holds a few entries per key, not per word; ``for_index`` builds it
+once per loaded index, which the autocomplete loader does off the event loop.
+"""
+
+import heapq
+from array import array
+from functools import lru_cache
+
+from .wordindex import WordIndex
+
+KEY_LENGTH = 4
+MIN_LENGTH = 4
+LONG_PREFIX = 7
+
+
+def max_distance(prefix: str) -> int:
+    return 1 if len(prefix) < LONG_PREFIX else 2
+
+
+def _deletes(key: str) -> set[str]:
+    return {key[:i] + key[i + 1:] for i in range(len(key))} | {key}
+
+
+def _next_row(typed: str, prev: list[int], prev2: list[int] | None, char: str, last: str,
+              limit: int) -> list[int]:
+    """Optimal string alignment row for ``char`` appended to a stem ending in ``last``.
+
+    Columns are positions in ``typed``; ``prev`` and ``prev2`` are the rows of
+    the two previous stem characters. Only the band of columns within
+    ``limit`` of the diagonal is computed: every cell outside it is over the
+    limit anyway, and is stored as ``limit + 1``.
+    """
+    depth = prev[0] + 1
+    row = [depth] + [limit + 1] * len(typed)
+    for j in range(max(1, depth - limit), min(len(typed), depth + limit) + 1):
+        value = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + (typed[j - 1] != char))
+        if prev2 is not None and j > 1 and typed[j - 1] == last and typed[j - 2] == char:
+            value = min(value, prev2[j - 2] + 1)
+        row[j] = value
+    return row
+
+
+class FuzzyIndex:
+    def __init__(self, index: WordIndex):
+        self.index = index
+        # One entry per distinct key: the key and its contiguous word range.
+        self.keys: list[str] = []
+        self.starts = array("I")
+        self.ends = array("I")
+        deletes: dict[str, list[int]] = {}
+        key = None
+        for i in range(len(index)):
+            word = index.word(i)
+            if len(word) < KEY_LENGTH or word[:KEY_LENGTH] != key:
+                key = word[:KEY_LENGTH]
+                if len(key) < MIN_LENGTH - 1:
+                    continue
+                for d in _deletes(key):
+                    deletes.setdefault(d, []).append(len(self.keys))
+                self.keys.append(key)
+                self.starts.append(i)
+                self.ends.append(i + 1)
+            else:
+                self.ends[-1] = i + 1
+        self.deletes: dict[str, tuple[int, ...]] = {d: tuple(keys) for d, keys in deletes.items()}
+
+    def candidates(self, prefix: str, per_range: int) -> list[tuple[int, int]]:
+        """``(distance, word index)`` for the ``per_range`` best-scored words under
+        every stem within bounds of ``prefix``; exact prefix matches are left out.
+
+        A closer match always outranks a farther one, so the search widens to
+        the next distance only while fewer than ``per_range`` words were found.
+        """
+        if len(prefix) < MIN_LENGTH:
+            return []
+        found = []
+        for limit in range(1, max_distance(prefix) + 1):
+            found = self._search(prefix, limit, per_range)
+            if len({w for _, w in found}) >= per_range:
+                break
+        return found
+
+    def _search(self, prefix: str, limit: int, per_range: int) -> list[tuple[int, int]]:
+        width = len(prefix) + limit
+        index = self.index
+        scores = index.scores
+        out: list[tuple[int, int]] = []
+
+        def emit(dist: int, stem: str, lo: int, hi: int):
+            if not 0 < dist <= limit:
+                return  # out of bounds, or an exact prefix match the caller already has
+            best = index.best(stem) if hi - lo > per_range and per_range <= index.k else None
+            pool = range(lo, hi) if best is None else {lo, *best}
+            out.extend((dist, w) for w in heapq.nsmallest(per_range, pool, key=lambda w: (-scores[w], w)))
+
+        def visit(stem: str, lo: int, hi: int, prev: list[int], prev2: list[int] | None, dist: int):
+            # Words sharing ``stem`` are [lo, hi); rows extend one character at a
+            # time, so a subtree is dropped as soon as no column is within bounds.
+            if len(stem) >= width:
+                emit(dist, stem, lo, hi)
+                return
+            i = lo
+            if index.word(i) == stem:
+                emit(dist, stem, i, i + 1)
+                i += 1
+            while i < hi:
+                child = index.word(i)[:len(stem) + 1]
+                j = i + 1
+                if j < hi and index.word(j).startswith(child):
+                    j = index.range(child, child[:-1] + chr(ord(child[-1]) + 1), j, hi)[1]
+                row = _next_row(prefix, prev, prev2, child[-1], stem[-1:], limit)
+                if min(row) <= limit:
+                    visit(child, i, j, row, prev, min(dist, row[-1]))
+                else:
+                    emit(dist, child, i, j)  # within bounds only if ``stem`` already matched
+                i = j
+
+        matched = {k for d in _deletes(prefix[:KEY_LENGTH]) for k in self.deletes.get(d, ())}
+        for k in sorted(matched):
+            key = self.keys[k]
+            prev2, prev = None, list(range(len(prefix) + 1))
+            dist = prev[-1]
+            for n, char in enumerate(key):
+                prev2, prev = prev, _next_row(prefix, prev, prev2, char, key[n - 1] if n else "", limit)
+                dist = min(dist, prev[-1])
+                if min(prev) > limit:
+                    emit(dist, key, self.starts[k], self.ends[k])
+                    break
+            else:
+                visit(key, self.starts[k], self.ends[k], prev, prev2, dist)
+        return out
+
+
+@lru_cache(maxsize=2)
+def for_index(index: WordIndex) -> FuzzyIndex:
+    """The fuzzy index of ``index``, built on first use (loaders call this ahead of time)."""
+    return FuzzyIndex(index)
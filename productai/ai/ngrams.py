@@ -0,0 +1,177 @@
+"""Word n-grams learned from our own projects, plans and PRDs.
+
+Counts are keyed by context: ``""`` for unigrams, ``"w1"`` for bigrams and
+``"w1 w2"`` for trigrams. ``db.models`` persists them in the ``ngrams`` table
+and feeds deltas to the in-memory ``model`` on every save, so the counts are
+always current without rebuilds. Contexts never span sentence punctuation or
+line breaks.
+
+Suggestions come in tiers: continuations of the last two typed words, then of
+the last word, then words our documents use often, each by descending count.
+The top suggestion is extended into a phrase while one continuation clearly
+dominates what usually follows.
+
+Browsers rank from a published snapshot of the counts (``snapshot``), which is
+only rebuilt once the counts have drifted by ``DRIFT_SHARE`` of all unigram
+occurrences. Its version is a hash of its content, so it also survives a
+restart, and an ordinary save does not make every open page download the
+model again.
+"""
+
+import json
+import os
+import re
+import zlib
+from collections import Counter
+
+MIN_COUNT = int(os.environ.get("AUTOCOMPLETE_NGRAM_MIN_COUNT", "2"))
+MAX_ENTRIES = int(os.environ.get("AUTOCOMPLETE_NGRAM_MAX", "200000"))
+PHRASE_MAX_WORDS = 3
+PHRASE_SHARE = 0.5  # a continuation extends a phrase if it has this share of its context
+DRIFT_SHARE = float(os.environ.get("AUTOCOMPLETE_NGRAM_DRIFT", "0.01"))
+
+_SENTENCES = re.compile(r"[.!?;:()\[\]\n]+")
+_WORDS = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+
+def extract(text: str) -> Counter:
+    """``(context, word)`` n-gram counts in ``text``."""
+    counts = Counter()
+    for sentence in _SENTENCES.split(text.lower()):
+        words = _WORDS.findall(sentence)
+        for i, word in enumerate(words):
+            if len(word) < 2:
+                continue
+            counts["", word] += 1
+            if i >= 1:
+                counts[words[i - 1], word] += 1
+            if i >= 2:
+                counts[f"{words[i - 2]} {words[i - 1]}", word] += 1
+    return counts
+
+
+def diff(old: dict | None, new: dict | None, fields: tuple[str, ...]) -> Counter:
+    """Count changes turning the text ``fields`` of row ``old`` into ``new``.
+
+    Unchanged fields contribute nothing; ``None`` stands for a row that does
+    not exist (created or deleted).
+    """
+    delta = Counter()
+    for field in fields:
+        before = (old or {}).get(field) or ""
+        after = (new.get(field, before) or "") if new is not None else ""
+        if before == after:
+            continue
+        delta.update(extract(after))
+        delta.subtract(extract(before))
+    return Counter({k: v for k, v in delta.items() if v})
+
+
+class NgramModel:
+    def __init__(self):
+        self._counts: dict[str, dict[str, int]] = {}
+        self._totals: Counter = Counter()
+        self._ranked: dict[str, list[tuple[str, int]]] = {}
+        self.entries = 0
+        self._drift = 0  # absolute count changes since the snapshot was built
+        self._snapshot: tuple[str, bytes] | None = None
+
+    def load(self, rows):
+        """Replace all counts with ``(context, word, count)`` rows."""
+        self._counts.clear()
+        self._totals.clear()
+        self.entries = 0
+        self._snapshot = None
+        self.apply(Counter({(context, word): count for context, word, count in rows}))
+
+    def apply(self, delta: Counter):
+        """Add count deltas; n-grams that reach zero are dropped."""
+        for (context, word), change in delta.items():
+            words = self._counts.setdefault(context, {})
+            before = words.get(word, 0)
+            after = before + change
+            if after > 0:
+                words[word] = after
+                self._totals[context] += after - before
+            else:
+                words.pop(word, None)
+                self._totals[context] -= before
+                if not words:
+                    del self._counts[context]
+                    del self._totals[context]
+            self.entries += (after > 0) - (before > 0)
+            self._ranked.pop(context, None)
+            self._drift += abs(change)
+
+    def prune(self):
+        """Drop context n-grams below ``MIN_COUNT``; they never reach suggestions."""
+        rare = Counter({
+            (context, word): -count
+            for context, words in self._counts.items() if context
+            for word, count in words.items() if count < MIN_COUNT
+        })
+        self.apply(rare)
+
+    def ranked(self, context: str) -> list[tuple[str, int]]:
+        """Words seen after ``context`` at least ``MIN_COUNT`` times, most frequent first."""
+        if context not in self._ranked:
+            words = self._counts.get(context, {})
+            self._ranked[context] = sorted(
+                ((w, c) for w, c in words.items() if c >= MIN_COUNT),
+                key=lambda item: (-item[1], item[0]),
+            )
+        return self._ranked[context]
+
+    def suggest(self, context_words: list[str], prefix: str, limit: int) -> list[str]:
+        """Learned completions of ``prefix`` after ``context_words``, best first."""
+        contexts = [" ".join(context_words[-2:])] if len(context_words) >= 2 else []
+        contexts += [context_words[-1]] if context_words else []
+        contexts.append("")
+        out: list[str] = []
+        for context in contexts:
+            for word, _ in self.ranked(context):
+                if len(out) >= limit:
+                    break
+                if word != prefix and word.startswith(prefix) and word not in out:
+                    out.append(word)
+        if out:
+            phrase = self._phrase(context_words, out[0])
+            if phrase != out[0]:
+                out = [phrase] + out[:limit - 1]
+        return out
+
+    def _phrase(self, context_words: list[str], word: str) -> str:
+        words = [word]
+        history = context_words[-1:] + words
+        while len(words) < PHRASE_MAX_WORDS:
+            context = " ".join(history[-2:])
+            if context not in self._counts:
+                context = history[-1]
+            ranked = self.ranked(context)
+            if not ranked or ranked[0][1] < self._totals[context] * PHRASE_SHARE:
+                break
+            words.append(ranked[0][0])
+            history.append(ranked[0][0])
+        return " ".join(words)
+
+    def export(self) -> dict:
+        """Counts at or above ``MIN_COUNT`` plus context totals, for client-side suggestions."""
+        return {
+            "min_count": MIN_COUNT,
+            "phrase_max_words": PHRASE_MAX_WORDS,
+            "phrase_share": PHRASE_SHARE,
+            "next": {c: ranked for c in self._counts if (ranked := self.ranked(c))},
+            "totals": dict(self._totals),
+        }
+
+    def snapshot(self) -> tuple[str, bytes]:
+        """``(version, JSON body)`` of ``export`` as last published, rebuilt
+        once the counts drift by more than ``DRIFT_SHARE`` of all unigrams."""
+        if self._snapshot is None or self._drift > DRIFT_SHARE * self._totals.get("", 0):
+            body = json.dumps(self.export(), sort_keys=True, separators=(",", ":")).encode()
+            self._snapshot = (f"{zlib.crc32(body):08x}", body)
+            self._drift = 0
+        return self._snapshot
+
+
+model = NgramModel()
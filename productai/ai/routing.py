@@ -0,0 +1,160 @@
+"""Per-mode model routing with latency-aware fallback.
+
+Each AI mode (plan chat, PRD generation, each enhancement intensity, ...) has
+an ordered model list in the ``model_<mode>`` admin setting, e.g.
+``claude-3-5-haiku-20241022, claude-sonnet-4-20250514``: the first entry is
+preferred, the rest are fallbacks. The router keeps an exponentially weighted
+moving average of time-to-first-token, output throughput and error rate per
+model. A model whose TTFT or error rate crosses its threshold is tripped for a
+cooldown period and moved to the back of every list; after the cooldown its
+error rate starts over, while its latency history is kept.
+"""
+
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from ..db.models import get_setting
+
+DEFAULT_MODEL = "claude-sonnet-4-20250514"
+
+# mode -> admin label
+MODES = {
+    "plan_chat": "Plan chat",
+    "prd_chat": "PRD chat",
+    "prd_generate": "PRD generation",
+    "enhance_light": "Light enhancement",
+    "enhance_medium": "Medium enhancement",
+    "enhance_heavy": "Heavy enhancement",
+}
+
+
+def setting_key(mode: str) -> str:
+    return f"model_{mode}"
+
+
+@dataclass
+class ModelStats:
+    ttft: float | None = None            # EWMA seconds to first token
+    tokens_per_second: float | None = None
+    error_rate: float = 0.0              # EWMA of 1 (error) / 0 (success)
+    samples: int = 0
+    requests: int = 0
+    errors: int = 0
+    tripped_until: float = 0.0
+    recent_ttft: deque = field(default_factory=lambda: deque(maxlen=200))
+
+
+class ModelRouter:
+    def __init__(self, ttft_threshold: float = 8.0, error_threshold: float = 0.5,
+                 cooldown: float = 60.0, alpha: float = 0.2, min_samples: int = 3,
+                 p95_min_samples: int = 20):
+        self.ttft_threshold = ttft_threshold
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.p95_min_samples = p95_min_samples
+        self._stats: dict[str, ModelStats] = {}
+        self._routes: dict[str, list[str]] = {}
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        return cls(
+            ttft_threshold=float(os.environ.get("AI_FALLBACK_TTFT_SECONDS", "8")),
+            error_threshold=float(os.environ.get("AI_FALLBACK_ERROR_RATE", "0.5")),
+            cooldown=float(os.environ.get("AI_FALLBACK_COOLDOWN_SECONDS", "60")),
+        )
+
+    async def models_for(self, mode: str) -> list[str]:
+        """Models to try for ``mode``, healthy ones first, in configured order."""
+        if mode not in self._routes:
+            value = await get_setting(setting_key(mode)) if mode in MODES else None
+            models = [m.strip() for m in (value or "").split(",") if m.strip()]
+            self._routes[mode] = models or [DEFAULT_MODEL]
+        configured = self._routes[mode]
+        healthy = [m for m in configured if self.healthy(m)]
+        return healthy + [m for m in configured if m not in healthy]
+
+    def invalidate(self):
+        """Forget cached routes; call after the model settings change."""
+        self._routes.clear()
+
+    def healthy(self, model: str) -> bool:
+        stats = self._stats.get(model)
+        if stats is None or not stats.tripped_until:
+            return True
+        if time.monotonic() < stats.tripped_until:
+            return False
+        # Cooldown over: start the error rate over, but keep the latency
+        # history, which hedging (``ttft_p95``) relies on.
+        stats.tripped_until = 0.0
+        stats.error_rate = 0.0
+        stats.samples = 0
+        return True
+
+    def record_first_token(self, model: str, seconds: float):
+        stats = self._get(model)
+        stats.ttft = self._ewma(stats.ttft, seconds)
+        stats.recent_ttft.append(seconds)
+        self._check(stats)
+
+    def ttft_p95(self, model: str) -> float | None:
+        """95th percentile of recent first-token latencies, once there are enough samples."""
+        stats = self._stats.get(model)
+        if stats is None or len(stats.recent_ttft) < self.p95_min_samples:
+            return None
+        ordered = sorted(stats.recent_ttft)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def record_success(self, model: str, output_tokens: int, stream_seconds: float):
+        stats = self._get(model)
+        stats.requests += 1
+        stats.samples += 1
+        stats.error_rate = self._ewma(stats.error_rate, 0.0)
+        if output_tokens and stream_seconds > 0:
+            stats.tokens_per_second = self._ewma(stats.tokens_per_second, output_tokens / stream_seconds)
+        self._check(stats)
+
+    def record_error(self, model: str):
+        stats = self._get(model)
+        stats.requests += 1
+        stats.errors += 1
+        stats.samples += 1
+        stats.error_rate = self._ewma(stats.error_rate, 1.0)
+        self._check(stats)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            model: {
+                "ttft_ms": round(s.ttft * 1000) if s.ttft is not None else None,
+                "ttft_p95_ms": round(p95 * 1000) if (p95 := self.ttft_p95(model)) is not None else None,
+                "tokens_per_second": round(s.tokens_per_second, 1) if s.tokens_per_second else None,
+                "error_rate": round(s.error_rate, 3),
+                "requests": s.requests,
+                "errors": s.errors,
+                "healthy": now >= s.tripped_until,
+            }
+            for model, s in sorted(self._stats.items())
+        }
+
+    def _get(self, model: str) -> ModelStats:
+        return self._stats.setdefault(model, ModelStats())
+
+    def _ewma(self, current: float | None, sample: float) -> float:
+        if current is None:
+            return sample
+        return self.alpha * sample + (1 - self.alpha) * current
+
+    def _check(self, stats: ModelStats):
+        if stats.samples < self.min_samples or time.monotonic() < stats.tripped_until:
+            return
+        slow = stats.ttft is not None and stats.ttft > self.ttft_threshold
+        failing = stats.error_rate > self.error_threshold
+        if slow or failing:
+            stats.tripped_until = time.monotonic() + self.cooldown
+
+
+router = ModelRouter.from_env()
@@ -0,0 +1,156 @@
+"""Concurrency-limited, fair scheduler for upstream AI calls.
+
+Every streaming endpoint takes a ticket before calling the model. Tickets are
+granted while the global and per-client concurrency caps allow it; otherwise
+they wait in a bounded queue per priority class. Interactive chat is always
+served before bulk enhancement, and within a class waiters are served oldest
+first, skipping clients that are already at their per-client cap.
+"""
+
+import asyncio
+import itertools
+import os
+from collections.abc import AsyncGenerator
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+
+class SchedulerOverloaded(Exception):
+    """Raised when a request cannot even be queued; callers should answer 429."""
+
+    def __init__(self, reason: str, retry_after: int = 2):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """A client's claim on one upstream AI slot."""
+
+    def __init__(self, scheduler: "AIScheduler", client_id: str, priority: int, seq: int):
+        self.scheduler = scheduler
+        self.client_id = client_id
+        self.priority = priority
+        self.seq = seq
+        self.granted = False
+        self.released = False
+        self._changed = asyncio.Event()
+
+    async def wait(self) -> AsyncGenerator[int, None]:
+        """Yield the 1-based queue position whenever it changes, until granted."""
+        last = None
+        while not self.granted:
+            position = self.scheduler.position(self)
+            if position != last:
+                last = position
+                yield position
+            self._changed.clear()
+            if self.granted:
+                break
+            await self._changed.wait()
+
+    def release(self):
+        """Give the slot (or queue place) back. Safe to call more than once."""
+        if not self.released:
+            self.released = True
+            self.scheduler._release(self)
+
+
+class AIScheduler:
+    def __init__(self, max_concurrency: int = 4, max_per_client: int = 3,
+                 max_queue: int = 16, max_queued_per_client: int = 4):
+        self.max_concurrency = max_concurrency
+        self.max_per_client = max_per_client
+        self.max_queue = max_queue
+        self.max_queued_per_client = max_queued_per_client
+        self._seq = itertools.count()
+        self._waiting: list[Ticket] = []
+        self._active: dict[str, int] = {}
+        self._active_total = 0
+
+    @classmethod
+    def from_env(cls) -> "AIScheduler":
+        return cls(
+            max_concurrency=int(os.environ.get("AI_MAX_CONCURRENCY", "4")),
+            max_per_client=int(os.environ.get("AI_MAX_PER_CLIENT", "3")),
+            max_queue=int(os.environ.get("AI_MAX_QUEUE", "16")),
+            max_queued_per_client=int(os.environ.get("AI_MAX_QUEUED_PER_CLIENT", "4")),
+        )
+
+    def submit(self, client_id: str, priority: int = PRIORITY_INTERACTIVE) -> Ticket:
+        """Take a ticket, granting it immediately if there is spare capacity.
+
+        Raises SchedulerOverloaded instead of queueing past the configured bounds.
+        """
+        ticket = Ticket(self, client_id, priority, next(self._seq))
+        self._waiting.append(ticket)
+        self._waiting.sort(key=lambda t: (t.priority, t.seq))
+        self._dispatch()
+        if ticket.granted:
+            return ticket
+        same_class = sum(1 for t in self._waiting if t.priority == priority)
+        queued_by_client = sum(1 for t in self._waiting if t.client_id == client_id)
+        if same_class > self.max_queue:
+            self._waiting.remove(ticket)
+            raise SchedulerOverloaded("AI queue is full")
+        if queued_by_client > self.max_queued_per_client:
+            self._waiting.remove(ticket)
+            raise SchedulerOverloaded("Too many queued AI requests for this client")
+        return ticket
+
+    def position(self, ticket: Ticket) -> int:
+        """1-based position of a waiting ticket, or 0 once it has been granted."""
+        if ticket.granted:
+            return 0
+        for i, t in enumerate(self._waiting, start=1):
+            if t is ticket:
+                return i
+        return 0
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active_total,
+            "waiting": len(self._waiting),
+            "max_concurrency": self.max_concurrency,
+            "max_per_client": self.max_per_client,
+            "max_queue": self.max_queue,
+        }
+
+    def _can_run(self, client_id: str) -> bool:
+        return (
+            self._active_total < self.max_concurrency
+            and self._active.get(client_id, 0) < self.max_per_client
+        )
+
+    def _grant(self, ticket: Ticket):
+        ticket.granted = True
+        self._active_total += 1
+        self._active[ticket.client_id] = self._active.get(ticket.client_id, 0) + 1
+        ticket._changed.set()
+
+    def _release(self, ticket: Ticket):
+        if ticket.granted:
+            self._active_total -= 1
+            remaining = self._active.get(ticket.client_id, 1) - 1
+            if remaining:
+                self._active[ticket.client_id] = remaining
+            else:
+                self._active.pop(ticket.client_id, None)
+        elif ticket in self._waiting:
+            self._waiting.remove(ticket)
+        self._dispatch()
+
+    def _dispatch(self):
+        """Grant waiting tickets in priority/FIFO order while capacity allows."""
+        while self._active_total < self.max_concurrency:
+            nxt = next((t for t in self._waiting if self._can_run(t.client_id)), None)
+            if nxt is None:
+                break
+            self._waiting.remove(nxt)
+            self._grant(nxt)
+        # Positions may have shifted for everyone still queued.
+        for t in self._waiting:
+            t._changed.set()
+
+
+scheduler = AIScheduler.from_env()
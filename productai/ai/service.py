@@ -1,14 +1,37 @@
 """Claude AI service for streaming product management assistance."""
 
+import asyncio
 import os
 import json
+import logging
+import time
 from collections.abc import AsyncGenerator
-from anthropic import AsyncAnthropic
+from functools import cache
+from typing import TYPE_CHECKING
 from .prompts import (
     PLAN_MODE_SYSTEM, PRD_GENERATION_SYSTEM, PRD_REFINE_SYSTEM,
     ENHANCE_LIGHT_SYSTEM, ENHANCE_MEDIUM_SYSTEM, ENHANCE_HEAVY_SYSTEM,
 )
 from ..db.models import get_setting
+from . import telemetry
+from .routing import router
+
+if TYPE_CHECKING:
+    from anthropic import AsyncAnthropic
+
+log = logging.getLogger(__name__)
+
+FIRST_TOKEN_TIMEOUT = float(os.environ.get("AI_FIRST_TOKEN_TIMEOUT_SECONDS", "30"))
+INTER_TOKEN_TIMEOUT = float(os.environ.get("AI_INTER_TOKEN_TIMEOUT_SECONDS", "30"))
+# Interactive modes that may send a second, hedged request when the first is
+# slower than the model's observed p95 time-to-first-token.
+HEDGE_MODES = {
+    m.strip() for m in os.environ.get("AI_HEDGE_MODES", "plan_chat,prd_chat").split(",") if m.strip()
+}
+
+
+class AIStreamTimeout(Exception):
+    """The model produced no output within the first-token or inter-token deadline."""
 
 
 _cached_db_key: str | None = None
@@ -34,53 +57,238 @@ def invalidate_api_key_cache():
     _cached_db_key_loaded = False
 
 
-def get_client_sync(api_key: str = "") -> AsyncAnthropic:
-    return AsyncAnthropic(api_key=api_key)
+@cache
+def sdk():
+    """The ``anthropic`` module, imported on first use: it takes most of the
+    app's import time, and a worker can serve pages long before its first AI
+    call. ``app`` preloads it in the background after startup."""
+    import anthropic
+    return anthropic
 
 
-async def get_client() -> AsyncAnthropic:
+def get_client_sync(api_key: str = "") -> "AsyncAnthropic":
+    return sdk().AsyncAnthropic(api_key=api_key)
+
+
+async def get_client() -> "AsyncAnthropic":
     key = await _get_api_key()
-    return AsyncAnthropic(api_key=key)
+    return sdk().AsyncAnthropic(api_key=key)
+
+
+class _Attempt:
+    """One upstream streaming request, run in a task that feeds a queue.
+
+    Queue items are ``("token", text)``, then ``("done", usage)`` or
+    ``("error", exc)``.
+    """
+
+    def __init__(self, client: "AsyncAnthropic", model: str, system_prompt: str, messages: list[dict]):
+        self.model = model
+        self.started = time.monotonic()
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run(client, system_prompt, messages))
+
+    async def _run(self, client: "AsyncAnthropic", system_prompt: str, messages: list[dict]):
+        try:
+            async with client.messages.stream(
+                model=self.model,
+                max_tokens=4096,
+                system=system_prompt,
+                messages=messages,
+            ) as stream:
+                async for text in stream.text_stream:
+                    self.queue.put_nowait(("token", text))
+                final = await stream.get_final_message()
+            self.queue.put_nowait(("done", final.usage))
+        except Exception as exc:
+            self.queue.put_nowait(("error", exc))
+
+    async def next(self, timeout: float) -> tuple[str, object]:
+        try:
+            async with asyncio.timeout(timeout):
+                return await self.queue.get()
+        except TimeoutError:
+            raise AIStreamTimeout(f"{self.model} produced no output for {timeout:g}s") from None
+
+    def cancel(self):
+        self.task.cancel()
+
+
+# Error types a stream reports in-band (with HTTP 200) for a server-side failure.
+_SERVER_ERROR_TYPES = {"api_error", "overloaded_error", "rate_limit_error"}
+
+
+def _model_failure(exc: Exception) -> bool:
+    """Whether ``exc`` says the model is unavailable, rather than that the request is bad.
+
+    Only these count against the model in the router and move on to the next
+    one: a 400 such as an over-long prompt would fail on every model.
+    """
+    anthropic = sdk()
+    if isinstance(exc, (AIStreamTimeout, anthropic.APIConnectionError, anthropic.RateLimitError)):
+        return True
+    if not isinstance(exc, anthropic.APIStatusError):
+        return False
+    # 5xx includes 529 Overloaded, which is not an InternalServerError subclass.
+    if exc.status_code >= 500:
+        return True
+    if exc.status_code < 400:
+        body = exc.body if isinstance(exc.body, dict) else {}
+        return (body.get("error") or {}).get("type") in _SERVER_ERROR_TYPES
+    return False
+
+
+async def _first_event(start, hedge_after: float | None) -> tuple[_Attempt, str, object]:
+    """Wait for the first event of a request, hedging it once after ``hedge_after`` seconds.
+
+    The first attempt to produce output wins and the other is cancelled. An
+    attempt that fails while another is still running is simply dropped.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + FIRST_TOKEN_TIMEOUT
+    hedge_at = loop.time() + hedge_after if hedge_after is not None else None
+    attempts = [start()]
+    getters: dict[asyncio.Future, _Attempt] = {}
+    winner = None
+    try:
+        while True:
+            for attempt in attempts:
+                if attempt not in getters.values():
+                    getters[asyncio.ensure_future(attempt.queue.get())] = attempt
+            wake = min(deadline, hedge_at) if hedge_at is not None else deadline
+            done, _ = await asyncio.wait(
+                getters, timeout=max(0.0, wake - loop.time()), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                if loop.time() >= deadline:
+                    raise AIStreamTimeout(
+                        f"{attempts[0].model} produced no output within {FIRST_TOKEN_TIMEOUT:g}s"
+                    )
+                hedge_at = None
+                log.info("Hedging %s request after %.2fs without a first token", attempts[0].model, hedge_after)
+                attempts.append(start())
+                continue
+            for getter in done:
+                attempt = getters.pop(getter)
+                kind, value = getter.result()
+                if kind == "error" and len(attempts) > 1:
+                    attempts.remove(attempt)
+                    hedge_at = None
+                    continue
+                winner = attempt
+                return attempt, kind, value
+    finally:
+        for getter in getters:
+            getter.cancel()
+        for attempt in attempts:
+            if attempt is not winner:
+                attempt.cancel()
 
 
 async def stream_chat(
     system_prompt: str,
     messages: list[dict],
-    model: str = "claude-sonnet-4-20250514",
+    model: str | None = None,
+    mode: str = "default",
 ) -> AsyncGenerator[str, None]:
-    """Stream a Claude response token by token."""
+    """Stream a Claude response token by token.
+
+    Without an explicit ``model`` the router picks one for ``mode``. A model
+    that is unavailable (see ``_model_failure``) or times out before producing
+    any output is recorded and the next one tried; a request the API rejects
+    is raised at once. After the first token, an error or a gap longer than
+    the inter-token deadline ends the stream. In ``HEDGE_MODES`` a duplicate
+    request is sent when the first is slower than the model's p95
+    time-to-first-token.
+    """
     client = await get_client()
-    async with client.messages.stream(
-        model=model,
-        max_tokens=4096,
-        system=system_prompt,
-        messages=messages,
-    ) as stream:
-        async for text in stream.text_stream:
-            yield text
+    anthropic = sdk()
+    models = [model] if model else await router.models_for(mode)
+    for i, candidate in enumerate(models):
+        started = time.monotonic()
+        hedge_after = router.ttft_p95(candidate) if mode in HEDGE_MODES else None
+        try:
+            attempt, kind, value = await _first_event(
+                lambda: _Attempt(client, candidate, system_prompt, messages), hedge_after
+            )
+            if kind == "error":
+                raise value
+        except (anthropic.APIError, AIStreamTimeout) as exc:
+            telemetry.record(mode, candidate, _outcome(exc), started)
+            if not _model_failure(exc):
+                raise
+            router.record_error(candidate)
+            if i == len(models) - 1:
+                raise
+            log.warning("Model %s failed for %s (%s); falling back to %s", candidate, mode, exc, models[i + 1])
+            continue
+
+        first_token_at = time.monotonic()
+        ttft = first_token_at - started if kind == "token" else None
+        if ttft is not None:
+            router.record_first_token(candidate, first_token_at - attempt.started)
+        outcome = "cancelled"
+        try:
+            while kind == "token":
+                yield value
+                kind, value = await attempt.next(INTER_TOKEN_TIMEOUT)
+            if kind == "error":
+                raise value
+            outcome = "ok"
+        except (anthropic.APIError, AIStreamTimeout) as exc:
+            if _model_failure(exc):
+                router.record_error(candidate)
+            outcome = _outcome(exc)
+            raise
+        finally:
+            attempt.cancel()
+            telemetry.record(mode, candidate, outcome, started, ttft, value if outcome == "ok" else None)
+        router.record_success(candidate, value.output_tokens, time.monotonic() - first_token_at)
+        return
+
+
+def _outcome(exc: Exception) -> str:
+    return "timeout" if isinstance(exc, AIStreamTimeout) else "error"
 
 
 async def generate_full(
     system_prompt: str,
     messages: list[dict],
-    model: str = "claude-sonnet-4-20250514",
+    model: str | None = None,
+    mode: str = "default",
 ) -> str:
     """Get a complete Claude response (non-streaming)."""
     client = await get_client()
-    response = await client.messages.create(
-        model=model,
-        max_tokens=4096,
-        system=system_prompt,
-        messages=messages,
-    )
-    return response.content[0].text
+    anthropic = sdk()
+    models = [model] if model else await router.models_for(mode)
+    for i, candidate in enumerate(models):
+        started = time.monotonic()
+        try:
+            response = await client.messages.create(
+                model=candidate,
+                max_tokens=4096,
+                system=system_prompt,
+                messages=messages,
+            )
+        except anthropic.APIError as exc:
+            telemetry.record(mode, candidate, "error", started)
+            if not _model_failure(exc):
+                raise
+            router.record_error(candidate)
+            if i == len(models) - 1:
+                raise
+            log.warning("Model %s failed for %s (%s); falling back to %s", candidate, mode, exc, models[i + 1])
+            continue
+        router.record_success(candidate, response.usage.output_tokens, time.monotonic() - started)
+        telemetry.record(mode, candidate, "ok", started, usage=response.usage)
+        return response.content[0].text
 
 
 async def stream_plan_chat(
     messages: list[dict],
 ) -> AsyncGenerator[str, None]:
     """Stream a plan-mode conversation response."""
-    async for token in stream_chat(PLAN_MODE_SYSTEM, messages):
+    async for token in stream_chat(PLAN_MODE_SYSTEM, messages, mode="plan_chat"):
         yield token
 
 
@@ -94,7 +302,7 @@ async def stream_prd_generation(
             "content": f"Generate a comprehensive PRD based on the following context:\n\n{context}",
         }
     ]
-    async for token in stream_chat(PRD_GENERATION_SYSTEM, messages):
+    async for token in stream_chat(PRD_GENERATION_SYSTEM, messages, mode="prd_generate"):
         yield token
 
 
@@ -112,7 +320,7 @@ async def stream_prd_refinement(
             "content": f"Here is the current PRD:\n\n{current_prd}\n\nPlease help with: {instruction}",
         }
     )
-    async for token in stream_chat(PRD_REFINE_SYSTEM, messages):
+    async for token in stream_chat(PRD_REFINE_SYSTEM, messages, mode="prd_chat"):
         yield token
 
 
@@ -136,6 +344,11 @@ async def _get_enhance_prompt(intensity: str) -> str:
     return prompt or ENHANCE_FALLBACKS.get(intensity, ENHANCE_MEDIUM_SYSTEM)
 
 
+def _enhance_mode(intensity: str) -> str:
+    """Routing mode for an enhancement intensity (same keys as the prompts)."""
+    return ENHANCE_SETTING_KEYS.get(intensity, "enhance_medium")
+
+
 async def stream_enhance_field(
     text: str,
     field_label: str,
@@ -151,7 +364,7 @@ async def stream_enhance_field(
     if instruction:
         user_content += f"\n\nAdditional instructions from the user: {instruction}"
     messages = [{"role": "user", "content": user_content}]
-    async for token in stream_chat(system, messages):
+    async for token in stream_chat(system, messages, mode=_enhance_mode(intensity)):
         yield token
 
 
@@ -177,7 +390,7 @@ async def stream_enhance_selection(
     if instruction:
         user_content += f"\n\nAdditional instructions from the user: {instruction}"
     messages = [{"role": "user", "content": user_content}]
-    async for token in stream_chat(system, messages):
+    async for token in stream_chat(system, messages, mode=_enhance_mode(intensity)):
         yield token
 
 
@@ -194,5 +407,5 @@ async def generate_plan_summary(plan_data: dict) -> AsyncGenerator[str, None]:
             ),
         }
     ]
-    async for token in stream_chat(PLAN_MODE_SYSTEM, messages):
+    async for token in stream_chat(PLAN_MODE_SYSTEM, messages, mode="plan_chat"):
         yield token
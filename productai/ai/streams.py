@@ -0,0 +1,100 @@
+"""Connection-independent AI streams with replay.
+
+A generation runs as a background task that publishes events into a buffer
+kept under a random stream id. HTTP responses only subscribe to that buffer,
+so a browser disconnect no longer cancels the model call or loses the result:
+the producer always runs to completion (and persists), and a reconnecting
+client replays every event after its ``Last-Event-ID``. Finished streams are
+kept for ``STREAM_TTL`` seconds.
+"""
+
+import asyncio
+import logging
+import os
+import secrets
+import time
+from collections.abc import AsyncGenerator, Awaitable, Callable
+
+log = logging.getLogger(__name__)
+
+STREAM_TTL = float(os.environ.get("AI_STREAM_TTL_SECONDS", "300"))
+
+
+class BufferedStream:
+    def __init__(self, stream_id: str):
+        self.id = stream_id
+        self.events: list[dict] = []
+        self.finished = False
+        self.finished_at = 0.0
+        self.task: asyncio.Task | None = None
+        self._waiters: list[asyncio.Future] = []
+
+    def publish(self, event: dict):
+        self.events.append(event)
+        self._wake()
+
+    def finish(self):
+        self.finished = True
+        self.finished_at = time.monotonic()
+        self._wake()
+
+    async def subscribe(self, after: int = 0) -> AsyncGenerator[tuple[int, dict], None]:
+        """Yield ``(event_id, event)`` for every event after ``after``, live until finished.
+
+        Event ids are 1-based positions in the buffer.
+        """
+        position = max(0, after)
+        while True:
+            while position < len(self.events):
+                position += 1
+                yield position, self.events[position - 1]
+            if self.finished:
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def _wake(self):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+
+_streams: dict[str, BufferedStream] = {}
+
+
+def start(producer: Callable[[BufferedStream], Awaitable[None]]) -> BufferedStream:
+    """Run ``producer`` in the background, publishing into a new buffered stream."""
+    _purge_expired()
+    stream = BufferedStream(secrets.token_urlsafe(12))
+    _streams[stream.id] = stream
+    stream.task = asyncio.create_task(_run(stream, producer))
+    return stream
+
+
+def get(stream_id: str) -> BufferedStream | None:
+    _purge_expired()
+    return _streams.get(stream_id)
+
+
+async def _run(stream: BufferedStream, producer: Callable[[BufferedStream], Awaitable[None]]):
+    try:
+        await producer(stream)
+    except Exception as exc:
+        log.exception("AI stream %s failed", stream.id)
+        stream.publish({"done": True, "error": str(exc)})
+    finally:
+        stream.finish()
+
+
+def _purge_expired():
+    cutoff = time.monotonic() - STREAM_TTL
+    for stream_id in [
+        sid for sid, s in _streams.items() if s.finished and s.finished_at < cutoff
+    ]:
+        del _streams[stream_id]
@@ -0,0 +1,286 @@
+"""Per-call telemetry for upstream AI requests.
+
+``ai.service`` records one ``CallRecord`` per model attempt: mode, model,
+outcome, token usage (including prompt-cache reads/writes), time to first token
+and total duration. Records go into an in-memory ring buffer, which answers
+recent windows with exact percentiles, and are periodically rolled up into the
+``ai_call_rollup`` table (hourly buckets with fixed latency histograms), which
+answers longer windows and survives restarts.
+"""
+
+import asyncio
+import bisect
+import json
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+from .. import metrics
+from ..db import models
+
+log = logging.getLogger(__name__)
+
+BUFFER_SIZE = int(os.environ.get("AI_TELEMETRY_BUFFER", "5000"))
+FLUSH_INTERVAL = float(os.environ.get("AI_TELEMETRY_FLUSH_SECONDS", "60"))
+
+WINDOWS = {"5m": 300, "1h": 3600, "24h": 86400, "7d": 604800}
+
+# Upper edges (ms) of the latency histogram buckets kept in the rollup table;
+# the last bucket is open-ended.
+HISTOGRAM_EDGES_MS = [
+    50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000,
+    5000, 7500, 10000, 15000, 20000, 30000, 60000, 120000,
+]
+
+# USD per million tokens: (input, output, cache write, cache read), matched by
+# substring of the model id. Override with AI_PRICES as JSON of the same shape.
+PRICES = {
+    "opus": (15.0, 75.0, 18.75, 1.50),
+    "sonnet": (3.0, 15.0, 3.75, 0.30),
+    "haiku": (0.80, 4.0, 1.0, 0.08),
+}
+PRICES.update({k: tuple(v) for k, v in json.loads(os.environ.get("AI_PRICES", "{}")).items()})
+
+
+# Outcomes that count as errors; a client hanging up (cancelled) is not one
+ERROR_OUTCOMES = frozenset({"error", "timeout"})
+
+
+class CallRecord(NamedTuple):
+    ts: float              # wall-clock start, epoch seconds
+    mode: str
+    model: str
+    outcome: str           # ok | error | timeout | cancelled
+    input_tokens: int
+    output_tokens: int
+    cache_read_tokens: int
+    cache_creation_tokens: int
+    ttft: float | None     # seconds
+    duration: float        # seconds
+
+
+_buffer: deque[CallRecord] = deque(maxlen=BUFFER_SIZE)
+_pending: list[CallRecord] = []
+_started = time.time()
+_complete_since = _started  # the buffer holds every call since this time
+
+
+def record(mode: str, model: str, outcome: str, started: float, ttft: float | None = None,
+           usage=None):
+    """Record one model attempt. ``started`` is a ``time.monotonic()`` value."""
+    global _complete_since
+    duration = time.monotonic() - started
+    metrics.add("ai", duration)
+    rec = CallRecord(
+        ts=time.time() - duration,
+        mode=mode,
+        model=model,
+        outcome=outcome,
+        input_tokens=getattr(usage, "input_tokens", 0) or 0,
+        output_tokens=getattr(usage, "output_tokens", 0) or 0,
+        cache_read_tokens=getattr(usage, "cache_read_input_tokens", 0) or 0,
+        cache_creation_tokens=getattr(usage, "cache_creation_input_tokens", 0) or 0,
+        ttft=ttft,
+        duration=duration,
+    )
+    if len(_buffer) == _buffer.maxlen:
+        _complete_since = _buffer[0].ts
+    _buffer.append(rec)
+    _pending.append(rec)
+
+
+def cost(model: str, input_tokens: int, output_tokens: int,
+         cache_creation_tokens: int, cache_read_tokens: int) -> float:
+    prices = next((p for key, p in PRICES.items() if key in model), None)
+    if prices is None:
+        return 0.0
+    return (
+        input_tokens * prices[0]
+        + output_tokens * prices[1]
+        + cache_creation_tokens * prices[2]
+        + cache_read_tokens * prices[3]
+    ) / 1_000_000
+
+
+# ── Rollup ─────────────────────────────────────────────
+
+def _bucket(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:00")
+
+
+def _histogram(values_ms: list[float]) -> list[int]:
+    counts = [0] * (len(HISTOGRAM_EDGES_MS) + 1)
+    for v in values_ms:
+        counts[bisect.bisect_left(HISTOGRAM_EDGES_MS, v)] += 1
+    return counts
+
+
+async def flush():
+    """Fold pending records into the hourly rollup table."""
+    global _pending
+    if not _pending:
+        return
+    batch, _pending = _pending, []
+    groups: dict[tuple, list[CallRecord]] = {}
+    for rec in batch:
+        groups.setdefault((_bucket(rec.ts), rec.mode, rec.model, rec.outcome), []).append(rec)
+    rows = []
+    for (bucket, mode, model, outcome), recs in groups.items():
+        rows.append({
+            "bucket": bucket, "mode": mode, "model": model, "outcome": outcome,
+            "calls": len(recs),
+            "input_tokens": sum(r.input_tokens for r in recs),
+            "output_tokens": sum(r.output_tokens for r in recs),
+            "cache_read_tokens": sum(r.cache_read_tokens for r in recs),
+            "cache_creation_tokens": sum(r.cache_creation_tokens for r in recs),
+            "stream_seconds": sum(r.duration - r.ttft for r in recs if r.ttft is not None),
+            "ttft_hist": _histogram([r.ttft * 1000 for r in recs if r.ttft is not None]),
+            "duration_hist": _histogram([r.duration * 1000 for r in recs]),
+        })
+    try:
+        await models.merge_ai_call_rollup(rows)
+    except Exception:
+        log.exception("Failed to write AI telemetry rollup")
+        _pending = batch + _pending
+
+
+async def run_flusher():
+    """Background task: flush every ``FLUSH_INTERVAL`` seconds until cancelled."""
+    try:
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await flush()
+    finally:
+        await flush()
+
+
+# ── Summaries ──────────────────────────────────────────
+
+def _percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def _histogram_percentile(counts: list[int], p: float) -> float | None:
+    """Upper edge (ms) of the bucket holding the p-th percentile; ``None`` if open-ended."""
+    total = sum(counts)
+    if not total:
+        return None
+    target = total * p / 100
+    running = 0
+    for i, c in enumerate(counts):
+        running += c
+        if running >= target and c:
+            return HISTOGRAM_EDGES_MS[i] if i < len(HISTOGRAM_EDGES_MS) else None
+    return None
+
+
+def _ms(seconds: float | None) -> int | None:
+    return None if seconds is None else round(seconds * 1000)
+
+
+def _finish_group(g: dict) -> dict:
+    tokens = g.pop("_tokens_per_second_inputs")
+    g["error_rate"] = round(g["errors"] / g["calls"], 3) if g["calls"] else 0.0
+    g["tokens_per_second"] = round(tokens[0] / tokens[1], 1) if tokens[1] > 0 else None
+    g["cost_usd"] = round(g["cost_usd"], 4)
+    return g
+
+
+def _empty_group(mode: str, model: str) -> dict:
+    return {
+        "mode": mode, "model": model, "calls": 0, "errors": 0,
+        "input_tokens": 0, "output_tokens": 0, "cache_read_tokens": 0, "cache_creation_tokens": 0,
+        "cost_usd": 0.0, "_tokens_per_second_inputs": [0, 0.0],
+    }
+
+
+def _add_usage(g: dict, model: str, calls: int, failed: bool, inp: int, out: int,
+               cache_read: int, cache_creation: int, stream_seconds: float):
+    g["calls"] += calls
+    g["errors"] += calls if failed else 0
+    g["input_tokens"] += inp
+    g["output_tokens"] += out
+    g["cache_read_tokens"] += cache_read
+    g["cache_creation_tokens"] += cache_creation
+    g["cost_usd"] += cost(model, inp, out, cache_creation, cache_read)
+    if stream_seconds > 0:
+        g["_tokens_per_second_inputs"][0] += out
+        g["_tokens_per_second_inputs"][1] += stream_seconds
+
+
+def _from_buffer(since: float) -> list[dict]:
+    groups: dict[tuple, dict] = {}
+    latencies: dict[tuple, tuple[list, list]] = {}
+    for r in _buffer:
+        if r.ts < since:
+            continue
+        key = (r.mode, r.model)
+        g = groups.setdefault(key, _empty_group(r.mode, r.model))
+        _add_usage(g, r.model, 1, r.outcome in ERROR_OUTCOMES, r.input_tokens, r.output_tokens,
+                   r.cache_read_tokens, r.cache_creation_tokens,
+                   r.duration - r.ttft if r.ttft is not None else 0.0)
+        ttfts, durations = latencies.setdefault(key, ([], []))
+        if r.ttft is not None:
+            ttfts.append(r.ttft)
+        durations.append(r.duration)
+    result = []
+    for key, g in groups.items():
+        ttfts, durations = latencies[key]
+        for p in (50, 95, 99):
+            g[f"ttft_p{p}_ms"] = _ms(_percentile(ttfts, p))
+            g[f"duration_p{p}_ms"] = _ms(_percentile(durations, p))
+        result.append(_finish_group(g))
+    return result
+
+
+async def _from_rollup(since: float) -> list[dict]:
+    await flush()
+    groups: dict[tuple, dict] = {}
+    hists: dict[tuple, tuple[list, list]] = {}
+    width = len(HISTOGRAM_EDGES_MS) + 1
+    for row in await models.list_ai_call_rollup(_bucket(since)):
+        key = (row["mode"], row["model"])
+        g = groups.setdefault(key, _empty_group(row["mode"], row["model"]))
+        _add_usage(g, row["model"], row["calls"], row["outcome"] in ERROR_OUTCOMES, row["input_tokens"],
+                   row["output_tokens"], row["cache_read_tokens"], row["cache_creation_tokens"],
+                   row["stream_seconds"])
+        ttft, duration = hists.setdefault(key, ([0] * width, [0] * width))
+        for acc, raw in ((ttft, row["ttft_hist"]), (duration, row["duration_hist"])):
+            for i, c in enumerate(json.loads(raw)):
+                acc[i] += c
+    result = []
+    for key, g in groups.items():
+        ttft, duration = hists[key]
+        for p in (50, 95, 99):
+            g[f"ttft_p{p}_ms"] = _histogram_percentile(ttft, p)
+            g[f"duration_p{p}_ms"] = _histogram_percentile(duration, p)
+        result.append(_finish_group(g))
+    return result
+
+
+async def summary(window: str = "1h") -> dict:
+    """Per mode/model stats for a window from ``WINDOWS``.
+
+    Windows the ring buffer fully covers get exact percentiles; longer ones are
+    answered from the hourly rollup, where percentiles are histogram bucket
+    upper bounds and the window is rounded down to the hour.
+    """
+    seconds = WINDOWS.get(window, WINDOWS["1h"])
+    since = time.time() - seconds
+    if since >= _complete_since:
+        source, groups = "buffer", _from_buffer(since)
+    else:
+        source, groups = "rollup", await _from_rollup(since)
+    groups.sort(key=lambda g: (g["mode"], g["model"]))
+    totals = {
+        "calls": sum(g["calls"] for g in groups),
+        "errors": sum(g["errors"] for g in groups),
+        "cost_usd": round(sum(g["cost_usd"] for g in groups), 4),
+    }
+    return {"window": window, "source": source, "totals": totals, "groups": groups}
@@ -0,0 +1,193 @@
+"""Compact binary word index for autocomplete, read through ``mmap``.
+
+Layout (little-endian)::
+
+    header        magic, format version, word count, string table size,
+                  prefix node count, top-k width, prefix string table size
+    offsets       uint32[count + 1]  byte offset of each word in the string table
+    scores        int32[count]       context-independent ranking score per word
+    node_offsets  uint32[nodes + 1]  byte offset of each prefix in its string table
+    top           uint32[nodes * k]  best-ranked word indices under each prefix
+    strings       UTF-8 words, sorted, concatenated without separators
+    node_strings  UTF-8 prefixes, sorted, concatenated
+
+UTF-8 byte order matches code point order, so the offsets can be bisected
+directly against an encoded prefix. Prefix nodes exist only for prefixes
+matching more than ``min_matches`` words; each stores the ``k`` best words
+under that prefix (excluding the prefix itself) in rank order, so a lookup
+never scans a large range. Opening an index maps the file read-only: startup
+does no parsing, and every worker process shares the same page-cache pages.
+"""
+
+import bisect
+import heapq
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+MAGIC = b"PAIWORDS"
+VERSION = 2
+HEADER = struct.Struct("<8sIIIIII")
+_NO_WORD = 0xFFFFFFFF
+
+
+class IndexFormatError(ValueError):
+    """The file is not a word index this code can read."""
+
+
+def _packed(strings: list[str]) -> tuple[array, bytes]:
+    table = bytearray()
+    offsets = array("I", [0])
+    for value in strings:
+        table += value.encode()
+        offsets.append(len(table))
+    return offsets, bytes(table)
+
+
+def prefix_nodes(words: list[str], scores: list[int], k: int,
+                 min_matches: int) -> list[tuple[str, list[int]]]:
+    """Top-``k`` word indices for every prefix (2+ chars) matching more than ``min_matches`` words.
+
+    Words rank by descending score, then alphabetically; a word equal to the
+    prefix is left out, as suggestions never repeat what was typed.
+    """
+    nodes = []
+
+    def rank(i: int) -> tuple[int, int]:
+        return -scores[i], i
+
+    def visit(prefix: str, lo: int, hi: int):
+        start = lo + 1 if lo < hi and words[lo] == prefix else lo
+        if len(prefix) >= 2:
+            nodes.append((prefix, heapq.nsmallest(k, range(start, hi), key=rank)))
+        depth = len(prefix)
+        i = start
+        while i < hi:
+            child = words[i][:depth + 1]
+            j = bisect.bisect_left(words, child[:-1] + chr(ord(child[-1]) + 1), i, hi)
+            if j - i > min_matches:
+                visit(child, i, j)
+            i = j
+
+    visit("", 0, len(words))
+    return nodes
+
+
+def encode(words: list[str], scores: list[int], k: int = 16, min_matches: int = 64) -> bytes:
+    """Serialize sorted ``words`` and their ``scores`` into the index format."""
+    if len(words) != len(scores):
+        raise ValueError("words and scores must have the same length")
+    offsets, strings = _packed(words)
+    nodes = prefix_nodes(words, scores, k, min_matches)
+    node_offsets, node_strings = _packed([prefix for prefix, _ in nodes])
+    top = array("I")
+    for _, best in nodes:
+        top.extend(best + [_NO_WORD] * (k - len(best)))
+    packed_scores = array("i", scores)
+    arrays = [offsets, packed_scores, node_offsets, top]
+    if sys.byteorder != "little":
+        for values in arrays:
+            values.byteswap()
+    return b"".join([
+        HEADER.pack(MAGIC, VERSION, len(words), len(strings), len(nodes), k, len(node_strings)),
+        *(values.tobytes() for values in arrays),
+        strings,
+        node_strings,
+    ])
+
+
+def write(path: str, words: list[str], scores: list[int]):
+    """Write an index atomically: running processes keep their old mapping."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(encode(words, scores))
+    os.replace(tmp, path)
+
+
+class _Strings:
+    """Sequence of the encoded strings in a packed table, for ``bisect``."""
+
+    def __init__(self, offsets, table: memoryview):
+        self.offsets = offsets
+        self.table = table
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return bytes(self.table[self.offsets[i]:self.offsets[i + 1]])
+
+
+class WordIndex:
+    def __init__(self, buffer):
+        view = memoryview(buffer)
+        if len(view) < HEADER.size:
+            raise IndexFormatError("truncated header")
+        magic, version, count, strings_size, nodes, k, node_strings_size = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise IndexFormatError("not a word index")
+        if version != VERSION:
+            raise IndexFormatError(f"unsupported index version {version}")
+        sections = []
+        pos = HEADER.size
+        for size in (4 * (count + 1), 4 * count, 4 * (nodes + 1), 4 * nodes * k,
+                     strings_size, node_strings_size):
+            sections.append(view[pos:pos + size])
+            pos += size
+        if len(view) != pos:
+            raise IndexFormatError("size does not match header")
+
+        self.buffer = buffer
+        self._count = count
+        self.k = k
+        offsets, scores, node_offsets, top, strings, node_strings = sections
+        self.scores = self._ints(scores, "i")
+        self.top = self._ints(top, "I")
+        self._words = _Strings(self._ints(offsets, "I"), strings)
+        self._prefixes = _Strings(self._ints(node_offsets, "I"), node_strings)
+
+    @classmethod
+    def open(cls, path: str) -> "WordIndex":
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @staticmethod
+    def _ints(view: memoryview, code: str):
+        if sys.byteorder == "little":
+            return view.cast(code)
+        values = array(code, view)  # big-endian host: one-off swapped copy
+        values.byteswap()
+        return values
+
+    def __len__(self) -> int:
+        return self._count
+
+    def raw(self, i: int) -> bytes:
+        return self._words[i]
+
+    def word(self, i: int) -> str:
+        return self.raw(i).decode()
+
+    def range(self, lo: str, hi: str, start: int = 0, stop: int | None = None) -> tuple[int, int]:
+        """Index range of words ``w`` with ``lo <= w < hi``, searching ``[start, stop)``."""
+        stop = self._count if stop is None else stop
+        first = bisect.bisect_left(self._words, lo.encode(), start, stop)
+        return first, bisect.bisect_left(self._words, hi.encode(), first, stop)
+
+    def find(self, word: str) -> int | None:
+        encoded = word.encode()
+        i = bisect.bisect_left(self._words, encoded)
+        if i < self._count and self._words[i] == encoded:
+            return i
+        return None
+
+    def best(self, prefix: str) -> list[int] | None:
+        """Precomputed top-``k`` word indices under ``prefix``, if it has a node."""
+        encoded = prefix.encode()
+        node = bisect.bisect_left(self._prefixes, encoded)
+        if node == len(self._prefixes) or self._prefixes[node] != encoded:
+            return None
+        return [i for i in self.top[node * self.k:(node + 1) * self.k] if i != _NO_WORD]
@@ -1,23 +1,61 @@
 """ProductAI — AI-powered Product Management Service."""
 
+import time
+
+_import_started = time.perf_counter()
+
 import asyncio
+import inspect
+import logging
 import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 
+from . import metrics
+from .ai import autocomplete, service, telemetry
+from .db import models
 from .db.schema import init_db
-from .routes.pages import router as pages_router
+from .routes.pages import router as pages_router, warm_templates
 from .routes.api import router as api_router
 
+log = logging.getLogger(__name__)
+
 BASE_PATH = os.environ.get("BASE_PATH", "").rstrip("/")
 
 
+async def _background(name: str, fn):
+    """Run ``fn`` after startup (a blocking one in a thread), timed as a background phase."""
+    try:
+        with metrics.startup_phase(name, background=True):
+            if inspect.iscoroutinefunction(fn):
+                await fn()
+            else:
+                await asyncio.to_thread(fn)
+    except Exception:
+        log.exception("Startup task %s failed", name)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await init_db()
+    with metrics.startup_phase("migrations"):
+        await init_db()
+    with metrics.startup_phase("ngrams"):
+        await models.load_ngrams()
+    tasks = [
+        asyncio.create_task(telemetry.run_flusher()),
+        asyncio.create_task(autocomplete.run_loader()),
+        asyncio.create_task(_background("templates", warm_templates)),
+        asyncio.create_task(_background("ai_sdk", service.sdk)),
+        asyncio.create_task(_background("archive", models.archive_pending)),
+    ]
+    log.info("Startup: %s", metrics.startup_report())
     yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
 
 app = FastAPI(
@@ -26,6 +64,7 @@ app = FastAPI(
     root_path=BASE_PATH,
     lifespan=lifespan,
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Static files
 static_dir = Path(__file__).parent / "static"
@@ -35,3 +74,11 @@ app.mount("/static", StaticFiles(directory=static_dir), name="static")
 # Routes
 app.include_router(api_router)
 app.include_router(pages_router)
+
+metrics.STARTUP["imports"] = time.perf_counter() - _import_started
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Per-route latency, DB and render metrics for this worker, in Prometheus format."""
+    return PlainTextResponse(metrics.exposition(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,207 @@
+"""Live change feed over the ``versions`` table.
+
+Every write in ``models`` records a version row, so the row id is a durable,
+ordered change sequence: a client resumes from the last id it saw, across
+reconnects, server restarts and worker processes.
+
+While anyone is listening, one reader task per process tails the table into a
+shared buffer and wakes all subscribers, so a burst of writes costs one query
+however many browsers are open. The write paths call ``notify()`` after they
+commit; writes made by other worker processes are picked up by polling every
+``FEED_POLL_SECONDS``. A subscriber that resumes from before the buffer is
+replayed from the table, or told to ``reset`` (reload everything) if it has
+missed more than ``REPLAY_MAX`` changes. Imports also reset every subscriber:
+restored rows keep their ids, so they do not read as a sequence of edits.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from collections.abc import AsyncGenerator
+
+from .schema import get_db
+
+log = logging.getLogger(__name__)
+
+FEED_BUFFER = int(os.environ.get("CHANGE_FEED_BUFFER", "1000"))
+FEED_POLL_SECONDS = float(os.environ.get("CHANGE_FEED_POLL_SECONDS", "2"))
+REPLAY_MAX = int(os.environ.get("CHANGE_FEED_REPLAY_MAX", "5000"))
+SUMMARY_TEXT_MAX = 280
+
+# Snapshot fields sent with each change, enough to patch a card or mindmap node
+_SUMMARY_FIELDS = {
+    "project": ("title", "description", "status", "priority"),
+    "plan": ("title", "description", "vision", "status", "project_id"),
+    "prd": ("title", "overview", "problem_statement", "status", "plan_id"),
+}
+
+_COLUMNS = "id, entity_type, entity_id, version, changed_fields, created_at, snapshot"
+
+
+def _clip(value):
+    if isinstance(value, str) and len(value) > SUMMARY_TEXT_MAX:
+        return value[:SUMMARY_TEXT_MAX - 1] + "…"
+    return value
+
+
+def _event(row) -> dict:
+    """Feed event for a ``versions`` row."""
+    fields = [f for f in (row["changed_fields"] or "").split(", ") if f]
+    op = {"created": "create", "deleted": "delete"}.get(fields[0] if len(fields) == 1 else "", "update")
+    event = {
+        "seq": row["id"],
+        "type": row["entity_type"],
+        "id": row["entity_id"],
+        "version": row["version"],
+        "op": op,
+        "fields": fields if op == "update" else [],
+        "at": row["created_at"],
+    }
+    keys = _SUMMARY_FIELDS.get(row["entity_type"])
+    if keys:
+        snapshot = json.loads(row["snapshot"])
+        event["data"] = {k: _clip(snapshot.get(k)) for k in keys}
+    return event
+
+
+async def head() -> int:
+    """Sequence number of the newest change (0 if none)."""
+    db = await get_db()
+    try:
+        cursor = await db.execute("SELECT COALESCE(MAX(id), 0) FROM versions")
+        return (await cursor.fetchone())[0]
+    finally:
+        await db.close()
+
+
+async def _rows_after(after: int, limit: int, upto: int | None = None) -> list:
+    db = await get_db()
+    try:
+        if upto is None:
+            cursor = await db.execute(
+                f"SELECT {_COLUMNS} FROM versions WHERE id > ? ORDER BY id LIMIT ?", (after, limit)
+            )
+        else:
+            cursor = await db.execute(
+                f"SELECT {_COLUMNS} FROM versions WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                (after, upto, limit),
+            )
+        return await cursor.fetchall()
+    finally:
+        await db.close()
+
+
+class ChangeFeed:
+    def __init__(self):
+        self.events: deque[dict] = deque()
+        self.head = 0  # newest change read into the buffer
+        self.floor = 0  # changes up to here are not buffered
+        self._listeners = 0
+        self._reader: asyncio.Task | None = None
+        self._ready: asyncio.Event | None = None
+        self._dirty = asyncio.Event()
+        self._waiters: list[asyncio.Future] = []
+        self._epoch = 0
+
+    def notify(self):
+        """Tell the reader new versions were committed (no-op while nobody listens)."""
+        if self._reader is not None:
+            self._dirty.set()
+
+    def reset(self):
+        """Make every subscriber reload its view, e.g. after an import."""
+        self._epoch += 1
+        self.notify()
+        self._wake()
+
+    async def subscribe(self, after: int | None = None) -> AsyncGenerator[tuple[int, dict], None]:
+        """Yield ``(seq, event)`` for every change after ``after`` (default: from now), live.
+
+        A ``{"reset": true}`` event means changes were skipped and the client
+        should reload its view.
+        """
+        self._listeners += 1
+        try:
+            if self._reader is None:
+                self._ready = asyncio.Event()
+                self._reader = asyncio.create_task(self._read())
+            await self._ready.wait()
+            position = self.head if after is None else after
+            epoch = self._epoch
+            while True:
+                if epoch != self._epoch:
+                    epoch, position = self._epoch, await head()
+                    yield position, {"reset": True}
+                    continue
+                if position < self.floor:
+                    rows = await _rows_after(position, REPLAY_MAX + 1, self.floor)
+                    if len(rows) > REPLAY_MAX:
+                        position = self.head
+                        yield position, {"reset": True}
+                        continue
+                    for row in rows:
+                        position = row["id"]
+                        yield position, _event(row)
+                    position = max(position, self.floor)
+                    continue
+                pending = [e for e in self.events if e["seq"] > position]
+                for event in pending:
+                    position = event["seq"]
+                    yield position, event
+                if not pending:
+                    await self._wait()
+        finally:
+            self._listeners -= 1
+
+    async def _read(self):
+        try:
+            self.events.clear()
+            self.head = self.floor = await head()
+        except Exception:
+            log.exception("Change feed failed to start")
+            self.head = self.floor = 0
+        self._ready.set()
+        try:
+            while self._listeners:
+                try:
+                    async with asyncio.timeout(FEED_POLL_SECONDS):
+                        await self._dirty.wait()
+                except TimeoutError:
+                    pass
+                self._dirty.clear()
+                try:
+                    rows = await _rows_after(self.head, FEED_BUFFER)
+                except Exception:
+                    log.exception("Change feed read failed")
+                    continue
+                for row in rows:
+                    if len(self.events) >= FEED_BUFFER:
+                        self.floor = self.events.popleft()["seq"]
+                    self.events.append(_event(row))
+                    self.head = row["id"]
+                if rows:
+                    self._wake()
+                    if len(rows) == FEED_BUFFER:
+                        self._dirty.set()  # more pending: read on without waiting
+        finally:
+            self._reader = None
+
+    async def _wait(self):
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def _wake(self):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+
+feed = ChangeFeed()
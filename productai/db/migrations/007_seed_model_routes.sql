@@ -0,0 +1,10 @@
+-- Seed per-mode model routes: comma-separated, preferred model first,
+-- fallbacks after. Light edits go to the fast small model.
+
+INSERT OR IGNORE INTO settings (key, value) VALUES
+    ('model_plan_chat', 'claude-sonnet-4-20250514, claude-3-5-haiku-20241022'),
+    ('model_prd_chat', 'claude-sonnet-4-20250514, claude-3-5-haiku-20241022'),
+    ('model_prd_generate', 'claude-sonnet-4-20250514, claude-3-5-haiku-20241022'),
+    ('model_enhance_light', 'claude-3-5-haiku-20241022, claude-sonnet-4-20250514'),
+    ('model_enhance_medium', 'claude-sonnet-4-20250514, claude-3-5-haiku-20241022'),
+    ('model_enhance_heavy', 'claude-sonnet-4-20250514');
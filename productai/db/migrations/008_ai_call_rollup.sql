@@ -0,0 +1,18 @@
+-- Hourly rollup of AI call telemetry (see ai/telemetry.py).
+-- ttft_hist / duration_hist are JSON arrays of counts per latency bucket.
+
+CREATE TABLE IF NOT EXISTS ai_call_rollup (
+    bucket TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    model TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    cache_read_tokens INTEGER NOT NULL DEFAULT 0,
+    cache_creation_tokens INTEGER NOT NULL DEFAULT 0,
+    stream_seconds REAL NOT NULL DEFAULT 0,
+    ttft_hist TEXT NOT NULL DEFAULT '[]',
+    duration_hist TEXT NOT NULL DEFAULT '[]',
+    PRIMARY KEY (bucket, mode, model, outcome)
+);
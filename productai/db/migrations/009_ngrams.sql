@@ -0,0 +1,9 @@
+-- Word n-gram counts learned from projects, plans and PRDs (see ai/ngrams.py).
+-- context is '' for unigrams, 'w1' for bigrams and 'w1 w2' for trigrams.
+
+CREATE TABLE IF NOT EXISTS ngrams (
+    context TEXT NOT NULL,
+    word TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (context, word)
+) WITHOUT ROWID;
@@ -0,0 +1,4 @@
+-- Version lookups are always per entity (latest version number, history
+-- listing); bulk writes look up the latest version of many entities at once.
+
+CREATE INDEX IF NOT EXISTS idx_versions_entity ON versions (entity_type, entity_id, version);
@@ -0,0 +1,13 @@
+-- Progress of NDJSON imports (see models.import_lines): committed_lines is
+-- advanced in the same transaction as each batch, so a failed or interrupted
+-- import resumes after the last committed line.
+
+CREATE TABLE IF NOT EXISTS imports (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'running' CHECK(status IN ('running', 'failed', 'done')),
+    committed_lines INTEGER NOT NULL DEFAULT 0,
+    counts TEXT NOT NULL DEFAULT '{}',
+    error TEXT DEFAULT '',
+    created_at TEXT DEFAULT (datetime('now')),
+    updated_at TEXT DEFAULT (datetime('now'))
+);
@@ -0,0 +1,5 @@
+-- Point-in-time reads (see models.portfolio_as_of) look up the newest version
+-- of each entity at or before a timestamp; version breaks ties between saves
+-- within the same second.
+
+CREATE INDEX IF NOT EXISTS idx_versions_entity_time ON versions (entity_type, entity_id, created_at, version);
@@ -0,0 +1,29 @@
+-- Archive tier (see models.archive): archived projects, plans and PRDs move
+-- out of the hot tables with their version history and AI sessions. Each
+-- entity is one row whose data is zlib-compressed JSON; the other columns
+-- are what listings need without decompressing. An entity archived as part
+-- of a project or plan records that root, and is restored with it.
+
+CREATE TABLE IF NOT EXISTS archived (
+    entity_type TEXT NOT NULL CHECK(entity_type IN ('project', 'plan', 'prd')),
+    entity_id INTEGER NOT NULL,
+    root_type TEXT NOT NULL,
+    root_id INTEGER NOT NULL,
+    parent_id INTEGER,  -- plans.project_id or prds.plan_id
+    title TEXT NOT NULL,
+    status TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,  -- newest version number
+    data BLOB NOT NULL,
+    archived_at TEXT DEFAULT (datetime('now')),
+    PRIMARY KEY (entity_type, entity_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_archived_root ON archived(root_type, root_id);
+CREATE INDEX IF NOT EXISTS idx_archived_parent ON archived(entity_type, parent_id);
+
+-- Owner of every archived version row, so version pages read through by id
+CREATE TABLE IF NOT EXISTS archived_versions (
+    id INTEGER PRIMARY KEY,
+    entity_type TEXT NOT NULL,
+    entity_id INTEGER NOT NULL
+);
@@ -0,0 +1,11 @@
+-- Point-in-time reads (see models.portfolio_as_of) also cover archived
+-- entities: each archived version row keeps its number and time, so the
+-- newest one at or before a timestamp is found without decompressing the
+-- archive. Rows archived before this migration are filled in by
+-- models.archive_pending at startup.
+
+ALTER TABLE archived_versions ADD COLUMN version INTEGER;
+ALTER TABLE archived_versions ADD COLUMN created_at TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_archived_versions_entity_time
+    ON archived_versions (entity_type, entity_id, created_at, version);
@@ -1,8 +1,41 @@
 """Data access layer for projects, plans and PRDs."""
 
+import datetime
 import json
+import logging
+import os
+import sqlite3
+import zlib
+from collections import Counter
+from collections.abc import AsyncIterator
+from ..ai import ngrams
+from .changes import feed
 from .schema import get_db, now_iso
 
+log = logging.getLogger(__name__)
+
+_TABLES = {"project": "projects", "plan": "plans", "prd": "prds"}
+
+# Columns callers may write, per entity type
+_UPDATABLE_FIELDS = {
+    "project": {
+        "title", "description", "status", "priority", "lead",
+        "members", "milestones", "start_date", "target_date",
+        "ai_conversation",
+    },
+    "plan": {
+        "title", "description", "status", "vision", "goals",
+        "target_audience", "success_metrics", "ai_conversation",
+        "project_id",
+    },
+    "prd": {
+        "title", "plan_id", "status", "content", "overview",
+        "problem_statement", "proposed_solution", "user_stories",
+        "requirements_functional", "requirements_nonfunctional",
+        "success_metrics", "timeline", "ai_conversation",
+    },
+}
+
 
 # ── Projects ──────────────────────────────────────────
 
@@ -38,7 +71,8 @@ async def create_project(title: str, description: str = "") -> int:
             "INSERT INTO projects (title, description) VALUES (?, ?)",
             (title, description),
         )
-        await db.commit()
+        learned = await _learn(db, "project", None, {"title": title, "description": description})
+        await _commit_learned(db, learned)
         project_id = cursor.lastrowid
     finally:
         await db.close()
@@ -49,11 +83,7 @@ async def create_project(title: str, description: str = "") -> int:
 async def update_project(project_id: int, **fields) -> bool:
     if not fields:
         return False
-    allowed = {
-        "title", "description", "status", "priority", "lead",
-        "members", "milestones", "start_date", "target_date",
-        "ai_conversation",
-    }
+    allowed = _UPDATABLE_FIELDS["project"]
     filtered = {k: v for k, v in fields.items() if k in allowed}
     if not filtered:
         return False
@@ -62,12 +92,16 @@ async def update_project(project_id: int, **fields) -> bool:
     vals = list(filtered.values()) + [project_id]
     db = await get_db()
     try:
+        old = await _learned_row(db, "project", project_id, filtered)
         await db.execute(f"UPDATE projects SET {sets} WHERE id = ?", vals)
-        await db.commit()
+        learned = await _learn(db, "project", old, filtered) if old is not None else Counter()
+        await _commit_learned(db, learned)
     finally:
         await db.close()
     changed = [k for k in filtered if k != "updated_at"]
     await save_version("project", project_id, changed)
+    if filtered.get("status") == "archived":
+        await archive("project", project_id)
     return True
 
 
@@ -75,8 +109,10 @@ async def delete_project(project_id: int) -> bool:
     await save_version("project", project_id, ["deleted"])
     db = await get_db()
     try:
+        old = await _learned_row(db, "project", project_id)
         cursor = await db.execute("DELETE FROM projects WHERE id = ?", (project_id,))
-        await db.commit()
+        learned = await _learn(db, "project", old, None)
+        await _commit_learned(db, learned)
         return cursor.rowcount > 0
     finally:
         await db.close()
@@ -121,7 +157,8 @@ async def create_plan(title: str, description: str = "") -> int:
             "INSERT INTO plans (title, description) VALUES (?, ?)",
             (title, description),
         )
-        await db.commit()
+        learned = await _learn(db, "plan", None, {"title": title, "description": description})
+        await _commit_learned(db, learned)
         plan_id = cursor.lastrowid
     finally:
         await db.close()
@@ -132,11 +169,7 @@ async def create_plan(title: str, description: str = "") -> int:
 async def update_plan(plan_id: int, **fields) -> bool:
     if not fields:
         return False
-    allowed = {
-        "title", "description", "status", "vision", "goals",
-        "target_audience", "success_metrics", "ai_conversation",
-        "project_id",
-    }
+    allowed = _UPDATABLE_FIELDS["plan"]
     filtered = {k: v for k, v in fields.items() if k in allowed}
     if not filtered:
         return False
@@ -145,13 +178,17 @@ async def update_plan(plan_id: int, **fields) -> bool:
     vals = list(filtered.values()) + [plan_id]
     db = await get_db()
     try:
+        old = await _learned_row(db, "plan", plan_id, filtered)
         await db.execute(f"UPDATE plans SET {sets} WHERE id = ?", vals)
-        await db.commit()
+        learned = await _learn(db, "plan", old, filtered) if old is not None else Counter()
+        await _commit_learned(db, learned)
     finally:
         await db.close()
     # Save version snapshot
     changed = [k for k in filtered if k != "updated_at"]
     await save_version("plan", plan_id, changed)
+    if filtered.get("status") == "archived":
+        await archive("plan", plan_id)
     return True
 
 
@@ -160,8 +197,10 @@ async def delete_plan(plan_id: int) -> bool:
     await save_version("plan", plan_id, ["deleted"])
     db = await get_db()
     try:
+        old = await _learned_row(db, "plan", plan_id)
         cursor = await db.execute("DELETE FROM plans WHERE id = ?", (plan_id,))
-        await db.commit()
+        learned = await _learn(db, "plan", old, None)
+        await _commit_learned(db, learned)
         return cursor.rowcount > 0
     finally:
         await db.close()
@@ -202,7 +241,8 @@ async def create_prd(title: str, plan_id: int | None = None) -> int:
             "INSERT INTO prds (title, plan_id) VALUES (?, ?)",
             (title, plan_id),
         )
-        await db.commit()
+        learned = await _learn(db, "prd", None, {"title": title})
+        await _commit_learned(db, learned)
         prd_id = cursor.lastrowid
     finally:
         await db.close()
@@ -213,12 +253,7 @@ async def create_prd(title: str, plan_id: int | None = None) -> int:
 async def update_prd(prd_id: int, **fields) -> bool:
     if not fields:
         return False
-    allowed = {
-        "title", "plan_id", "status", "content", "overview",
-        "problem_statement", "proposed_solution", "user_stories",
-        "requirements_functional", "requirements_nonfunctional",
-        "success_metrics", "timeline", "ai_conversation",
-    }
+    allowed = _UPDATABLE_FIELDS["prd"]
     filtered = {k: v for k, v in fields.items() if k in allowed}
     if not filtered:
         return False
@@ -227,13 +262,17 @@ async def update_prd(prd_id: int, **fields) -> bool:
     vals = list(filtered.values()) + [prd_id]
     db = await get_db()
     try:
+        old = await _learned_row(db, "prd", prd_id, filtered)
         await db.execute(f"UPDATE prds SET {sets} WHERE id = ?", vals)
-        await db.commit()
+        learned = await _learn(db, "prd", old, filtered) if old is not None else Counter()
+        await _commit_learned(db, learned)
     finally:
         await db.close()
     # Save version snapshot
     changed = [k for k in filtered if k != "updated_at"]
     await save_version("prd", prd_id, changed)
+    if filtered.get("status") == "archived":
+        await archive("prd", prd_id)
     return True
 
 
@@ -242,13 +281,447 @@ async def delete_prd(prd_id: int) -> bool:
     await save_version("prd", prd_id, ["deleted"])
     db = await get_db()
     try:
+        old = await _learned_row(db, "prd", prd_id)
         cursor = await db.execute("DELETE FROM prds WHERE id = ?", (prd_id,))
-        await db.commit()
+        learned = await _learn(db, "prd", old, None)
+        await _commit_learned(db, learned)
         return cursor.rowcount > 0
     finally:
         await db.close()
 
 
+# ── Bulk Writes ────────────────────────────────────────
+
+BULK_MAX_ITEMS = int(os.environ.get("BULK_MAX_ITEMS", "5000"))
+_ID_CHUNK = 500  # ids per ``IN (...)`` query, well under SQLite's parameter limit
+_BULK_OPS = ("create", "update", "delete")
+
+
+def _bulk_value(value):
+    """Column value for a JSON field: lists and objects are stored as JSON text."""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    raise ValueError(f"unsupported value type {type(value).__name__}")
+
+
+def _bulk_item(entity_type: str, item) -> dict:
+    """Validate one batch item into ``{"op", "id", "fields"}``; raises ``ValueError``."""
+    if not isinstance(item, dict) or item.get("op") not in _BULK_OPS:
+        raise ValueError(f"op must be one of {', '.join(_BULK_OPS)}")
+    op = item["op"]
+    entity_id = item.get("id")
+    if op == "create":
+        entity_id = None
+    elif not isinstance(entity_id, int) or isinstance(entity_id, bool):
+        raise ValueError("id must be an integer")
+    fields = item.get("fields") or {}
+    if op == "delete":
+        return {"op": op, "id": entity_id, "fields": {}}
+    if not isinstance(fields, dict) or not fields:
+        raise ValueError("fields must be a non-empty object")
+    unknown = sorted(set(fields) - _UPDATABLE_FIELDS[entity_type])
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    fields = {k: _bulk_value(v) for k, v in fields.items()}
+    if op == "create" and not str(fields.get("title") or "").strip():
+        raise ValueError("title is required")
+    return {"op": op, "id": entity_id, "fields": fields}
+
+
+async def _rows_by_id(db, table: str, ids) -> dict[int, dict]:
+    ids = list(ids)
+    rows = {}
+    for start in range(0, len(ids), _ID_CHUNK):
+        chunk = ids[start:start + _ID_CHUNK]
+        cursor = await db.execute(
+            f"SELECT * FROM {table} WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+        )
+        rows.update((r["id"], dict(r)) for r in await cursor.fetchall())
+    return rows
+
+
+async def _latest_versions(db, entity_type: str, ids) -> dict[int, int]:
+    ids = list(ids)
+    latest = {}
+    for start in range(0, len(ids), _ID_CHUNK):
+        chunk = ids[start:start + _ID_CHUNK]
+        cursor = await db.execute(
+            "SELECT entity_id, MAX(version) FROM versions WHERE entity_type = ? "
+            f"AND entity_id IN ({', '.join('?' * len(chunk))}) GROUP BY entity_id",
+            [entity_type, *chunk],
+        )
+        latest.update((r[0], r[1]) for r in await cursor.fetchall())
+    return latest
+
+
+def _grouped(ops: list[dict]) -> dict[tuple, list[dict]]:
+    """Ops grouped by the columns they write, one ``executemany`` per group."""
+    groups: dict[tuple, list[dict]] = {}
+    for op in ops:
+        groups.setdefault(tuple(sorted(op["fields"])), []).append(op)
+    return groups
+
+
+async def _write_fast(db, table: str, creates: list[dict], updates: list[dict], deletes: list[dict]):
+    """All writes as ``executemany`` batches. New ids are assigned up front, which
+    is safe because the caller holds the write lock (``BEGIN IMMEDIATE``)."""
+    if creates:
+        cursor = await db.execute(
+            "SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0), "
+            f"COALESCE((SELECT MAX(id) FROM {table}), 0))",
+            (table,),
+        )
+        next_id = (await cursor.fetchone())[0] + 1
+        for op in creates:
+            op["id"], next_id = next_id, next_id + 1
+    for columns, ops in _grouped(creates).items():
+        await db.executemany(
+            f"INSERT INTO {table} (id, {', '.join(columns)}) VALUES (?{', ?' * len(columns)})",
+            [(op["id"], *(op["fields"][c] for c in columns)) for op in ops],
+        )
+    for columns, ops in _grouped(updates).items():
+        await db.executemany(
+            f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in columns)} WHERE id = ?",
+            [(*(op["fields"][c] for c in columns), op["id"]) for op in ops],
+        )
+    if deletes:
+        await db.executemany(f"DELETE FROM {table} WHERE id = ?", [(op["id"],) for op in deletes])
+
+
+async def _write_each(db, table: str, creates: list[dict], updates: list[dict], deletes: list[dict]):
+    """Item-by-item writes, each under a savepoint, so a constraint violation
+    fails only its own item (recorded in ``op["error"]``)."""
+    for op in creates + updates + deletes:
+        columns = list(op["fields"])
+        if op["op"] == "create":
+            sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            params = [op["fields"][c] for c in columns]
+        elif op["op"] == "update":
+            sql = f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in columns)} WHERE id = ?"
+            params = [*(op["fields"][c] for c in columns), op["id"]]
+        else:
+            sql, params = f"DELETE FROM {table} WHERE id = ?", [op["id"]]
+        if op["op"] == "create":
+            op["id"] = None  # ids assigned by a failed fast path are void
+        await db.execute("SAVEPOINT bulk_item")
+        try:
+            cursor = await db.execute(sql, params)
+        except sqlite3.IntegrityError as e:
+            await db.execute("ROLLBACK TO bulk_item")
+            op["error"] = str(e)
+        else:
+            if op["op"] == "create":
+                op["id"] = cursor.lastrowid
+        await db.execute("RELEASE bulk_item")
+
+
+async def bulk_write(entity_type: str, items: list) -> list[dict]:
+    """Apply a batch of creates, updates and deletes in one transaction.
+
+    Items are ``{"op": "create", "fields": {...}}``, ``{"op": "update", "id": n,
+    "fields": {...}}`` or ``{"op": "delete", "id": n}``. Each gets a result, in
+    order: ``{"op", "id", "ok": true, "version"}``, or ``"ok": false`` with an
+    ``"error"``. Invalid items are skipped without affecting the rest.
+
+    Rows are written with one ``executemany`` per statement shape, and version
+    snapshots and learned n-grams are written together at the end, so a batch
+    costs a handful of statements on one connection. If a row breaks a
+    constraint the batch is replayed item by item to single it out.
+    """
+    table = _TABLES[entity_type]
+    results: list[dict] = []
+    ops: list[dict] = []
+    seen: set[int] = set()
+    for index, item in enumerate(items):
+        try:
+            op = _bulk_item(entity_type, item)
+            if op["id"] is not None:
+                if op["id"] in seen:
+                    raise ValueError("id appears more than once in the batch")
+                seen.add(op["id"])
+        except ValueError as e:
+            results.append({"op": item.get("op") if isinstance(item, dict) else None,
+                            "id": item.get("id") if isinstance(item, dict) else None,
+                            "ok": False, "error": str(e)})
+            continue
+        op["index"] = index
+        results.append({"op": op["op"], "id": op["id"], "ok": True})
+        ops.append(op)
+    if not ops:
+        return results
+
+    now = now_iso()
+    db = await get_db()
+    try:
+        await db.execute("BEGIN IMMEDIATE")
+        before = await _rows_by_id(db, table, [op["id"] for op in ops if op["id"] is not None])
+        for op in ops:
+            if op["op"] != "create" and op["id"] not in before:
+                op["error"] = "not found"
+            elif op["op"] == "update":
+                op["fields"]["updated_at"] = now
+        live = [op for op in ops if "error" not in op]
+        by_op = {name: [op for op in live if op["op"] == name] for name in _BULK_OPS}
+        try:
+            await _write_fast(db, table, by_op["create"], by_op["update"], by_op["delete"])
+        except sqlite3.IntegrityError:
+            await db.rollback()
+            await db.execute("BEGIN IMMEDIATE")
+            await _write_each(db, table, by_op["create"], by_op["update"], by_op["delete"])
+        done = [op for op in live if "error" not in op]
+
+        # Version snapshots: the row after the write, or before a delete
+        after = await _rows_by_id(db, table, [op["id"] for op in done if op["op"] != "delete"])
+        latest = await _latest_versions(db, entity_type, [op["id"] for op in done])
+        versions = []
+        delta = Counter()
+        for op in done:
+            op["version"] = latest.get(op["id"], 0) + 1
+            if op["op"] == "create":
+                snapshot, changed, old, new = after[op["id"]], ["created"], None, op["fields"]
+            elif op["op"] == "update":
+                snapshot, old, new = after[op["id"]], before[op["id"]], op["fields"]
+                changed = [k for k in op["fields"] if k != "updated_at"]
+            else:
+                snapshot, changed, old, new = before[op["id"]], ["deleted"], before[op["id"]], None
+            versions.append((entity_type, op["id"], op["version"], json.dumps(snapshot), ", ".join(changed)))
+            delta.update(ngrams.diff(old, new, _LEARNED_FIELDS[entity_type]))
+        await db.executemany(
+            "INSERT INTO versions (entity_type, entity_id, version, snapshot, changed_fields) "
+            "VALUES (?, ?, ?, ?, ?)",
+            versions,
+        )
+        learned = await _apply_ngrams(db, Counter({k: v for k, v in delta.items() if v}))
+        await _commit_learned(db, learned)
+    finally:
+        await db.close()
+    feed.notify()
+    for op in done:
+        if op["op"] != "delete" and op["fields"].get("status") == "archived":
+            await archive(entity_type, op["id"])
+
+    for op in ops:
+        result = results[op["index"]]
+        result["id"] = op["id"]
+        if "error" in op:
+            result.update(ok=False, error=op["error"])
+        else:
+            result["version"] = op["version"]
+    return results
+
+
+# ── Export / Import ────────────────────────────────────
+
+EXPORT_FORMAT = "productai-export"
+EXPORT_VERSION = 1
+EXPORT_CHUNK = 500  # rows fetched per cursor round trip
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "1000"))
+
+# Line types in dependency order: a row only references rows of earlier types
+_EXPORT_TYPES = {
+    "project": "projects",
+    "plan": "plans",
+    "prd": "prds",
+    "session": "ai_sessions",
+    "version": "versions",
+}
+
+
+async def export_rows(include_versions: bool = False) -> AsyncIterator[dict]:
+    """Every project, plan, PRD and AI session (and optionally version) as export lines.
+
+    The first line is a header; each further line is ``{"type", "data"}`` with
+    the full row. Rows are read from one snapshot in ``EXPORT_CHUNK``-sized
+    fetches, so memory stays flat however large the database is. Archived
+    entities are exported as ordinary rows after the hot ones of each type;
+    imported back, they are archived again by ``archive_pending``.
+    """
+    yield {"type": "header", "format": EXPORT_FORMAT, "version": EXPORT_VERSION,
+           "exported_at": now_iso(), "versions": include_versions}
+    db = await get_db()
+    try:
+        await db.execute("BEGIN")  # one read snapshot across all tables
+        for line_type, table in _EXPORT_TYPES.items():
+            if line_type == "version" and not include_versions:
+                continue
+            cursor = await db.execute(f"SELECT * FROM {table} ORDER BY id")
+            while rows := await cursor.fetchmany(EXPORT_CHUNK):
+                for row in rows:
+                    yield {"type": line_type, "data": dict(row)}
+            async for data in _archived_export(db, line_type):
+                yield {"type": line_type, "data": data}
+        await db.rollback()
+    finally:
+        await db.close()
+
+
+async def _archived_export(db, line_type: str) -> AsyncIterator[dict]:
+    """Rows of ``line_type`` kept in the archive tier, for ``export_rows``."""
+    if line_type in _TABLES:
+        cursor = await db.execute("SELECT data FROM archived WHERE entity_type = ? ORDER BY entity_id", (line_type,))
+    else:
+        cursor = await db.execute("SELECT data FROM archived ORDER BY entity_type, entity_id")
+    key = {"session": "sessions", "version": "versions"}.get(line_type)
+    while rows := await cursor.fetchmany(EXPORT_CHUNK):
+        for row in rows:
+            entry = _unpack(row["data"])
+            for data in entry[key] if key else [entry["row"]]:
+                yield data
+
+
+async def get_import(import_id: str) -> dict | None:
+    db = await get_db()
+    try:
+        cursor = await db.execute("SELECT * FROM imports WHERE id = ?", (import_id,))
+        row = await cursor.fetchone()
+        if not row:
+            return None
+        return {**dict(row), "counts": json.loads(row["counts"])}
+    finally:
+        await db.close()
+
+
+async def _table_columns(db, table: str) -> set[str]:
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    return {r["name"] for r in await cursor.fetchall()}
+
+
+def _import_line(raw: bytes, line_no: int) -> tuple[str, dict] | None:
+    """Parse one NDJSON line into ``(type, row)``; ``None`` for blank and header lines."""
+    if not raw.strip():
+        return None
+    try:
+        line = json.loads(raw)
+    except ValueError as e:
+        raise ValueError(f"line {line_no}: invalid JSON ({e})") from None
+    if not isinstance(line, dict):
+        raise ValueError(f"line {line_no}: expected an object")
+    if line.get("type") == "header":
+        if line.get("format") != EXPORT_FORMAT or line.get("version") != EXPORT_VERSION:
+            raise ValueError(f"line {line_no}: not a {EXPORT_FORMAT} v{EXPORT_VERSION} file")
+        return None
+    data = line.get("data")
+    if line.get("type") not in _EXPORT_TYPES or not isinstance(data, dict):
+        raise ValueError(f"line {line_no}: unknown line type {line.get('type')!r}")
+    if not isinstance(data.get("id"), int):
+        raise ValueError(f"line {line_no}: data.id must be an integer")
+    return line["type"], data
+
+
+async def _import_batch(db, batch: list[tuple[str, dict]], columns: dict[str, set[str]]) -> tuple[Counter, Counter]:
+    """Upsert a batch of rows by id, type by type; returns rows per type and
+    the n-gram changes, for ``_commit_learned``."""
+    counts = Counter()
+    delta = Counter()
+    for line_type, table in _EXPORT_TYPES.items():
+        rows = [data for t, data in batch if t == line_type]
+        if not rows:
+            continue
+        entity_type = line_type if line_type in _LEARNED_FIELDS else None
+        before = await _rows_by_id(db, table, [r["id"] for r in rows]) if entity_type else {}
+        groups: dict[tuple, list[dict]] = {}
+        for row in rows:
+            groups.setdefault(tuple(sorted(k for k in row if k in columns[table])), []).append(row)
+        for cols, group in groups.items():
+            updates = ", ".join(f"{c} = excluded.{c}" for c in cols if c != "id")
+            await db.executemany(
+                f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+                f"ON CONFLICT(id) DO {'UPDATE SET ' + updates if updates else 'NOTHING'}",
+                [tuple(_bulk_value(row[c]) for c in cols) for row in group],
+            )
+        if entity_type:
+            for row in rows:
+                delta.update(ngrams.diff(before.get(row["id"]), row, _LEARNED_FIELDS[entity_type]))
+        counts[line_type] += len(rows)
+    return counts, await _apply_ngrams(db, Counter({k: v for k, v in delta.items() if v}))
+
+
+async def import_lines(import_id: str, lines: AsyncIterator[bytes]) -> dict:
+    """Upsert export lines by id in batches of ``IMPORT_BATCH_SIZE``, resumably.
+
+    Each batch commits together with the import's ``committed_lines``, so
+    feeding the same file again under the same ``import_id`` after a failure
+    or disconnect skips what was already applied. Rows keep their ids and
+    existing rows with the same id are overwritten; version history is only
+    restored from files exported with versions. Returns the import's record.
+    If the request body stops because the client went away or the request is
+    cancelled, the import is recorded as failed before the exception
+    propagates, so it can be resumed rather than looking stuck in ``running``.
+    """
+    skip = line_no = 0
+    db = await get_db()
+    try:
+        await db.execute("INSERT OR IGNORE INTO imports (id) VALUES (?)", (import_id,))
+        await db.commit()
+        cursor = await db.execute("SELECT * FROM imports WHERE id = ?", (import_id,))
+        state = await cursor.fetchone()
+        if state["status"] == "done":
+            return {**dict(state), "counts": json.loads(state["counts"])}
+        skip = state["committed_lines"]
+        counts = Counter(json.loads(state["counts"]))
+        columns = {table: await _table_columns(db, table) for table in _EXPORT_TYPES.values()}
+        await db.execute(
+            "UPDATE imports SET status = 'running', error = '', updated_at = ? WHERE id = ?",
+            (now_iso(), import_id),
+        )
+        await db.commit()
+
+        async def flush(batch: list[tuple[str, dict]], line_no: int):
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                applied, learned = await _import_batch(db, batch, columns)
+                await db.execute(
+                    "UPDATE imports SET committed_lines = ?, counts = ?, updated_at = ? WHERE id = ?",
+                    (line_no, json.dumps(counts + applied), now_iso(), import_id),
+                )
+                await _commit_learned(db, learned)
+                counts.update(applied)
+            except BaseException:
+                await db.rollback()
+                raise
+            log.info("Import %s: committed through line %d", import_id, line_no)
+
+        async def finish(status: str, error: str):
+            await db.execute(
+                "UPDATE imports SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, error, now_iso(), import_id),
+            )
+            await db.commit()
+
+        batch: list[tuple[str, dict]] = []
+        try:
+            async for raw in lines:
+                line_no += 1
+                if line_no <= skip:
+                    continue
+                parsed = _import_line(raw, line_no)
+                if parsed is not None:
+                    batch.append(parsed)
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    await flush(batch, line_no)
+                    batch = []
+            await flush(batch, line_no)
+        except ValueError as e:
+            status, error = "failed", str(e)
+        except sqlite3.Error as e:
+            status, error = "failed", f"batch ending at line {line_no}: {e}"
+        except BaseException as e:  # e.g. ClientDisconnect or CancelledError
+            await finish("failed", f"interrupted at line {line_no} ({type(e).__name__})")
+            raise
+        else:
+            status, error = "done", ""
+        await finish(status, error)
+    finally:
+        await db.close()
+        if line_no > skip:
+            feed.reset()
+    if line_no > skip:
+        await archive_pending()  # imported rows with status archived move to the archive tier
+    return await get_import(import_id)
+
+
 # ── AI Sessions ────────────────────────────────────────
 
 async def get_or_create_session(entity_type: str, entity_id: int) -> dict:
@@ -277,11 +750,13 @@ async def get_or_create_session(entity_type: str, entity_id: int) -> dict:
 
 
 async def append_session_message(
-    entity_type: str, entity_id: int, role: str, content: str
+    entity_type: str, entity_id: int, role: str, content: str, incomplete: bool = False
 ):
+    """Append a message to the entity's AI session; ``incomplete`` marks a
+    reply cut short by an error."""
     session = await get_or_create_session(entity_type, entity_id)
     messages = json.loads(session["messages"])
-    messages.append({"role": role, "content": content})
+    messages.append({"role": role, "content": content, **({"incomplete": True} if incomplete else {})})
     db = await get_db()
     try:
         await db.execute(
@@ -331,9 +806,11 @@ async def _save_version_direct(
         await db.commit()
     finally:
         await db.close()
+    feed.notify()
 
 
 async def list_versions(entity_type: str, entity_id: int) -> list[dict]:
+    """Newest first; an archived entity's history is read from the archive."""
     db = await get_db()
     try:
         cursor = await db.execute(
@@ -341,22 +818,69 @@ async def list_versions(entity_type: str, entity_id: int) -> list[dict]:
             "WHERE entity_type = ? AND entity_id = ? ORDER BY version DESC",
             (entity_type, entity_id),
         )
-        rows = await cursor.fetchall()
-        return [dict(r) for r in rows]
+        rows = [dict(r) for r in await cursor.fetchall()]
+        if not rows and entity_type in _TABLES:
+            cursor = await db.execute(
+                "SELECT data FROM archived WHERE entity_type = ? AND entity_id = ?", (entity_type, entity_id)
+            )
+            archived = await cursor.fetchone()
+            if archived:
+                rows = [{k: v[k] for k in ("id", "version", "changed_fields", "created_at")}
+                        for v in reversed(_unpack(archived["data"])["versions"])]
+        return rows
     finally:
         await db.close()
 
 
 async def get_version(version_id: int) -> dict | None:
+    """A version row, from the archive if its entity is archived."""
     db = await get_db()
     try:
         cursor = await db.execute("SELECT * FROM versions WHERE id = ?", (version_id,))
         row = await cursor.fetchone()
-        return dict(row) if row else None
+        if row:
+            return dict(row)
+        return next((v for v in await _archived_history(db, version_id) if v["id"] == version_id), None)
     finally:
         await db.close()
 
 
+async def get_version_pair(version_id: int, against: int | None = None) -> tuple[dict | None, dict | None]:
+    """Version rows ``(against, version_id)`` in one query.
+
+    ``against`` defaults to the entity's previous version (``None`` for the
+    first one). Versions of an archived entity are read from the archive.
+    """
+    db = await get_db()
+    try:
+        if against is None:
+            cursor = await db.execute(
+                "SELECT * FROM versions WHERE id = ? OR id = ("
+                "  SELECT p.id FROM versions p JOIN versions v ON v.id = ?"
+                "  WHERE p.entity_type = v.entity_type AND p.entity_id = v.entity_id"
+                "  AND p.version < v.version ORDER BY p.version DESC LIMIT 1)",
+                (version_id, version_id),
+            )
+        else:
+            cursor = await db.execute("SELECT * FROM versions WHERE id IN (?, ?)", (version_id, against))
+        rows = {r["id"]: dict(r) for r in await cursor.fetchall()}
+        if version_id not in rows:
+            history = await _archived_history(db, version_id)
+            if history and against is None:
+                current = next(v for v in history if v["id"] == version_id)
+                earlier = [v for v in history if v["version"] < current["version"]]
+                rows = {v["id"]: v for v in [current, *earlier[-1:]]}  # history is in version order
+            elif history:
+                rows = {v["id"]: v for v in history if v["id"] in (version_id, against)}
+    finally:
+        await db.close()
+    new = rows.pop(version_id, None)
+    old = rows.get(against) if against is not None else next(iter(rows.values()), None)
+    if against == version_id:
+        old = new
+    return old, new
+
+
 async def get_current_version_number(entity_type: str, entity_id: int) -> int:
     db = await get_db()
     try:
@@ -370,6 +894,483 @@ async def get_current_version_number(entity_type: str, entity_id: int) -> int:
         await db.close()
 
 
+# ── Point-in-Time ──────────────────────────────────────
+
+# Newest version of every entity of a type at or before :at. The recursive CTE
+# walks the distinct entity ids with one index seek each (a loose index scan),
+# and each entity's row is one more seek on idx_versions_entity_time, so the
+# cost follows the number of entities, not the length of their history.
+_AS_OF_SQL = """
+WITH RECURSIVE ids(entity_id) AS (
+    SELECT MIN(entity_id) FROM versions WHERE entity_type = :type
+    UNION ALL
+    SELECT (SELECT MIN(entity_id) FROM versions WHERE entity_type = :type AND entity_id > ids.entity_id)
+    FROM ids WHERE ids.entity_id IS NOT NULL
+)
+SELECT v.id, v.entity_id, v.version, v.created_at, v.snapshot
+FROM ids JOIN versions v ON v.id = (
+    SELECT id FROM versions
+    WHERE entity_type = :type AND entity_id = ids.entity_id AND created_at <= :at
+    ORDER BY created_at DESC, version DESC LIMIT 1
+)
+WHERE v.changed_fields IS NOT 'deleted'
+"""
+
+
+def as_of_timestamp(value: str) -> str:
+    """``value`` (ISO date or datetime) as a UTC ``versions.created_at`` string.
+
+    A bare date means the end of that day; naive times are taken as UTC.
+    Raises ``ValueError`` for anything else.
+    """
+    value = value.strip()
+    if len(value) == 10:
+        return datetime.date.fromisoformat(value).strftime("%Y-%m-%d 23:59:59")
+    moment = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(datetime.timezone.utc)
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+# The same for archived entities: one seek on idx_archived_versions_entity_time
+# per archived entity of the type, then its snapshot is read from ``data``.
+_ARCHIVED_AS_OF_SQL = """
+SELECT a.entity_id, a.data, (
+    SELECT id FROM archived_versions
+    WHERE entity_type = a.entity_type AND entity_id = a.entity_id AND created_at <= :at
+    ORDER BY created_at DESC, version DESC LIMIT 1
+) AS version_id
+FROM archived a
+WHERE a.entity_type = :type AND version_id IS NOT NULL
+"""
+
+
+def _as_of_entity(entity_id: int, version: dict) -> dict:
+    entity = json.loads(version["snapshot"])
+    entity.pop("ai_conversation", None)
+    entity.update(id=entity_id, version=version["version"], version_id=version["id"],
+                  version_at=version["created_at"])
+    return entity
+
+
+async def _snapshots_as_of(db, entity_type: str, at: str, where: str = "", params: dict | None = None) -> list[dict]:
+    cursor = await db.execute(_AS_OF_SQL + where, {"type": entity_type, "at": at, **(params or {})})
+    return [_as_of_entity(row["entity_id"], row) for row in await cursor.fetchall()]
+
+
+async def _archived_as_of(db, entity_type: str, at: str, parent_ids: list[int] | None = None) -> list[dict]:
+    """``_snapshots_as_of`` for the archive tier; ``parent_ids`` keeps the
+    entities whose snapshot links them to one of those parents."""
+    cursor = await db.execute(_ARCHIVED_AS_OF_SQL, {"type": entity_type, "at": at})
+    out = []
+    for row in await cursor.fetchall():
+        history = _unpack(row["data"])["versions"]
+        version = next((v for v in history if v["id"] == row["version_id"]), None)
+        if version is None or version["changed_fields"] == "deleted":
+            continue
+        entity = _as_of_entity(row["entity_id"], version)
+        if parent_ids is None or entity.get(_PARENT_COLUMN[entity_type]) in parent_ids:
+            out.append(entity)
+    return out
+
+
+def _newest_as_of(hot: list[dict], archived: list[dict]) -> list[dict]:
+    """Hot and archived snapshots merged by id, keeping the newer one where an
+    entity was imported again after being archived."""
+    by_id = {e["id"]: e for e in hot}
+    for entity in archived:
+        current = by_id.get(entity["id"])
+        if current is None or (entity["version_at"], entity["version"]) > (current["version_at"], current["version"]):
+            by_id[entity["id"]] = entity
+    return [by_id[i] for i in sorted(by_id)]
+
+
+async def portfolio_as_of(at: str, project_id: int | None = None) -> dict:
+    """Projects, plans and PRDs as they were at ``at`` (a ``versions.created_at``
+    timestamp), nested like the live hierarchy.
+
+    Each entity is its newest snapshot at that time plus ``version``,
+    ``version_id`` and ``version_at``; entities deleted by then are left out.
+    Archived entities are read through from the archive tier, so they appear
+    as they were before being archived. With ``project_id`` only that
+    project's subtree is rebuilt, filtering hot plans and PRDs by their
+    parent in SQL. Plans and PRDs whose parent did not exist at ``at`` are
+    listed as unlinked, as the live tables would show them.
+    """
+    db = await get_db()
+    try:
+        if project_id is None:
+            projects = _newest_as_of(await _snapshots_as_of(db, "project", at),
+                                     await _archived_as_of(db, "project", at))
+            plans = _newest_as_of(await _snapshots_as_of(db, "plan", at),
+                                  await _archived_as_of(db, "plan", at))
+            prds = _newest_as_of(await _snapshots_as_of(db, "prd", at),
+                                 await _archived_as_of(db, "prd", at))
+        else:
+            projects = _newest_as_of(
+                await _snapshots_as_of(db, "project", at, "AND v.entity_id = :project", {"project": project_id}),
+                [p for p in await _archived_as_of(db, "project", at) if p["id"] == project_id],
+            )
+            plans = _newest_as_of(
+                await _snapshots_as_of(db, "plan", at, "AND json_extract(v.snapshot, '$.project_id') = :project",
+                                       {"project": project_id}),
+                await _archived_as_of(db, "plan", at, [project_id]),
+            ) if projects else []
+            plan_ids = [p["id"] for p in plans]
+            prds = _newest_as_of(
+                await _snapshots_as_of(
+                    db, "prd", at, "AND json_extract(v.snapshot, '$.plan_id') IN (SELECT value FROM json_each(:plans))",
+                    {"plans": json.dumps(plan_ids)},
+                ),
+                await _archived_as_of(db, "prd", at, plan_ids),
+            ) if plans else []
+    finally:
+        await db.close()
+
+    plans_by_id = {p["id"]: p for p in plans}
+    projects_by_id = {p["id"]: p for p in projects}
+    unlinked_prds, unlinked_plans = [], []
+    for plan in plans:
+        plan["prds"] = []
+    for project in projects:
+        project["plans"] = []
+    for prd in prds:
+        parent = plans_by_id.get(prd.get("plan_id"))
+        (parent["prds"] if parent else unlinked_prds).append(prd)
+    for plan in plans:
+        parent = projects_by_id.get(plan.get("project_id"))
+        (parent["plans"] if parent else unlinked_plans).append(plan)
+    return {
+        "as_of": at,
+        "projects": projects,
+        "unlinked_plans": unlinked_plans,
+        "unlinked_prds": unlinked_prds,
+    }
+
+
+# ── Archive ────────────────────────────────────────────
+
+ARCHIVE_ZLIB_LEVEL = 6
+
+# Status an entity returns to when un-archived with no earlier status in its history
+_DEFAULT_STATUS = {"project": "planning", "plan": "draft", "prd": "draft"}
+
+# Child type that follows each type into the archive, and the child's parent column
+_CHILD_TYPE = {"project": "plan", "plan": "prd"}
+_PARENT_COLUMN = {"plan": "project_id", "prd": "plan_id"}
+
+_ARCHIVED_COLUMNS = "entity_type, entity_id, root_type, root_id, parent_id, title, status, version, archived_at"
+
+
+def _pack(entry: dict) -> bytes:
+    return zlib.compress(json.dumps(entry, separators=(",", ":")).encode(), ARCHIVE_ZLIB_LEVEL)
+
+
+def _unpack(data: bytes) -> dict:
+    return json.loads(zlib.decompress(data))
+
+
+async def _subtree(db, entity_type: str, entity_id: int) -> list[tuple[str, dict]]:
+    """``(type, row)`` for an entity and everything under it, parents first."""
+    cursor = await db.execute(f"SELECT * FROM {_TABLES[entity_type]} WHERE id = ?", (entity_id,))
+    row = await cursor.fetchone()
+    if row is None:
+        return []
+    members = [(entity_type, dict(row))]
+    parents, child = [entity_id], _CHILD_TYPE.get(entity_type)
+    while child and parents:
+        cursor = await db.execute(
+            f"SELECT * FROM {_TABLES[child]} WHERE {_PARENT_COLUMN[child]} IN (SELECT value FROM json_each(?))",
+            (json.dumps(parents),),
+        )
+        rows = [dict(r) for r in await cursor.fetchall()]
+        members += [(child, r) for r in rows]
+        parents, child = [r["id"] for r in rows], _CHILD_TYPE.get(child)
+    return members
+
+
+async def _rows_by_entity(db, table: str, ids_by_type: dict[str, list[int]], order: str) -> dict[tuple, list[dict]]:
+    """Rows of ``versions`` or ``ai_sessions`` per ``(entity_type, entity_id)``,
+    one query per type."""
+    out: dict[tuple, list[dict]] = {}
+    for entity_type, ids in ids_by_type.items():
+        cursor = await db.execute(
+            f"SELECT * FROM {table} WHERE entity_type = ? AND entity_id IN (SELECT value FROM json_each(?)) "
+            f"ORDER BY entity_id, {order}",
+            (entity_type, json.dumps(ids)),
+        )
+        for row in await cursor.fetchall():
+            out.setdefault((entity_type, row["entity_id"]), []).append(dict(row))
+    return out
+
+
+async def _insert_version(db, entity_type: str, entity_id: int, snapshot: dict, changed_fields: list[str]):
+    """``_save_version_direct`` inside the caller's transaction."""
+    cursor = await db.execute(
+        "SELECT COALESCE(MAX(version), 0) FROM versions WHERE entity_type = ? AND entity_id = ?",
+        (entity_type, entity_id),
+    )
+    await db.execute(
+        "INSERT INTO versions (entity_type, entity_id, version, snapshot, changed_fields) VALUES (?, ?, ?, ?, ?)",
+        (entity_type, entity_id, (await cursor.fetchone())[0] + 1, json.dumps(snapshot), ", ".join(changed_fields)),
+    )
+
+
+async def archive(entity_type: str, entity_id: int) -> list[dict] | None:
+    """Move an entity, with its version history and AI sessions, to the archive tier.
+
+    A project takes its plans and their PRDs along, and a plan its PRDs, so no
+    parent link is cut; they come back together. The entity's status becomes
+    ``archived`` (recorded as a version first if it was anything else), and
+    the moved text stops feeding autocomplete. Everything happens in one
+    transaction. Returns ``{"type", "id"}`` per moved entity, or ``None`` if
+    the entity is not in the hot tables.
+    """
+    db = await get_db()
+    try:
+        await db.execute("BEGIN IMMEDIATE")
+        members = await _subtree(db, entity_type, entity_id)
+        if not members:
+            await db.rollback()
+            return None
+        root = members[0][1]
+        if root["status"] != "archived":
+            root.update(status="archived", updated_at=now_iso())
+            await db.execute(
+                f"UPDATE {_TABLES[entity_type]} SET status = ?, updated_at = ? WHERE id = ?",
+                (root["status"], root["updated_at"], entity_id),
+            )
+            await _insert_version(db, entity_type, entity_id, root, ["status"])
+
+        ids_by_type: dict[str, list[int]] = {}
+        for member_type, row in members:
+            ids_by_type.setdefault(member_type, []).append(row["id"])
+        versions = await _rows_by_entity(db, "versions", ids_by_type, "version")
+        sessions = await _rows_by_entity(db, "ai_sessions", ids_by_type, "id")
+
+        entries, owners, delta = [], [], Counter()
+        for member_type, row in members:
+            key = (member_type, row["id"])
+            history = versions.get(key, [])
+            entries.append((
+                *key, entity_type, entity_id, row.get(_PARENT_COLUMN.get(member_type, "")),
+                row["title"], row["status"], history[-1]["version"] if history else 0,
+                _pack({"row": row, "versions": history, "sessions": sessions.get(key, [])}),
+            ))
+            owners += [(v["id"], *key, v["version"], v["created_at"]) for v in history]
+            delta.update(ngrams.diff(row, None, _LEARNED_FIELDS[member_type]))
+
+        # An entity imported again after archiving replaces its stale archive entry
+        await db.executemany(
+            "INSERT OR REPLACE INTO archived (entity_type, entity_id, root_type, root_id, parent_id, "
+            "title, status, version, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            entries,
+        )
+        await db.executemany(
+            "INSERT OR REPLACE INTO archived_versions (id, entity_type, entity_id, version, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            owners,
+        )
+        keys = [(t, row["id"]) for t, row in members]
+        await db.executemany("DELETE FROM ai_sessions WHERE entity_type = ? AND entity_id = ?", keys)
+        await db.executemany("DELETE FROM versions WHERE entity_type = ? AND entity_id = ?", keys)
+        for member_type in reversed(ids_by_type):  # children first: no ON DELETE SET NULL fires
+            await db.executemany(f"DELETE FROM {_TABLES[member_type]} WHERE id = ?",
+                                 [(i,) for i in ids_by_type[member_type]])
+        learned = await _apply_ngrams(db, delta)
+        await _commit_learned(db, learned)
+    finally:
+        await db.close()
+    feed.reset()  # history left the versions table: clients reload rather than replay
+    log.info("Archived %s %d with %d entities under it", entity_type, entity_id, len(members) - 1)
+    return [{"type": t, "id": row["id"]} for t, row in members]
+
+
+async def unarchive(entity_type: str, entity_id: int) -> list[dict] | None:
+    """Restore an archived entity, and everything archived with it, to the hot tables.
+
+    Rows, versions and sessions keep their ids. An entity that was archived
+    as part of a project or plan brings that whole group back. The group's
+    root returns to the last status its history shows before ``archived``
+    (its type's default if none), as a new version, and loses a link to a
+    parent that no longer exists, as deleting the parent would have done.
+    Raises ``ValueError`` if one of the ids is in use again (e.g. restored
+    by an import). Returns ``{"type", "id"}`` per restored entity, or
+    ``None`` if the entity is not archived.
+    """
+    db = await get_db()
+    try:
+        await db.execute("BEGIN IMMEDIATE")
+        cursor = await db.execute(
+            "SELECT root_type, root_id FROM archived WHERE entity_type = ? AND entity_id = ?",
+            (entity_type, entity_id),
+        )
+        hit = await cursor.fetchone()
+        if hit is None:
+            await db.rollback()
+            return None
+        root_type, root_id = hit
+        cursor = await db.execute(
+            "SELECT entity_type, data FROM archived WHERE root_type = ? AND root_id = ?", (root_type, root_id)
+        )
+        order = list(_TABLES)
+        members = sorted(((r["entity_type"], _unpack(r["data"])) for r in await cursor.fetchall()),
+                         key=lambda m: order.index(m[0]))  # parents first
+        columns = {table: await _table_columns(db, table) for table in (*_TABLES.values(), "versions", "ai_sessions")}
+
+        root = next(entry["row"] for t, entry in members if (t, entry["row"]["id"]) == (root_type, root_id))
+        parent_column = _PARENT_COLUMN.get(root_type)
+        if parent_column and root.get(parent_column) is not None:
+            parent_table = _TABLES[order[order.index(root_type) - 1]]
+            cursor = await db.execute(f"SELECT 1 FROM {parent_table} WHERE id = ?", (root[parent_column],))
+            if await cursor.fetchone() is None:
+                root[parent_column] = None
+        if root["status"] == "archived":
+            history = next(entry["versions"] for t, entry in members if entry["row"] is root)
+            earlier = [json.loads(v["snapshot"]).get("status") for v in history]
+            root["status"] = next((s for s in reversed(earlier) if s and s != "archived"), _DEFAULT_STATUS[root_type])
+            root["updated_at"] = now_iso()
+
+        delta = Counter()
+        try:
+            for member_type, entry in members:
+                for table, rows in ((_TABLES[member_type], [entry["row"]]),
+                                    ("versions", entry["versions"]), ("ai_sessions", entry["sessions"])):
+                    for row in rows:
+                        cols = [c for c in row if c in columns[table]]
+                        await db.execute(
+                            f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                            [row[c] for c in cols],
+                        )
+                delta.update(ngrams.diff(None, entry["row"], _LEARNED_FIELDS[member_type]))
+        except sqlite3.IntegrityError as e:
+            await db.rollback()
+            raise ValueError(f"cannot restore {member_type} {entry['row']['id']}: {e}") from None
+        await _insert_version(db, root_type, root_id, root, ["status"])
+        await db.execute(
+            "DELETE FROM archived_versions WHERE (entity_type, entity_id) IN "
+            "(SELECT entity_type, entity_id FROM archived WHERE root_type = ? AND root_id = ?)",
+            (root_type, root_id),
+        )
+        await db.execute("DELETE FROM archived WHERE root_type = ? AND root_id = ?", (root_type, root_id))
+        learned = await _apply_ngrams(db, delta)
+        await _commit_learned(db, learned)
+    finally:
+        await db.close()
+    feed.reset()
+    log.info("Restored %s %d with %d entities under it", root_type, root_id, len(members) - 1)
+    return [{"type": t, "id": entry["row"]["id"]} for t, entry in members]
+
+
+async def archive_pending() -> int:
+    """Archive every hot entity whose status is ``archived`` but which was not
+    moved yet (from before the archive tier existed, or left by a write that
+    failed before archiving it), and fill in the version numbers and times
+    of archived version rows that predate them. Returns the number of
+    entities moved."""
+    moved = 0
+    db = await get_db()
+    try:
+        await _backfill_archived_versions(db)
+    finally:
+        await db.close()
+    for entity_type, table in _TABLES.items():  # parents first: children move with them
+        db = await get_db()
+        try:
+            cursor = await db.execute(f"SELECT id FROM {table} WHERE status = 'archived' ORDER BY id")
+            ids = [r[0] for r in await cursor.fetchall()]
+        finally:
+            await db.close()
+        for entity_id in ids:
+            moved += len(await archive(entity_type, entity_id) or [])
+    return moved
+
+
+async def _backfill_archived_versions(db):
+    """Copy ``version`` and ``created_at`` into ``archived_versions`` rows
+    written before those columns existed (migration 014)."""
+    cursor = await db.execute(
+        "SELECT entity_type, entity_id, data FROM archived WHERE (entity_type, entity_id) IN "
+        "(SELECT entity_type, entity_id FROM archived_versions WHERE created_at IS NULL)"
+    )
+    rows = await cursor.fetchall()
+    if not rows:
+        return
+    await db.executemany(
+        "UPDATE archived_versions SET version = ?, created_at = ? WHERE id = ?",
+        [(v["version"], v["created_at"], v["id"]) for row in rows for v in _unpack(row["data"])["versions"]],
+    )
+    await db.commit()
+    log.info("Recorded version times for %d archived entities", len(rows))
+
+
+async def get_archived(entity_type: str, entity_id: int) -> dict | None:
+    """An archived entity's row, read through from the archive tier.
+
+    The row carries an extra ``archived`` key: ``{"at", "root_type",
+    "root_id", "version"}``, ``version`` being its newest version number.
+    """
+    db = await get_db()
+    try:
+        cursor = await db.execute(
+            "SELECT root_type, root_id, version, archived_at, data FROM archived "
+            "WHERE entity_type = ? AND entity_id = ?",
+            (entity_type, entity_id),
+        )
+        row = await cursor.fetchone()
+    finally:
+        await db.close()
+    if row is None:
+        return None
+    entity = _unpack(row["data"])["row"]
+    entity["archived"] = {"at": row["archived_at"], "root_type": row["root_type"],
+                          "root_id": row["root_id"], "version": row["version"]}
+    return entity
+
+
+async def list_archived(entity_type: str | None = None, parent_ids: list[int] | None = None) -> list[dict]:
+    """Archived entities, newest first, without decompressing them.
+
+    Each is ``{"entity_type", "id", "root_type", "root_id", "parent_id",
+    "title", "status", "version", "archived_at", "bytes"}``. ``parent_ids``
+    (with ``entity_type``) keeps the plans of those projects or the PRDs of
+    those plans.
+    """
+    clauses, params = [], []
+    if entity_type:
+        clauses.append("entity_type = ?")
+        params.append(entity_type)
+    if parent_ids is not None:
+        clauses.append("parent_id IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(parent_ids))
+    where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    db = await get_db()
+    try:
+        cursor = await db.execute(
+            f"SELECT {_ARCHIVED_COLUMNS}, length(data) AS bytes FROM archived{where} "
+            "ORDER BY archived_at DESC, root_type, root_id",
+            params,
+        )
+        rows = [dict(r) for r in await cursor.fetchall()]
+    finally:
+        await db.close()
+    for row in rows:
+        row["id"] = row.pop("entity_id")
+    return rows
+
+
+async def _archived_history(db, version_id: int) -> list[dict]:
+    """Every version row of the archived entity owning version ``version_id``
+    (empty if no archived entity does)."""
+    cursor = await db.execute(
+        "SELECT a.data FROM archived_versions o JOIN archived a "
+        "ON a.entity_type = o.entity_type AND a.entity_id = o.entity_id WHERE o.id = ?",
+        (version_id,),
+    )
+    row = await cursor.fetchone()
+    return _unpack(row["data"])["versions"] if row else []
+
+
 # ── Settings ───────────────────────────────────────────
 
 async def get_setting(key: str) -> str | None:
@@ -410,8 +1411,159 @@ async def update_setting(key: str, value: str) -> bool:
 
 
 # Stable numeric ID for a setting key (for version tracking)
-_SETTING_KEY_IDS = {"enhance_light": 1, "enhance_medium": 2, "enhance_heavy": 3}
+_SETTING_KEY_IDS = {
+    "enhance_light": 1, "enhance_medium": 2, "enhance_heavy": 3,
+    "model_plan_chat": 4, "model_prd_chat": 5, "model_prd_generate": 6,
+    "model_enhance_light": 7, "model_enhance_medium": 8, "model_enhance_heavy": 9,
+}
 
 
 def _setting_key_id(key: str) -> int:
     return _SETTING_KEY_IDS.get(key, abs(hash(key)) % 1_000_000)
+
+
+# ── Autocomplete N-grams ───────────────────────────────
+
+# Text fields whose words feed the learned autocomplete model
+_LEARNED_FIELDS = {
+    "project": ("title", "description", "milestones"),
+    "plan": ("title", "description", "vision", "goals", "target_audience", "success_metrics"),
+    "prd": (
+        "title", "content", "overview", "problem_statement", "proposed_solution",
+        "user_stories", "requirements_functional", "requirements_nonfunctional",
+        "success_metrics", "timeline",
+    ),
+}
+
+
+async def _learned_row(db, entity_type: str, entity_id: int, changing: dict | None = None) -> dict | None:
+    """Current text fields of an entity, or ``None`` if ``changing`` touches none of them."""
+    fields = _LEARNED_FIELDS[entity_type]
+    if changing is not None and not any(f in changing for f in fields):
+        return None
+    cursor = await db.execute(
+        f"SELECT {', '.join(fields)} FROM {_TABLES[entity_type]} WHERE id = ?", (entity_id,)
+    )
+    row = await cursor.fetchone()
+    return dict(row) if row else None
+
+
+async def _learn(db, entity_type: str, old: dict | None, new: dict | None) -> Counter:
+    """Write the n-gram changes between two versions of an entity in the
+    caller's transaction; returns them for ``_commit_learned``."""
+    return await _apply_ngrams(db, ngrams.diff(old, new, _LEARNED_FIELDS[entity_type]))
+
+
+async def _apply_ngrams(db, delta: Counter) -> Counter:
+    """Write n-gram count changes in the caller's transaction and return them.
+
+    Only the changed keys are checked for counts that reached zero, so a
+    save costs a few index seeks rather than a scan of the table.
+    """
+    if not delta:
+        return delta
+    rows = [(context, word, change) for (context, word), change in delta.items()]
+    await db.executemany(
+        "INSERT INTO ngrams (context, word, count) VALUES (?, ?, ?) "
+        "ON CONFLICT(context, word) DO UPDATE SET count = count + excluded.count",
+        rows,
+    )
+    await db.executemany(
+        "DELETE FROM ngrams WHERE context = ? AND word = ? AND count <= 0",
+        [(context, word) for context, word, change in rows if change < 0],
+    )
+    return delta
+
+
+async def _commit_learned(db, delta: Counter):
+    """Commit the caller's transaction, then apply its n-gram ``delta`` to the
+    in-memory model, so a rolled-back write never reaches it. Prunes rare
+    n-grams from both once the model outgrows ``ngrams.MAX_ENTRIES``."""
+    await db.commit()
+    if not delta:
+        return
+    ngrams.model.apply(delta)
+    if ngrams.model.entries > ngrams.MAX_ENTRIES:
+        await db.execute(
+            "DELETE FROM ngrams WHERE context != '' AND count < ?", (ngrams.MIN_COUNT,)
+        )
+        await db.commit()
+        ngrams.model.prune()
+
+
+async def load_ngrams():
+    """Load learned n-grams into memory, learning from every document on first run."""
+    db = await get_db()
+    try:
+        cursor = await db.execute("SELECT context, word, count FROM ngrams")
+        rows = await cursor.fetchall()
+        if rows:
+            ngrams.model.load(tuple(r) for r in rows)
+            return
+        ngrams.model.load([])
+        learned = Counter()
+        for entity_type, table in _TABLES.items():
+            cursor = await db.execute(f"SELECT {', '.join(_LEARNED_FIELDS[entity_type])} FROM {table}")
+            for row in await cursor.fetchall():
+                learned.update(await _learn(db, entity_type, None, dict(row)))
+        await _commit_learned(db, learned)
+    finally:
+        await db.close()
+
+
+# ── AI Telemetry ───────────────────────────────────────
+
+_ROLLUP_SUMS = (
+    "calls", "input_tokens", "output_tokens", "cache_read_tokens",
+    "cache_creation_tokens", "stream_seconds",
+)
+
+
+async def merge_ai_call_rollup(rows: list[dict]):
+    """Add rollup rows into ``ai_call_rollup``, summing counters and histograms.
+
+    Histograms are merged in Python, so the read and the write happen under
+    one write lock; a concurrent flush (another worker) would otherwise
+    overwrite this one's counts.
+    """
+    db = await get_db()
+    try:
+        await db.execute("BEGIN IMMEDIATE")
+        for row in rows:
+            key = (row["bucket"], row["mode"], row["model"], row["outcome"])
+            cursor = await db.execute(
+                "SELECT ttft_hist, duration_hist FROM ai_call_rollup "
+                "WHERE bucket = ? AND mode = ? AND model = ? AND outcome = ?",
+                key,
+            )
+            existing = await cursor.fetchone()
+            hists = []
+            for i, name in enumerate(("ttft_hist", "duration_hist")):
+                merged = list(row[name])
+                if existing:
+                    for j, c in enumerate(json.loads(existing[i])):
+                        merged[j] += c
+                hists.append(json.dumps(merged))
+            sums = [row[c] for c in _ROLLUP_SUMS]
+            await db.execute(
+                f"INSERT INTO ai_call_rollup (bucket, mode, model, outcome, {', '.join(_ROLLUP_SUMS)}, "
+                "ttft_hist, duration_hist) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(bucket, mode, model, outcome) DO UPDATE SET "
+                + ", ".join(f"{c} = {c} + excluded.{c}" for c in _ROLLUP_SUMS)
+                + ", ttft_hist = excluded.ttft_hist, duration_hist = excluded.duration_hist",
+                (*key, *sums, *hists),
+            )
+        await db.commit()
+    finally:
+        await db.close()
+
+
+async def list_ai_call_rollup(since_bucket: str) -> list[dict]:
+    db = await get_db()
+    try:
+        cursor = await db.execute(
+            "SELECT * FROM ai_call_rollup WHERE bucket >= ? ORDER BY bucket", (since_bucket,)
+        )
+        return [dict(r) for r in await cursor.fetchall()]
+    finally:
+        await db.close()
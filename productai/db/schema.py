@@ -1,25 +1,122 @@
 """Database connection management and migration runner for ProductAI."""
 
+import time
+import zlib
 import aiosqlite
 from pathlib import Path
 from datetime import datetime, timezone
 
+from .. import metrics
+
 DB_PATH = Path(__file__).parent.parent.parent / "productai.db"
 MIGRATIONS_DIR = Path(__file__).parent / "migrations"
 
 
-async def get_db() -> aiosqlite.Connection:
+class TimedConnection:
+    """An ``aiosqlite.Connection`` whose work counts against a request's stats.
+
+    Statements, fetches from their cursors, commits, rollbacks and closing
+    are timed; everything else goes straight to the connection.
+    """
+
+    def __init__(self, db: aiosqlite.Connection, stats: metrics.RequestStats):
+        self._db = db
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    @property
+    def row_factory(self):
+        return self._db.row_factory
+
+    @row_factory.setter
+    def row_factory(self, factory):
+        self._db.row_factory = factory
+
+    async def _timed(self, call, *args):
+        start = time.perf_counter()
+        try:
+            return await call(*args)
+        finally:
+            self._stats.db += time.perf_counter() - start
+
+    async def execute(self, sql: str, parameters=None) -> "TimedCursor":
+        self._stats.queries += 1
+        return TimedCursor(await self._timed(self._db.execute, sql, parameters), self._timed)
+
+    async def executemany(self, sql: str, parameters) -> "TimedCursor":
+        self._stats.queries += 1
+        return TimedCursor(await self._timed(self._db.executemany, sql, parameters), self._timed)
+
+    async def executescript(self, sql_script: str) -> "TimedCursor":
+        self._stats.queries += 1
+        return TimedCursor(await self._timed(self._db.executescript, sql_script), self._timed)
+
+    async def commit(self):
+        await self._timed(self._db.commit)
+
+    async def rollback(self):
+        await self._timed(self._db.rollback)
+
+    async def close(self):
+        await self._timed(self._db.close)
+
+
+class TimedCursor:
+    """An ``aiosqlite.Cursor`` whose fetches are timed like its statement."""
+
+    def __init__(self, cursor: aiosqlite.Cursor, timed):
+        self._cursor = cursor
+        self._timed = timed
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    async def fetchone(self):
+        return await self._timed(self._cursor.fetchone)
+
+    async def fetchmany(self, size: int | None = None):
+        return await self._timed(self._cursor.fetchmany, size)
+
+    async def fetchall(self):
+        return await self._timed(self._cursor.fetchall)
+
+
+async def get_db() -> aiosqlite.Connection | TimedConnection:
+    """Open a connection; inside a request, one that is timed for ``metrics``."""
+    start = time.perf_counter()
     db = await aiosqlite.connect(DB_PATH)
+    stats = metrics.current()
+    if stats is not None:
+        stats.connections += 1
+        stats.db += time.perf_counter() - start
+        db = TimedConnection(db, stats)
     db.row_factory = aiosqlite.Row
     await db.execute("PRAGMA journal_mode=WAL")
     await db.execute("PRAGMA foreign_keys=ON")
     return db
 
 
+def _migrations_hash(files: list[Path]) -> int:
+    """Fingerprint of the migration set, stored as the database's ``user_version``."""
+    return zlib.crc32("\n".join(f.name for f in files).encode()) & 0x7FFFFFFF
+
+
 async def init_db():
-    """Run all pending migrations in order. Safe to call on every startup."""
+    """Run all pending migrations in order. Safe to call on every startup.
+
+    A database whose ``user_version`` matches the hash of the migration file
+    names has them all applied already; startup then skips the migration
+    bookkeeping and its write transaction.
+    """
+    migration_files = sorted(MIGRATIONS_DIR.glob("*.sql"))
+    expected = _migrations_hash(migration_files)
     db = await get_db()
     try:
+        cursor = await db.execute("PRAGMA user_version")
+        if (await cursor.fetchone())[0] == expected:
+            return
         # Ensure the migrations tracking table exists
         await db.execute("""
             CREATE TABLE IF NOT EXISTS _migrations (
@@ -34,8 +131,7 @@ async def init_db():
         cursor = await db.execute("SELECT name FROM _migrations")
         applied = {row[0] for row in await cursor.fetchall()}
 
-        # Discover and run pending migrations in sorted order
-        migration_files = sorted(MIGRATIONS_DIR.glob("*.sql"))
+        # Run pending migrations in sorted order
         for mf in migration_files:
             if mf.name in applied:
                 continue
@@ -45,6 +141,7 @@ async def init_db():
                 "INSERT INTO _migrations (name) VALUES (?)", (mf.name,)
             )
             await db.commit()
+        await db.execute(f"PRAGMA user_version = {expected}")
     finally:
         await db.close()
 
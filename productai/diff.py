@@ -0,0 +1,210 @@
+"""Field-by-field diffs between two version snapshots.
+
+Unchanged fields are skipped with one string comparison. Long text is diffed
+by line: every distinct line is interned to an integer, the common head and
+tail are trimmed, and only the middle goes through ``SequenceMatcher``, so a
+multi-KB PRD with one edited paragraph compares a handful of integers.
+Replaced line blocks (and single-line fields) get a word-level diff on top.
+JSON list fields (user stories, requirements, goals) are diffed item by item.
+
+Results are cached per version pair in an LRU, keyed with the hashes of both
+raw snapshots: version rows never change in normal use, but an import may
+restore a row under the same id. Routes call ``version_diff`` in a worker
+thread, so the cache is guarded by a lock.
+"""
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+CACHE_SIZE = int(os.environ.get("VERSION_DIFF_CACHE_SIZE", "256"))
+CONTEXT_LINES = 3
+WORD_DIFF_MAX_TOKENS = 600  # per side; longer replaced blocks get a line diff only
+
+# Bookkeeping fields that change on every save
+SKIP_FIELDS = {"id", "created_at", "updated_at", "ai_conversation"}
+
+# A word or punctuation mark with the whitespace after it; only leading
+# whitespace is a token of its own. Bare whitespace tokens would be the most
+# common element on both sides, and SequenceMatcher (which cannot junk them
+# without losing them from the output) goes quadratic matching them up.
+_TOKENS = re.compile(r"\s+|\w+\s*|[^\w\s]\s*")
+
+# (from id, to id) -> (from snapshot hash, to snapshot hash, diff)
+_cache: OrderedDict[tuple[int, int], tuple[int, int, dict]] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def version_diff(old: dict | None, new: dict) -> dict:
+    """Diff of version rows ``old`` -> ``new`` (rows of the same entity), cached.
+
+    ``old`` is ``None`` for a first version, which diffs against nothing.
+    """
+    old_snapshot = old["snapshot"] if old else "{}"
+    key = (old["id"] if old else 0, new["id"])
+    digests = (hash(old_snapshot), hash(new["snapshot"]))
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None and hit[:2] == digests:
+            _cache.move_to_end(key)
+            return hit[2]
+    result = {
+        "entity_type": new["entity_type"],
+        "entity_id": new["entity_id"],
+        "from": {k: old[k] for k in ("id", "version", "created_at")} if old else None,
+        "to": {k: new[k] for k in ("id", "version", "created_at")},
+        **snapshot_diff(json.loads(old_snapshot), json.loads(new["snapshot"])),
+    }
+    with _cache_lock:
+        _cache[key] = (*digests, result)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def snapshot_diff(old: dict, new: dict) -> dict:
+    """``{"fields": [...], "unchanged": n}`` for two snapshot dicts."""
+    fields, unchanged = [], 0
+    for name in list(old) + [k for k in new if k not in old]:
+        if name in SKIP_FIELDS:
+            continue
+        change = field_diff(old.get(name), new.get(name))
+        if change is None:
+            unchanged += 1
+        else:
+            fields.append({"field": name, **change})
+    return {"fields": fields, "unchanged": unchanged}
+
+
+def field_diff(before, after) -> dict | None:
+    """Diff of one field value, or ``None`` if it did not change.
+
+    ``kind`` is ``"value"`` (``old``/``new``, for non-text values), ``"words"``
+    (single-line text: ``ops`` of ``[tag, text]``), ``"lines"`` (multi-line
+    text) or ``"list"`` (JSON lists, one line per item); the last two carry
+    line ``ops``, see ``line_ops``. A missing value equals an empty one.
+    """
+    if before == after:
+        return None
+    if not (isinstance(before, str) or before is None) or not (isinstance(after, str) or after is None):
+        return {"kind": "value", "old": before, "new": after}
+    before, after = before or "", after or ""
+    if before == after:
+        return None
+    old_items, new_items = _list_items(before), _list_items(after)
+    if old_items is not None and new_items is not None:
+        if old_items == new_items:
+            return None
+        return {"kind": "list", "ops": line_ops(old_items, new_items)}
+    if "\n" not in before and "\n" not in after:
+        ops = word_ops(before, after)
+        if ops is not None:
+            return {"kind": "words", "ops": ops}
+    return {"kind": "lines", "ops": line_ops(before.split("\n"), after.split("\n"))}
+
+
+def _list_items(text: str) -> list[str] | None:
+    if not text.startswith("["):
+        return [] if not text else None
+    try:
+        items = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(items, list):
+        return None
+    return [i if isinstance(i, str) else json.dumps(i, sort_keys=True) for i in items]
+
+
+def line_ops(old: list[str], new: list[str]) -> list[dict]:
+    """Line-level edit script turning ``old`` into ``new``.
+
+    Ops are ``{"op": "equal", "lines"}`` (trimmed to ``CONTEXT_LINES`` around
+    changes, with ``{"op": "skip", "count"}`` for the lines left out),
+    ``{"op": "delete", "lines"}``, ``{"op": "insert", "lines"}`` and
+    ``{"op": "replace", "old", "new"}``; a replace also has ``words``
+    (``[tag, text]`` ops over the joined blocks) unless the blocks are long.
+    """
+    ids: dict[str, int] = {}
+    a = [ids.setdefault(line, len(ids)) for line in old]
+    b = [ids.setdefault(line, len(ids)) for line in new]
+    head = 0
+    while head < len(a) and head < len(b) and a[head] == b[head]:
+        head += 1
+    tail = 0
+    while tail < len(a) - head and tail < len(b) - head and a[-1 - tail] == b[-1 - tail]:
+        tail += 1
+
+    opcodes = [("equal", 0, head, 0, head)] if head else []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(
+        None, a[head:len(a) - tail], b[head:len(b) - tail], autojunk=False
+    ).get_opcodes():
+        opcodes.append((tag, i1 + head, i2 + head, j1 + head, j2 + head))
+    if tail:
+        opcodes.append(("equal", len(a) - tail, len(a), len(b) - tail, len(b)))
+
+    ops = []
+    for n, (tag, i1, i2, j1, j2) in enumerate(opcodes):
+        if tag == "equal":
+            ops += _context(old[i1:i2], first=n == 0, last=n == len(opcodes) - 1)
+        elif tag == "delete":
+            ops.append({"op": "delete", "lines": old[i1:i2]})
+        elif tag == "insert":
+            ops.append({"op": "insert", "lines": new[j1:j2]})
+        else:
+            op = {"op": "replace", "old": old[i1:i2], "new": new[j1:j2]}
+            words = word_ops("\n".join(op["old"]), "\n".join(op["new"]))
+            if words is not None:
+                op["words"] = words
+            ops.append(op)
+    return ops
+
+
+def _context(lines: list[str], first: bool, last: bool) -> list[dict]:
+    keep_head = 0 if first else CONTEXT_LINES
+    keep_tail = 0 if last else CONTEXT_LINES
+    if len(lines) <= keep_head + keep_tail:
+        return [{"op": "equal", "lines": lines}]
+    ops = [{"op": "equal", "lines": lines[:keep_head]}] if keep_head else []
+    ops.append({"op": "skip", "count": len(lines) - keep_head - keep_tail})
+    if keep_tail:
+        ops.append({"op": "equal", "lines": lines[-keep_tail:]})
+    return ops
+
+
+def word_ops(old: str, new: str) -> list[list[str]] | None:
+    """``[tag, text]`` ops (``equal``/``delete``/``insert``) over words with
+    their trailing whitespace, or ``None`` if either side is over
+    ``WORD_DIFF_MAX_TOKENS``. The common head and tail are trimmed first, as
+    in ``line_ops``."""
+    a, b = _TOKENS.findall(old), _TOKENS.findall(new)
+    if len(a) > WORD_DIFF_MAX_TOKENS or len(b) > WORD_DIFF_MAX_TOKENS:
+        return None
+    head = 0
+    while head < len(a) and head < len(b) and a[head] == b[head]:
+        head += 1
+    tail = 0
+    while tail < len(a) - head and tail < len(b) - head and a[-1 - tail] == b[-1 - tail]:
+        tail += 1
+    ops: list[list[str]] = []
+
+    def emit(tag: str, text: str):
+        if not text:
+            return
+        if ops and ops[-1][0] == tag:
+            ops[-1][1] += text
+        else:
+            ops.append([tag, text])
+
+    emit("equal", "".join(a[:head]))
+    middle_a, middle_b = a[head:len(a) - tail], b[head:len(b) - tail]
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, middle_a, middle_b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            emit("equal", "".join(middle_a[i1:i2]))
+        else:
+            emit("delete", "".join(middle_a[i1:i2]))
+            emit("insert", "".join(middle_b[j1:j2]))
+    emit("equal", "".join(a[len(a) - tail:]))
+    return ops
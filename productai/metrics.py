@@ -0,0 +1,247 @@
+"""Per-request timing: DB, templates and AI, as Server-Timing and Prometheus metrics.
+
+``MetricsMiddleware`` gives every HTTP request a ``RequestStats`` in a context
+variable (tasks started by the request inherit it). ``db.schema.get_db``
+wraps each connection in a ``TimedConnection``, which counts connections and
+queries and times statements, fetches and commits; template rendering and AI
+calls add their time with ``add``.
+
+What has accrued when the response starts is sent as a ``Server-Timing``
+header, so browser dev tools show it per request. When the response body
+ends (after the last event, for streams) the totals go into per-route
+histograms and counters, served in Prometheus text format by ``/metrics``.
+Routes are labelled by path template, e.g. ``/prds/{prd_id}``. Each worker
+process keeps its own numbers.
+"""
+
+import bisect
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from starlette.datastructures import MutableHeaders
+
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "1") != "0"
+
+# Upper bucket edges: request seconds, and DB queries per request
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+QUERY_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+
+class RequestStats:
+    __slots__ = ("connections", "queries", "db", "template", "ai")
+
+    def __init__(self):
+        self.connections = 0
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.ai = 0.0
+
+    def server_timing(self, total: float) -> str:
+        parts = [
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries, {self.connections} connections"',
+            f"tpl;dur={self.template * 1000:.1f}",
+        ]
+        if self.ai:
+            parts.append(f"ai;dur={self.ai * 1000:.1f}")
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def add(kind: str, seconds: float):
+    """Add time spent in ``kind`` (``"template"`` or ``"ai"``) to the current request."""
+    stats = _current.get()
+    if stats is not None:
+        setattr(stats, kind, getattr(stats, kind) + seconds)
+
+
+@contextmanager
+def timed(kind: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(kind, time.perf_counter() - start)
+
+
+def current() -> RequestStats | None:
+    """The current request's stats, or ``None`` outside a request."""
+    return _current.get()
+
+
+# ── Aggregation ───────────────────────────────────────
+
+class _Histogram:
+    __slots__ = ("edges", "counts", "total", "count")
+
+    def __init__(self, edges: list):
+        self.edges = edges
+        self.counts = [0] * (len(edges) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.edges, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> list[str]:
+        out = []
+        cumulative = 0
+        for edge, n in zip(self.edges + ["+Inf"], self.counts):
+            cumulative += n
+            out.append(f'{name}_bucket{{{labels},le="{edge}"}} {cumulative}')
+        out.append(f"{name}_sum{{{labels}}} {self.total:.6f}")
+        out.append(f"{name}_count{{{labels}}} {self.count}")
+        return out
+
+
+class _RouteStats:
+    __slots__ = ("latency", "queries", "statuses", "connections", "db", "template", "ai")
+
+    def __init__(self):
+        self.latency = _Histogram(LATENCY_BUCKETS)
+        self.queries = _Histogram(QUERY_BUCKETS)
+        self.statuses: dict[int, int] = {}
+        self.connections = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.ai = 0.0
+
+
+_routes: dict[tuple[str, str], _RouteStats] = {}
+
+
+def observe(method: str, route: str, status: int, seconds: float, stats: RequestStats):
+    entry = _routes.get((method, route))
+    if entry is None:
+        entry = _routes[method, route] = _RouteStats()
+    entry.latency.observe(seconds)
+    entry.queries.observe(stats.queries)
+    entry.statuses[status] = entry.statuses.get(status, 0) + 1
+    entry.connections += stats.connections
+    entry.db += stats.db
+    entry.template += stats.template
+    entry.ai += stats.ai
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def exposition() -> str:
+    """All route metrics in the Prometheus text format."""
+    sections = {
+        "productai_http_requests_total": ("counter", "HTTP requests by route and status."),
+        "productai_http_request_duration_seconds": ("histogram", "HTTP request latency by route."),
+        "productai_http_request_db_queries": ("histogram", "SQLite queries per HTTP request."),
+        "productai_db_connections_total": ("counter", "SQLite connections opened by route."),
+        "productai_db_seconds_total": ("counter", "Time spent waiting on SQLite by route."),
+        "productai_template_seconds_total": ("counter", "Time spent rendering templates by route."),
+        "productai_ai_seconds_total": ("counter", "Time spent in AI calls by route."),
+    }
+    body = {name: [] for name in sections}
+    for (method, route), entry in sorted(_routes.items(), key=lambda item: (item[0][1], item[0][0])):
+        labels = f'method="{method}",route="{_label(route)}"'
+        for status, n in sorted(entry.statuses.items()):
+            body["productai_http_requests_total"].append(
+                f'productai_http_requests_total{{{labels},status="{status}"}} {n}'
+            )
+        body["productai_http_request_duration_seconds"] += entry.latency.lines(
+            "productai_http_request_duration_seconds", labels
+        )
+        body["productai_http_request_db_queries"] += entry.queries.lines(
+            "productai_http_request_db_queries", labels
+        )
+        body["productai_db_connections_total"].append(
+            f"productai_db_connections_total{{{labels}}} {entry.connections}"
+        )
+        for name, value in (("db", entry.db), ("template", entry.template), ("ai", entry.ai)):
+            body[f"productai_{name}_seconds_total"].append(
+                f"productai_{name}_seconds_total{{{labels}}} {value:.6f}"
+            )
+    out = []
+    for name, (kind, help_text) in sections.items():
+        out += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", *body[name]]
+    out += ["# HELP productai_startup_seconds Time spent in each startup phase of this worker.",
+            "# TYPE productai_startup_seconds gauge"]
+    out += [f'productai_startup_seconds{{phase="{name}",background="{str(name in _BACKGROUND).lower()}"}} '
+            f"{seconds:.6f}" for name, seconds in STARTUP.items()]
+    return "\n".join(out) + "\n"
+
+
+# ── Startup ───────────────────────────────────────────
+
+# Seconds per startup phase, in the order they finished. Background phases run
+# after the app starts serving and are reported apart from the blocking ones.
+STARTUP: dict[str, float] = {}
+_BACKGROUND: set[str] = set()
+
+
+@contextmanager
+def startup_phase(name: str, background: bool = False):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP[name] = time.perf_counter() - start
+        if background:
+            _BACKGROUND.add(name)
+
+
+def startup_report() -> str:
+    """E.g. ``ready in 0.61s (imports 0.52s, migrations 0.00s, ...)``."""
+    blocking = {k: v for k, v in STARTUP.items() if k not in _BACKGROUND}
+    phases = ", ".join(f"{k} {v:.2f}s" for k, v in blocking.items())
+    report = f"ready in {sum(blocking.values()):.2f}s ({phases})"
+    background = ", ".join(f"{k} {v:.2f}s" for k, v in STARTUP.items() if k in _BACKGROUND)
+    return f"{report}; background: {background}" if background else report
+
+
+# ── Middleware ────────────────────────────────────────
+
+class MetricsMiddleware:
+    """Measure every HTTP request (plain ASGI, so streamed bodies pass straight through)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+        recorded = False
+
+        def record():
+            nonlocal recorded
+            if not recorded:
+                recorded = True
+                route = scope.get("route")
+                observe(scope["method"], getattr(route, "path", "<unmatched>"), status,
+                        time.perf_counter() - start, stats)
+
+        async def send_timed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", stats.server_timing(time.perf_counter() - start))
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                record()
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            _current.reset(token)
+            record()
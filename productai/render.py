@@ -0,0 +1,173 @@
+"""Server-side markdown rendering.
+
+Stored fields are rendered once per entity field and version and served from
+an LRU cache, so detail pages ship finished HTML instead of re-parsing every
+field in the browser on each load. Streaming responses use
+``IncrementalRenderer``, which emits HTML only for blocks that can no longer
+change, so clients append fragments instead of re-parsing the whole answer on
+every token.
+"""
+
+import json
+import os
+import re
+from collections import OrderedDict
+from functools import cache
+
+from markupsafe import Markup
+
+CACHE_SIZE = int(os.environ.get("MARKDOWN_CACHE_SIZE", "2048"))
+
+# (entity_type, entity_id, field) or similar key -> (version, text hash, html)
+_cache: OrderedDict[tuple, tuple] = OrderedDict()
+
+
+@cache
+def _markdown():
+    # Imported and built on first use: with its extensions, a noticeable part of startup
+    import markdown
+    return markdown.Markdown(extensions=["extra", "sane_lists"])
+
+
+def render_markdown(text: str) -> Markup:
+    if not text or not text.strip():
+        return Markup("")
+    return Markup(_markdown().reset().convert(text))
+
+
+def render_field(entity_type: str, entity: dict, field: str, version=None) -> Markup:
+    """Rendered HTML for ``entity[field]``, cached per entity field and version.
+
+    ``version`` defaults to the entity's ``updated_at``.
+    """
+    return render_cached(
+        (entity_type, entity.get("id"), field),
+        entity.get("updated_at") if version is None else version,
+        entity.get(field) or "",
+    )
+
+
+_INCOMPLETE_NOTE = Markup('<p class="text-xs italic text-gray-400">Reply interrupted.</p>')
+
+
+def render_history(session: dict) -> list[dict]:
+    """An AI session's messages with assistant replies pre-rendered to HTML."""
+    history = []
+    for i, m in enumerate(json.loads(session.get("messages") or "[]")):
+        message = {"role": m["role"], "content": m["content"]}
+        if m["role"] == "assistant":
+            message["html"] = render_cached(
+                (f"{session['entity_type']}_chat", session["entity_id"], i), None, m["content"]
+            )
+            if m.get("incomplete"):
+                message["html"] += _INCOMPLETE_NOTE
+        history.append(message)
+    return history
+
+
+def render_cached(key: tuple, version, text: str) -> Markup:
+    """Render ``text`` once per ``key`` and ``version``.
+
+    The text's hash is kept alongside so two writes within one version stamp
+    can't serve stale HTML.
+    """
+    digest = hash(text)
+    hit = _cache.get(key)
+    if hit is not None and hit[0] == version and hit[1] == digest:
+        _cache.move_to_end(key)
+        return hit[2]
+    html = render_markdown(text)
+    _cache[key] = (version, digest, html)
+    _cache.move_to_end(key)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return html
+
+
+# ── Incremental rendering for streams ─────────────────
+
+_FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+_HEADING = re.compile(r"^ {0,3}#{1,6}(\s|$)")
+_LIST_ITEM = re.compile(r"^ {0,3}([-*+]|\d{1,9}[.)])\s")
+
+
+def _utf16_len(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+class IncrementalRenderer:
+    """Turn a token stream into HTML fragments for completed markdown blocks.
+
+    A block is complete once a blank line (outside a code fence) is followed by
+    a line that can't continue it: a list keeps going across blank lines while
+    new items or indented lines follow, and ATX headings are complete as soon as
+    their line ends. ``feed`` returns the HTML of newly completed blocks (or
+    ``""``); ``offset`` is how much of the raw text that HTML covers, so the
+    client can show the remainder as plain text until it is rendered. It counts
+    UTF-16 code units, as JavaScript's ``String.slice`` does: an emoji or any
+    other character outside the BMP is two.
+    """
+
+    def __init__(self):
+        self.offset = 0
+        self._partial = ""  # incomplete trailing line
+        self._block: list[str] = []
+        self._fence: str | None = None
+        self._after_blank = False
+
+    def feed(self, token: str) -> str:
+        self._partial += token
+        if "\n" not in token:
+            return ""
+        *lines, self._partial = self._partial.split("\n")
+        out = []
+        for line in lines:
+            out.extend(self._line(line + "\n"))
+        return "".join(out)
+
+    def finish(self) -> str:
+        """HTML for everything not yet emitted, including an unterminated last line."""
+        if self._partial:
+            self._block.append(self._partial)
+            self._partial = ""
+        return self._emit()
+
+    def _line(self, line: str) -> list[str]:
+        if self._fence is not None:
+            self._block.append(line)
+            if line.strip().startswith(self._fence):
+                self._fence = None
+            return []
+        if not line.strip():
+            if self._block:
+                self._after_blank = True
+                self._block.append(line)
+            else:
+                self.offset += _utf16_len(line)
+            return []
+
+        out = []
+        if self._block and (self._after_blank or _HEADING.match(line)) and not self._continues(line):
+            out.append(self._emit())
+        self._after_blank = False
+        self._block.append(line)
+        fence = _FENCE.match(line)
+        if fence:
+            self._fence = fence.group(1)[:3]
+        elif _HEADING.match(line):
+            out.append(self._emit())
+        return out
+
+    def _continues(self, line: str) -> bool:
+        if _HEADING.match(line):
+            return False
+        if line[:1] in (" ", "\t"):
+            return True
+        return bool(_LIST_ITEM.match(self._block[0]) and _LIST_ITEM.match(line))
+
+    def _emit(self) -> str:
+        text = "".join(self._block)
+        self.offset += _utf16_len(text)
+        self._block = []
+        self._after_blank = False
+        return str(render_markdown(text))
@@ -1,14 +1,33 @@
 """API routes — data operations and AI streaming."""
 
+import asyncio
 import json
+import logging
 import os
-from fastapi import APIRouter, Form, Request
-from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
-from ..db import models
+import uuid
+from datetime import date
+from fastapi import APIRouter, Form, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
+from fastapi.websockets import WebSocketState
+from .. import diff
+from ..db import changes, models
 from ..ai import service as ai_service
 from ..ai import autocomplete as ac
+from ..ai import ngrams
+from ..ai import streams
+from ..ai import telemetry
+from ..ai.routing import MODES, router as model_router, setting_key
+from ..ai.scheduler import (
+    PRIORITY_BULK, PRIORITY_INTERACTIVE, SchedulerOverloaded, Ticket, scheduler,
+)
+from ..render import IncrementalRenderer
+from . import sse
 
 BASE_PATH = os.environ.get("BASE_PATH", "").rstrip("/")
+ENHANCE_BATCH_CONCURRENCY = int(os.environ.get("AI_ENHANCE_BATCH_CONCURRENCY", "3"))
+TRUSTED_PROXIES = {h.strip() for h in os.environ.get("TRUSTED_PROXIES", "").split(",") if h.strip()}
+
+log = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api")
 
@@ -97,6 +116,178 @@ async def delete_prd(prd_id: int):
     return RedirectResponse(f"{BASE_PATH}/", status_code=303)
 
 
+# ── Bulk JSON CRUD ─────────────────────────────────────
+
+_BULK_KINDS = {"projects": "project", "plans": "plan", "prds": "prd"}
+
+
+@router.post("/bulk/{kind}")
+async def bulk_write(kind: str, request: Request):
+    """Create, update and delete many projects, plans or PRDs in one transaction.
+
+    Body: ``{"items": [{"op": "create" | "update" | "delete", "id": n,
+    "fields": {...}}, ...]}``. Answers with one result per item, in order.
+    """
+    entity_type = _BULK_KINDS.get(kind)
+    if entity_type is None:
+        return JSONResponse({"error": f"kind must be one of {', '.join(_BULK_KINDS)}"}, status_code=404)
+    try:
+        body = await request.json()
+    except ValueError:
+        return JSONResponse({"error": "Body must be JSON"}, status_code=400)
+    items = body.get("items") if isinstance(body, dict) else None
+    if not isinstance(items, list):
+        return JSONResponse({"error": "items must be a list"}, status_code=400)
+    if len(items) > models.BULK_MAX_ITEMS:
+        return JSONResponse(
+            {"error": f"At most {models.BULK_MAX_ITEMS} items per request"}, status_code=413
+        )
+    results = await models.bulk_write(entity_type, items)
+    failed = sum(not r["ok"] for r in results)
+    return {"results": results, "succeeded": len(results) - failed, "failed": failed}
+
+
+# ── Archive ────────────────────────────────────────────
+
+@router.get("/archive")
+async def list_archived(kind: str = ""):
+    """Archived projects, plans and PRDs (``?kind=`` one of them), newest first."""
+    if kind and kind not in _BULK_KINDS:
+        return JSONResponse({"error": f"kind must be one of {', '.join(_BULK_KINDS)}"}, status_code=404)
+    return {"archived": await models.list_archived(_BULK_KINDS.get(kind))}
+
+
+@router.post("/{kind}/{entity_id}/archive")
+async def archive_entity(kind: str, entity_id: int):
+    """Move a project, plan or PRD (with everything under it) to the archive tier."""
+    entity_type = _BULK_KINDS.get(kind)
+    if entity_type is None:
+        return JSONResponse({"error": f"kind must be one of {', '.join(_BULK_KINDS)}"}, status_code=404)
+    if await models.archive(entity_type, entity_id) is None and not await models.get_archived(entity_type, entity_id):
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    return RedirectResponse(f"{BASE_PATH}/{kind}/{entity_id}", status_code=303)
+
+
+@router.post("/{kind}/{entity_id}/unarchive")
+async def unarchive_entity(kind: str, entity_id: int):
+    """Restore an archived project, plan or PRD, and whatever was archived with it."""
+    entity_type = _BULK_KINDS.get(kind)
+    if entity_type is None:
+        return JSONResponse({"error": f"kind must be one of {', '.join(_BULK_KINDS)}"}, status_code=404)
+    try:
+        restored = await models.unarchive(entity_type, entity_id)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=409)
+    if restored is None:
+        return JSONResponse({"error": "Not archived"}, status_code=404)
+    return RedirectResponse(f"{BASE_PATH}/{kind}/{entity_id}", status_code=303)
+
+
+# ── Export / Import ────────────────────────────────────
+
+EXPORT_FLUSH_BYTES = 64 * 1024
+
+
+@router.get("/export")
+async def export_portfolio(versions: bool = False):
+    """Stream every project, plan, PRD and AI session (``?versions=true`` adds
+    version history) as NDJSON."""
+
+    async def body():
+        chunk = []
+        size = 0
+        async for line in models.export_rows(versions):
+            encoded = json.dumps(line, separators=(",", ":")) + "\n"
+            chunk.append(encoded)
+            size += len(encoded)
+            if size >= EXPORT_FLUSH_BYTES:
+                yield "".join(chunk)
+                chunk, size = [], 0
+        yield "".join(chunk)
+
+    filename = f"productai-export-{date.today().isoformat()}.ndjson"
+    return StreamingResponse(body(), media_type="application/x-ndjson",
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+async def _lines(stream):
+    """Split a byte stream into lines without buffering more than one line."""
+    pending = b""
+    async for chunk in stream:
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+@router.post("/import")
+async def import_portfolio(request: Request, id: str = ""):
+    """Import an NDJSON export from the request body, in committed batches.
+
+    Pass ``?id=`` to make the import resumable: posting the same file again
+    under the same id continues after the last committed line, and
+    ``GET /api/imports/{id}`` reports progress while it runs.
+    """
+    import_id = id or uuid.uuid4().hex
+    result = await models.import_lines(import_id, _lines(request.stream()))
+    return JSONResponse(result, status_code=200 if result["status"] == "done" else 422)
+
+
+@router.get("/imports/{import_id}")
+async def import_status(import_id: str):
+    result = await models.get_import(import_id)
+    if result is None:
+        return JSONResponse({"error": "Import not found"}, status_code=404)
+    return result
+
+
+# ── Version Diffs ──────────────────────────────────────
+
+@router.get("/versions/{version_id}/diff")
+async def version_diff(version_id: int, against: int | None = None):
+    """Field-by-field diff from version ``against`` (default: the previous
+    version of the same entity) to ``version_id``, with line and word ops for
+    long text."""
+    old, new = await models.get_version_pair(version_id, against)
+    if new is None or (against is not None and old is None):
+        return JSONResponse({"error": "Version not found"}, status_code=404)
+    if old is not None and (old["entity_type"], old["entity_id"]) != (new["entity_type"], new["entity_id"]):
+        return JSONResponse({"error": "Versions belong to different entities"}, status_code=400)
+    return await asyncio.to_thread(diff.version_diff, old, new)
+
+
+# ── Point-in-Time ──────────────────────────────────────
+
+@router.get("/as-of")
+async def portfolio_as_of(at: str, project_id: int | None = None):
+    """Projects, plans and PRDs as they were at ``at`` (ISO date or datetime,
+    UTC unless it has an offset; a date means the end of that day), rebuilt
+    from version history. ``project_id`` limits it to one project's subtree."""
+    try:
+        timestamp = models.as_of_timestamp(at)
+    except ValueError:
+        return JSONResponse({"error": "at must be an ISO date or datetime"}, status_code=400)
+    return await models.portfolio_as_of(timestamp, project_id)
+
+
+# ── Change Feed ────────────────────────────────────────
+
+@router.get("/changes")
+async def change_feed(request: Request, after: int | None = None):
+    """Server-sent events for every project, plan, PRD and setting change.
+
+    Events carry ``seq`` (also the SSE id), ``type``, ``id``, ``version``,
+    ``op`` (create/update/delete), the changed ``fields`` and a ``data``
+    summary of the entity. Resumes after ``Last-Event-ID`` or ``?after=``;
+    without either, starts from now.
+    """
+    raw = request.headers.get("last-event-id", "")
+    if raw.isdigit():
+        after = int(raw)
+    return sse.response(changes.feed.subscribe(after))
+
+
 # ── Admin Settings ─────────────────────────────────────
 
 @router.post("/admin/settings")
@@ -106,6 +297,11 @@ async def update_settings(request: Request):
         value = form.get(key, "").strip()
         if value:
             await models.update_setting(key, value)
+    for mode in MODES:
+        value = form.get(setting_key(mode), "").strip()
+        if value:
+            await models.update_setting(setting_key(mode), value)
+    model_router.invalidate()
     # API key (only stored when no env var is set)
     api_key = form.get("anthropic_api_key", "").strip()
     if api_key:
@@ -127,8 +323,154 @@ async def autocomplete_words(request: Request):
     return {"suggestions": suggestions, "prefix": prefix}
 
 
+@router.get("/autocomplete/status")
+async def autocomplete_status():
+    """Whether the full index is loaded (suggestions are degraded until then)."""
+    return ac.status()
+
+
+@router.post("/admin/autocomplete/reload")
+async def reload_autocomplete():
+    """Reload the index file (or recompile it) without pausing lookups."""
+    await ac.reload()
+    return ac.status()
+
+
+@router.websocket("/autocomplete/ws")
+async def autocomplete_ws(websocket: WebSocket):
+    """Long-lived suggestion channel for the editor.
+
+    The client sends ``{"i": id, "p": prefix, "c": context, "l": limit}`` per
+    keystroke and receives ``{"i": id, "s": suggestions}``. Only the newest
+    pending request is answered: one superseded by a later keystroke before
+    it was processed is dropped.
+    """
+    await websocket.accept()
+    latest: dict | None = None
+    pending = asyncio.Event()
+
+    async def answer():
+        nonlocal latest
+        try:
+            while True:
+                await pending.wait()
+                pending.clear()
+                request, latest = latest, None
+                suggestions = ac.get_suggestions(request["p"], request["c"], request["l"])
+                await websocket.send_text(json.dumps({"i": request["i"], "s": suggestions}, separators=(",", ":")))
+        except WebSocketDisconnect:
+            pass
+        except Exception:
+            # Closing makes the client fall back to POST instead of waiting
+            # on a channel nobody answers; the receive loop ends with it.
+            log.exception("Autocomplete WebSocket failed")
+            if websocket.application_state == WebSocketState.CONNECTED:
+                await websocket.close(code=1011)
+
+    responder = asyncio.create_task(answer())
+    try:
+        while True:
+            msg = json.loads(await websocket.receive_text())
+            latest = {
+                "i": msg.get("i"),
+                "p": str(msg.get("p", "")),
+                "c": str(msg["c"]) if msg.get("c") else None,
+                "l": min(int(msg.get("l", 8)), 15),
+            }
+            pending.set()
+    except WebSocketDisconnect:
+        pass
+    except (ValueError, TypeError, AttributeError):
+        if websocket.application_state == WebSocketState.CONNECTED:
+            await websocket.close(code=1003)  # malformed message; the client falls back to POST
+    finally:
+        responder.cancel()
+        await asyncio.gather(responder, return_exceptions=True)
+
+
+def _shard_response(body: bytes, version: str) -> Response:
+    """Versioned URLs are immutable; anything else must revalidate."""
+    current = ac.shard_version()
+    cache = "public, max-age=31536000, immutable" if version == current else "no-cache"
+    return Response(body, media_type="application/json",
+                    headers={"Cache-Control": cache, "ETag": f'"{current}"'})
+
+
+@router.get("/autocomplete/shards/{key}")
+async def autocomplete_shard(key: str, v: str = ""):
+    """Ranked words under a two-letter prefix, for client-side suggestions."""
+    body = ac.shard(key)
+    if body is None:
+        return JSONResponse({"error": "Shard keys are two lowercase ASCII letters"}, status_code=404)
+    return _shard_response(body, v)
+
+
+@router.get("/autocomplete/learned")
+async def autocomplete_learned(request: Request):
+    """N-gram counts learned from our documents, as last published (see
+    ``ngrams.NgramModel.snapshot``); revalidate with ``If-None-Match``."""
+    version, body = ngrams.model.snapshot()
+    etag = f'"{version}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(body, media_type="application/json", headers={"Cache-Control": "no-cache", "ETag": etag})
+
+
+@router.get("/autocomplete/associations")
+async def autocomplete_associations(v: str = ""):
+    """Context word associations used to boost client-side suggestions."""
+    return _shard_response(ac.associations(), v)
+
+
 # ── AI Streaming Endpoints ─────────────────────────────
 
+def _client_id(request: Request) -> str:
+    """Identify the caller for per-client fairness.
+
+    ``X-Forwarded-For`` is only believed when the peer is one of
+    ``TRUSTED_PROXIES``; the caller is then the nearest hop that is not a
+    trusted proxy itself, since anything further left is client-supplied.
+    """
+    host = request.client.host if request.client else "unknown"
+    if host in TRUSTED_PROXIES:
+        hops = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+        for hop in reversed(hops):
+            if hop not in TRUSTED_PROXIES:
+                return hop
+    return host
+
+
+def _start_stream(produce, ticket: Ticket) -> streams.BufferedStream:
+    """``streams.start``, releasing ``ticket`` when the producer task ends,
+    including when it is cancelled before it ever runs."""
+    stream = streams.start(produce)
+    stream.task.add_done_callback(lambda _: ticket.release())
+    return stream
+
+
+def _overloaded(exc: SchedulerOverloaded) -> JSONResponse:
+    return JSONResponse(
+        {"error": str(exc)},
+        status_code=429,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+async def _queue_events(ticket: Ticket):
+    """Events reporting queue position until the ticket is granted."""
+    async for position in ticket.wait():
+        yield {"queued": position}
+
+
+def _last_event_id(request: Request) -> int:
+    raw = request.headers.get("last-event-id") or request.query_params.get("last_event_id", "")
+    return int(raw) if raw.isdigit() else 0
+
+
+def _stream_response(stream: streams.BufferedStream, after: int = 0):
+    return sse.response(stream.subscribe(after), headers={"X-Stream-Id": stream.id})
+
+
 @router.post("/ai/enhance")
 async def enhance_field_stream(request: Request):
     """Stream AI-enhanced version of a text field."""
@@ -144,15 +486,29 @@ async def enhance_field_stream(request: Request):
     if intensity not in ("light", "medium", "heavy"):
         intensity = "medium"
 
+    try:
+        ticket = scheduler.submit(_client_id(request), PRIORITY_BULK)
+    except SchedulerOverloaded as exc:
+        return _overloaded(exc)
+
     async def event_stream():
-        full_response = []
-        async for token in ai_service.stream_enhance_field(text, field_label, intensity, instruction):
-            full_response.append(token)
-            yield f"data: {json.dumps({'token': token})}\n\n"
+        try:
+            async for event in _queue_events(ticket):
+                yield event
+            full_response = []
+            async for token in ai_service.stream_enhance_field(text, field_label, intensity, instruction):
+                full_response.append(token)
+                yield {"token": token}
+        except Exception as exc:
+            # e.g. a first-token/inter-token timeout; end the stream cleanly
+            yield {"done": True, "error": str(exc)}
+            return
+        finally:
+            ticket.release()
         complete = "".join(full_response)
-        yield f"data: {json.dumps({'done': True, 'content': complete})}\n\n"
+        yield {"done": True, "content": complete}
 
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+    return sse.response(event_stream(), on_close=ticket.release)
 
 
 @router.post("/ai/enhance-selection")
@@ -171,17 +527,108 @@ async def enhance_selection_stream(request: Request):
     if intensity not in ("light", "medium", "heavy"):
         intensity = "medium"
 
+    try:
+        ticket = scheduler.submit(_client_id(request), PRIORITY_BULK)
+    except SchedulerOverloaded as exc:
+        return _overloaded(exc)
+
     async def event_stream():
-        full_response = []
-        async for token in ai_service.stream_enhance_selection(
-            full_text, selected_text, field_label, intensity, instruction
-        ):
-            full_response.append(token)
-            yield f"data: {json.dumps({'token': token})}\n\n"
+        try:
+            async for event in _queue_events(ticket):
+                yield event
+            full_response = []
+            async for token in ai_service.stream_enhance_selection(
+                full_text, selected_text, field_label, intensity, instruction
+            ):
+                full_response.append(token)
+                yield {"token": token}
+        except Exception as exc:
+            # e.g. a first-token/inter-token timeout; end the stream cleanly
+            yield {"done": True, "error": str(exc)}
+            return
+        finally:
+            ticket.release()
         complete = "".join(full_response)
-        yield f"data: {json.dumps({'done': True, 'content': complete})}\n\n"
+        yield {"done": True, "content": complete}
+
+    return sse.response(event_stream(), on_close=ticket.release)
+
+
+@router.post("/ai/enhance-batch")
+async def enhance_batch_stream(request: Request):
+    """Enhance several fields concurrently, interleaving their tokens on one SSE stream.
+
+    Expects a ``fields`` form value holding a JSON list of ``{name, label, text}``.
+    Token events are tagged with ``field``; each field ends with a ``field_done``
+    event and the stream ends with ``done`` carrying every field's content.
+    """
+    form = await request.form()
+    intensity = form.get("intensity", "medium")
+    instruction = form.get("instruction", "").strip()
+    try:
+        fields = json.loads(form.get("fields", "[]"))
+    except ValueError:
+        fields = []
+    fields = [
+        f for f in fields
+        if isinstance(f, dict) and f.get("name") and str(f.get("text") or "").strip()
+    ]
+
+    if not fields:
+        return HTMLResponse("")
 
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+    if intensity not in ("light", "medium", "heavy"):
+        intensity = "medium"
+
+    client_id = _client_id(request)
+
+    async def event_stream():
+        events: asyncio.Queue = asyncio.Queue()
+        pending = list(fields)
+        contents: dict[str, str] = {}
+
+        async def worker():
+            while pending:
+                field = pending.pop(0)
+                name = field["name"]
+                try:
+                    ticket = scheduler.submit(client_id, PRIORITY_BULK)
+                except SchedulerOverloaded as exc:
+                    await events.put({"field": name, "error": str(exc)})
+                    continue
+                try:
+                    async for position in ticket.wait():
+                        await events.put({"field": name, "queued": position})
+                    parts = []
+                    async for token in ai_service.stream_enhance_field(
+                        str(field["text"]).strip(), field.get("label") or name, intensity, instruction
+                    ):
+                        parts.append(token)
+                        await events.put({"field": name, "token": token})
+                    contents[name] = "".join(parts)
+                    await events.put({"field": name, "field_done": True, "content": contents[name]})
+                except Exception as exc:
+                    # One failing field must not take the rest of the batch down.
+                    await events.put({"field": name, "error": str(exc)})
+                finally:
+                    ticket.release()
+
+        workers = [
+            asyncio.create_task(worker())
+            for _ in range(min(ENHANCE_BATCH_CONCURRENCY, len(fields)))
+        ]
+        asyncio.gather(*workers, return_exceptions=True).add_done_callback(
+            lambda _: events.put_nowait(None)
+        )
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+        finally:
+            for w in workers:
+                w.cancel()
+        yield {"done": True, "contents": contents}
+
+    return sse.response(event_stream())
 
 
 @router.post("/ai/plan/{plan_id}/chat")
@@ -192,8 +639,17 @@ async def plan_chat_stream(plan_id: int, request: Request):
     if not user_message:
         return HTMLResponse("")
 
+    try:
+        ticket = scheduler.submit(_client_id(request), PRIORITY_INTERACTIVE)
+    except SchedulerOverloaded as exc:
+        return _overloaded(exc)
+
     # Save user message
-    messages = await models.append_session_message("plan", plan_id, "user", user_message)
+    try:
+        messages = await models.append_session_message("plan", plan_id, "user", user_message)
+    except BaseException:
+        ticket.release()
+        raise
 
     # Build Claude messages format
     claude_messages = [
@@ -201,19 +657,31 @@ async def plan_chat_stream(plan_id: int, request: Request):
         for m in messages
     ]
 
-    async def event_stream():
+    async def produce(stream: streams.BufferedStream):
         full_response = []
-        async for token in ai_service.stream_plan_chat(claude_messages):
-            full_response.append(token)
-            escaped = token.replace("\n", "\\n").replace('"', '\\"')
-            yield f"data: {json.dumps({'token': token})}\n\n"
-
-        # Save assistant response
-        complete = "".join(full_response)
-        await models.append_session_message("plan", plan_id, "assistant", complete)
-        yield f"data: {json.dumps({'done': True})}\n\n"
-
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+        finished = False
+        try:
+            async for event in _queue_events(ticket):
+                stream.publish(event)
+            renderer = IncrementalRenderer()
+            async for token in ai_service.stream_plan_chat(claude_messages):
+                full_response.append(token)
+                stream.publish({"token": token})
+                html = renderer.feed(token)
+                if html:
+                    stream.publish({"html": html, "offset": renderer.offset})
+            stream.publish({"html": renderer.finish(), "offset": renderer.offset})
+            finished = True
+        finally:
+            ticket.release()
+            # Save assistant response; one cut short by an error is kept, marked incomplete
+            if finished or full_response:
+                await models.append_session_message(
+                    "plan", plan_id, "assistant", "".join(full_response), incomplete=not finished
+                )
+        stream.publish({"done": True})
+
+    return _stream_response(_start_stream(produce, ticket))
 
 
 @router.post("/ai/prd/generate")
@@ -225,19 +693,33 @@ async def prd_generate_stream(request: Request):
 
     if not context:
         return HTMLResponse("")
+    if prd_id and not prd_id.isdigit():
+        return JSONResponse({"error": "prd_id must be a number"}, status_code=400)
 
-    async def event_stream():
+    try:
+        ticket = scheduler.submit(_client_id(request), PRIORITY_BULK)
+    except SchedulerOverloaded as exc:
+        return _overloaded(exc)
+
+    async def produce(stream: streams.BufferedStream):
         full_response = []
-        async for token in ai_service.stream_prd_generation(context):
-            full_response.append(token)
-            yield f"data: {json.dumps({'token': token})}\n\n"
+        finished = False
+        try:
+            async for event in _queue_events(ticket):
+                stream.publish(event)
+            async for token in ai_service.stream_prd_generation(context):
+                full_response.append(token)
+                stream.publish({"token": token})
+            finished = True
+        finally:
+            ticket.release()
+            # Save what was generated; on an error streams publishes the error event
+            if prd_id and (finished or full_response):
+                await models.update_prd(int(prd_id), content="".join(full_response))
 
-        complete = "".join(full_response)
-        if prd_id:
-            await models.update_prd(int(prd_id), content=complete)
-        yield f"data: {json.dumps({'done': True, 'content': complete})}\n\n"
+        stream.publish({"done": True, "content": "".join(full_response)})
 
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+    return _stream_response(_start_stream(produce, ticket))
 
 
 @router.post("/ai/prd/{prd_id}/chat")
@@ -248,27 +730,70 @@ async def prd_chat_stream(prd_id: int, request: Request):
     if not user_message:
         return HTMLResponse("")
 
-    prd = await models.get_prd(prd_id)
-    messages = await models.append_session_message("prd", prd_id, "user", user_message)
+    try:
+        ticket = scheduler.submit(_client_id(request), PRIORITY_INTERACTIVE)
+    except SchedulerOverloaded as exc:
+        return _overloaded(exc)
+
+    try:
+        prd = await models.get_prd(prd_id)
+        messages = await models.append_session_message("prd", prd_id, "user", user_message)
+    except BaseException:
+        ticket.release()
+        raise
 
     claude_messages = [
         {"role": m["role"], "content": m["content"]}
         for m in messages
     ]
 
-    async def event_stream():
+    async def produce(stream: streams.BufferedStream):
         full_response = []
-        async for token in ai_service.stream_prd_refinement(
-            prd["content"] or "", user_message, claude_messages[:-1]
-        ):
-            full_response.append(token)
-            yield f"data: {json.dumps({'token': token})}\n\n"
-
-        complete = "".join(full_response)
-        await models.append_session_message("prd", prd_id, "assistant", complete)
-        yield f"data: {json.dumps({'done': True})}\n\n"
-
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+        finished = False
+        try:
+            async for event in _queue_events(ticket):
+                stream.publish(event)
+            renderer = IncrementalRenderer()
+            async for token in ai_service.stream_prd_refinement(
+                prd["content"] or "", user_message, claude_messages[:-1]
+            ):
+                full_response.append(token)
+                stream.publish({"token": token})
+                html = renderer.feed(token)
+                if html:
+                    stream.publish({"html": html, "offset": renderer.offset})
+            stream.publish({"html": renderer.finish(), "offset": renderer.offset})
+            finished = True
+        finally:
+            ticket.release()
+            if finished or full_response:
+                await models.append_session_message(
+                    "prd", prd_id, "assistant", "".join(full_response), incomplete=not finished
+                )
+        stream.publish({"done": True})
+
+    return _stream_response(_start_stream(produce, ticket))
+
+
+@router.get("/ai/streams/{stream_id}")
+async def resume_stream(stream_id: str, request: Request):
+    """Replay a buffered AI stream after ``Last-Event-ID`` and follow it live."""
+    stream = streams.get(stream_id)
+    if stream is None:
+        return JSONResponse({"error": "Stream not found or expired"}, status_code=404)
+    return _stream_response(stream, _last_event_id(request))
+
+
+# ── Telemetry ─────────────────────────────────────────
+
+@router.get("/telemetry/ai")
+async def ai_telemetry(window: str = "1h"):
+    """AI call stats per mode and model: TTFT/duration percentiles, tokens, cost."""
+    if window not in telemetry.WINDOWS:
+        return JSONResponse(
+            {"error": f"window must be one of {', '.join(telemetry.WINDOWS)}"}, status_code=400
+        )
+    return await telemetry.summary(window)
 
 
 # ── Mindmap Data ──────────────────────────────────────
@@ -276,6 +801,7 @@ async def prd_chat_stream(prd_id: int, request: Request):
 @router.get("/mindmap/data")
 async def mindmap_data():
     """Return project hierarchy as a mindmap tree structure."""
+    seq = await changes.head()  # before reading, so the feed replays anything newer
     projects = await models.list_projects()
     all_plans = await models.list_plans()
     all_prds = await models.list_prds()
@@ -296,6 +822,7 @@ async def mindmap_data():
             "name": prd["title"],
             "description": prd.get("overview") or prd.get("problem_statement") or "",
             "_type": "prd",
+            "_id": prd["id"],
             "_url": f"{BASE_PATH}/prds/{prd['id']}",
             "_status": prd.get("status", "draft"),
         }
@@ -306,6 +833,7 @@ async def mindmap_data():
             "name": plan["title"],
             "description": plan.get("description") or plan.get("vision") or "",
             "_type": "plan",
+            "_id": plan["id"],
             "_url": f"{BASE_PATH}/plans/{plan['id']}",
             "_status": plan.get("status", "active"),
             "expanded": True,
@@ -319,6 +847,7 @@ async def mindmap_data():
             "name": project["title"],
             "description": project.get("description") or "",
             "_type": "project",
+            "_id": project["id"],
             "_url": f"{BASE_PATH}/projects/{project['id']}",
             "_status": project.get("status", "active"),
             "_priority": project.get("priority"),
@@ -334,6 +863,7 @@ async def mindmap_data():
         root_children.append({
             "name": "Unlinked Plans",
             "_type": "section",
+            "_section": "plan",
             "expanded": False,
             "children": [plan_node(p) for p in orphan_plans],
         })
@@ -344,6 +874,7 @@ async def mindmap_data():
         root_children.append({
             "name": "Unlinked PRDs",
             "_type": "section",
+            "_section": "prd",
             "expanded": False,
             "children": [prd_node(p) for p in orphan_prds],
         })
@@ -351,6 +882,7 @@ async def mindmap_data():
     return {
         "name": "ProductAI",
         "_type": "root",
+        "_seq": seq,
         "_url": f"{BASE_PATH}/",
         "expanded": True,
         "children": root_children if root_children else None,
@@ -1,22 +1,74 @@
 """Page routes — serve HTML templates."""
 
+import asyncio
 import json
 import os
+import jinja2
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from pathlib import Path
-from ..db import models
+from .. import diff, metrics
+from ..db import changes, models
+from ..ai import autocomplete as ac
+from ..ai import fuzzy
+from ..ai import telemetry
+from ..ai.routing import MODES, router as model_router, setting_key
+from ..render import render_field, render_history
 
 BASE_PATH = os.environ.get("BASE_PATH", "").rstrip("/")
+# Compiled templates persist here across restarts ("" disables the cache)
+TEMPLATE_CACHE_DIR = os.environ.get(
+    "TEMPLATE_CACHE_DIR", str(Path(__file__).parent.parent / "data" / "template-cache")
+)
+
+
+class _TimedTemplate(jinja2.Template):
+    """Template whose rendering time counts towards the request's Server-Timing."""
+
+    def render(self, *args, **kwargs):
+        with metrics.timed("template"):
+            return super().render(*args, **kwargs)
+
 
 router = APIRouter()
 templates = Jinja2Templates(directory=Path(__file__).parent.parent / "templates")
+templates.env.template_class = _TimedTemplate
+if TEMPLATE_CACHE_DIR:
+    try:
+        os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+        templates.env.bytecode_cache = jinja2.FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+    except OSError:
+        pass  # read-only install: compile templates in memory as before
 templates.env.globals["base_path"] = BASE_PATH
+templates.env.globals["render_field"] = render_field
+templates.env.globals["autocomplete_version"] = ac.shard_version
+templates.env.globals["fuzzy_min_length"] = fuzzy.MIN_LENGTH
+
+
+def warm_templates():
+    """Load every template (from the bytecode cache when it is current), so no
+    request compiles one. Runs in a thread after startup."""
+    for name in templates.env.list_templates(extensions=["html"]):
+        templates.env.get_template(name)
+
+
+async def _live_or_archived(entity_type: str, entity_id: int) -> dict | None:
+    """The entity's row, read through from the archive tier if it is archived
+    (the row then has an ``archived`` key)."""
+    getter = {"project": models.get_project, "plan": models.get_plan, "prd": models.get_prd}[entity_type]
+    return await getter(entity_id) or await models.get_archived(entity_type, entity_id)
+
+
+async def _version_number(entity: dict, entity_type: str) -> int:
+    if entity.get("archived"):
+        return entity["archived"]["version"]
+    return await models.get_current_version_number(entity_type, entity["id"])
 
 
 @router.get("/", response_class=HTMLResponse)
 async def dashboard(request: Request):
+    feed_seq = await changes.head()  # before reading, so the feed replays anything newer
     projects = await models.list_projects()
     all_plans = await models.list_plans()
     all_prds = await models.list_prds()
@@ -50,6 +102,7 @@ async def dashboard(request: Request):
             "projects": projects,
             "orphan_plans": orphan_plans,
             "orphan_prds": orphan_prds,
+            "feed_seq": feed_seq,
         },
     )
 
@@ -66,16 +119,21 @@ async def new_project_page(request: Request):
 
 @router.get("/projects/{project_id}", response_class=HTMLResponse)
 async def project_detail(request: Request, project_id: int):
-    project = await models.get_project(project_id)
+    project = await _live_or_archived("project", project_id)
     if not project:
         return HTMLResponse("<h1>Project not found</h1>", status_code=404)
-    plans = await models.list_plans(project_id=project_id)
-    # Gather PRDs for all linked plans
-    prds = []
-    for plan in plans:
-        plan_prds = await models.list_prds(plan_id=plan["id"])
-        prds.extend(plan_prds)
-    current_version = await models.get_current_version_number("project", project_id)
+    if project.get("archived"):
+        # Its plans and PRDs were archived with it
+        plans = await models.list_archived("plan", [project_id])
+        prds = await models.list_archived("prd", [plan["id"] for plan in plans])
+    else:
+        plans = await models.list_plans(project_id=project_id)
+        # Gather PRDs for all linked plans
+        prds = []
+        for plan in plans:
+            plan_prds = await models.list_prds(plan_id=plan["id"])
+            prds.extend(plan_prds)
+    current_version = await _version_number(project, "project")
     return templates.TemplateResponse(
         "pages/project_detail.html",
         {"request": request, "project": project, "plans": plans, "prds": prds, "current_version": current_version},
@@ -96,11 +154,11 @@ async def edit_project_page(request: Request, project_id: int):
 
 @router.get("/projects/{project_id}/versions", response_class=HTMLResponse)
 async def project_versions_page(request: Request, project_id: int):
-    project = await models.get_project(project_id)
+    project = await _live_or_archived("project", project_id)
     if not project:
         return HTMLResponse("<h1>Project not found</h1>", status_code=404)
     versions = await models.list_versions("project", project_id)
-    current_version = await models.get_current_version_number("project", project_id)
+    current_version = await _version_number(project, "project")
     return templates.TemplateResponse(
         "pages/versions.html",
         {
@@ -126,12 +184,15 @@ async def new_plan_page(request: Request):
 
 @router.get("/plans/{plan_id}", response_class=HTMLResponse)
 async def plan_detail(request: Request, plan_id: int):
-    plan = await models.get_plan(plan_id)
+    plan = await _live_or_archived("plan", plan_id)
     if not plan:
         return HTMLResponse("<h1>Plan not found</h1>", status_code=404)
-    project = await models.get_project(plan["project_id"]) if plan.get("project_id") else None
-    prds = await models.list_prds(plan_id=plan_id)
-    current_version = await models.get_current_version_number("plan", plan_id)
+    project = await _live_or_archived("project", plan["project_id"]) if plan.get("project_id") else None
+    if plan.get("archived"):
+        prds = await models.list_archived("prd", [plan_id])
+    else:
+        prds = await models.list_prds(plan_id=plan_id)
+    current_version = await _version_number(plan, "plan")
     return templates.TemplateResponse(
         "pages/plan_detail.html",
         {"request": request, "plan": plan, "project": project, "prds": prds, "current_version": current_version},
@@ -159,7 +220,7 @@ async def plan_chat_page(request: Request, plan_id: int):
     session = await models.get_or_create_session("plan", plan_id)
     return templates.TemplateResponse(
         "pages/plan_chat.html",
-        {"request": request, "plan": plan, "session": session},
+        {"request": request, "plan": plan, "history": render_history(session)},
     )
 
 
@@ -174,11 +235,11 @@ async def new_prd_page(request: Request):
 
 @router.get("/prds/{prd_id}", response_class=HTMLResponse)
 async def prd_detail(request: Request, prd_id: int):
-    prd = await models.get_prd(prd_id)
+    prd = await _live_or_archived("prd", prd_id)
     if not prd:
         return HTMLResponse("<h1>PRD not found</h1>", status_code=404)
-    plan = await models.get_plan(prd["plan_id"]) if prd["plan_id"] else None
-    current_version = await models.get_current_version_number("prd", prd_id)
+    plan = await _live_or_archived("plan", prd["plan_id"]) if prd["plan_id"] else None
+    current_version = await _version_number(prd, "prd")
     return templates.TemplateResponse(
         "pages/prd_detail.html",
         {"request": request, "prd": prd, "plan": plan, "current_version": current_version},
@@ -206,7 +267,7 @@ async def prd_chat_page(request: Request, prd_id: int):
     session = await models.get_or_create_session("prd", prd_id)
     return templates.TemplateResponse(
         "pages/prd_chat.html",
-        {"request": request, "prd": prd, "session": session},
+        {"request": request, "prd": prd, "history": render_history(session)},
     )
 
 
@@ -230,6 +291,41 @@ async def analytics_page(request: Request):
     )
 
 
+# ── Point-in-Time ──────────────────────────────────────
+
+@router.get("/as-of", response_class=HTMLResponse)
+async def as_of_page(request: Request, at: str = "", project_id: int | None = None):
+    portfolio, error = None, None
+    if at:
+        try:
+            portfolio = await models.portfolio_as_of(models.as_of_timestamp(at), project_id)
+        except ValueError:
+            error = "Enter a date, or a date and time."
+    return templates.TemplateResponse(
+        "pages/as_of.html",
+        {"request": request, "at": at, "project_id": project_id, "portfolio": portfolio,
+         "error": error, "projects": await models.list_projects()},
+    )
+
+
+# ── Archive ────────────────────────────────────────────
+
+@router.get("/archive", response_class=HTMLResponse)
+async def archive_page(request: Request):
+    # One group per archived root, with the plans and PRDs that went with it
+    groups: dict[tuple, dict] = {}
+    for entry in await models.list_archived():
+        group = groups.setdefault((entry["root_type"], entry["root_id"]), {"root": None, "members": []})
+        if (entry["entity_type"], entry["id"]) == (entry["root_type"], entry["root_id"]):
+            group["root"] = entry
+        else:
+            group["members"].append(entry)
+    return templates.TemplateResponse(
+        "pages/archive.html",
+        {"request": request, "groups": [g for g in groups.values() if g["root"]]},
+    )
+
+
 # ── Admin ──────────────────────────────────────────────
 
 @router.get("/admin", response_class=HTMLResponse)
@@ -238,7 +334,23 @@ async def admin_page(request: Request):
     has_env_key = bool(os.environ.get("ANTHROPIC_API_KEY", "").strip())
     return templates.TemplateResponse(
         "pages/admin.html",
-        {"request": request, "settings": settings, "has_env_key": has_env_key},
+        {
+            "request": request,
+            "settings": settings,
+            "has_env_key": has_env_key,
+            "model_routes": [(setting_key(mode), label) for mode, label in MODES.items()],
+            "model_stats": model_router.stats(),
+        },
+    )
+
+
+@router.get("/admin/telemetry", response_class=HTMLResponse)
+async def admin_telemetry_page(request: Request, window: str = "1h"):
+    if window not in telemetry.WINDOWS:
+        window = "1h"
+    return templates.TemplateResponse(
+        "pages/admin_telemetry.html",
+        {"request": request, "summary": await telemetry.summary(window), "windows": list(telemetry.WINDOWS)},
     )
 
 
@@ -246,11 +358,11 @@ async def admin_page(request: Request):
 
 @router.get("/plans/{plan_id}/versions", response_class=HTMLResponse)
 async def plan_versions_page(request: Request, plan_id: int):
-    plan = await models.get_plan(plan_id)
+    plan = await _live_or_archived("plan", plan_id)
     if not plan:
         return HTMLResponse("<h1>Plan not found</h1>", status_code=404)
     versions = await models.list_versions("plan", plan_id)
-    current_version = await models.get_current_version_number("plan", plan_id)
+    current_version = await _version_number(plan, "plan")
     return templates.TemplateResponse(
         "pages/versions.html",
         {
@@ -265,11 +377,11 @@ async def plan_versions_page(request: Request, plan_id: int):
 
 @router.get("/prds/{prd_id}/versions", response_class=HTMLResponse)
 async def prd_versions_page(request: Request, prd_id: int):
-    prd = await models.get_prd(prd_id)
+    prd = await _live_or_archived("prd", prd_id)
     if not prd:
         return HTMLResponse("<h1>PRD not found</h1>", status_code=404)
     versions = await models.list_versions("prd", prd_id)
-    current_version = await models.get_current_version_number("prd", prd_id)
+    current_version = await _version_number(prd, "prd")
     return templates.TemplateResponse(
         "pages/versions.html",
         {
@@ -292,3 +404,22 @@ async def version_snapshot_page(request: Request, version_id: int):
         "pages/version_detail.html",
         {"request": request, "version": version, "snapshot": snapshot},
     )
+
+
+@router.get("/versions/{version_id}/diff", response_class=HTMLResponse)
+async def version_diff_page(request: Request, version_id: int, against: int | None = None):
+    old, new = await models.get_version_pair(version_id, against)
+    if new is None or (against is not None and old is None):
+        return HTMLResponse("<h1>Version not found</h1>", status_code=404)
+    if old is not None and (old["entity_type"], old["entity_id"]) != (new["entity_type"], new["entity_id"]):
+        return HTMLResponse("<h1>Versions belong to different entities</h1>", status_code=400)
+    versions = await models.list_versions(new["entity_type"], new["entity_id"])
+    return templates.TemplateResponse(
+        "pages/version_diff.html",
+        {
+            "request": request,
+            "diff": await asyncio.to_thread(diff.version_diff, old, new),
+            "title": json.loads(new["snapshot"]).get("title", ""),
+            "versions": versions,
+        },
+    )
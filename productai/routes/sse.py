@@ -0,0 +1,183 @@
+"""Server-sent events framing shared by all streaming endpoints.
+
+Endpoints produce plain event dicts (``{'token': ...}``, ``{'queued': 2}``,
+``{'done': True, ...}``) and hand them to ``response``. Token events are
+coalesced into one frame per time window or size threshold (one frame per
+distinct metadata such as ``field``), so a long answer becomes a few dozen
+writes instead of thousands. Every other event flushes the pending frame and is
+sent as-is, which keeps ``done`` last and in order. Idle streams get a comment
+heartbeat so proxies don't cut them off.
+
+Sources may also yield ``(event_id, payload)`` pairs (see ``ai.streams``); the
+id of the newest event in a frame is then sent as the SSE ``id`` so a client
+can resume with ``Last-Event-ID``.
+"""
+
+import asyncio
+import json
+import os
+from collections import deque
+from collections.abc import AsyncIterable, AsyncGenerator, Callable
+from fastapi.responses import StreamingResponse
+
+FRAME_WINDOW = float(os.environ.get("SSE_FRAME_WINDOW_MS", "40")) / 1000
+FRAME_MAX_BYTES = int(os.environ.get("SSE_FRAME_MAX_BYTES", "2048"))
+HEARTBEAT_INTERVAL = float(os.environ.get("SSE_HEARTBEAT_SECONDS", "15"))
+
+HEARTBEAT = ": ping\n\n"
+
+
+class _Failure:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+_END = object()
+
+
+def format_event(payload: dict, event_id: int | None = None) -> str:
+    if event_id is None:
+        return f"data: {json.dumps(payload)}\n\n"
+    return f"id: {event_id}\ndata: {json.dumps(payload)}\n\n"
+
+
+async def coalesce(
+    events: AsyncIterable[dict] | AsyncIterable[tuple[int, dict]],
+    window: float = FRAME_WINDOW,
+    max_bytes: int = FRAME_MAX_BYTES,
+    heartbeat: float = HEARTBEAT_INTERVAL,
+) -> AsyncGenerator[str, None]:
+    """Frame an async stream of event dicts, merging consecutive token events.
+
+    The source is drained by a helper task into a deque so that a frame can be
+    flushed on a timer without cancelling (and thereby closing) the source.
+    While a frame is open, further tokens don't wake the writer; it sleeps until
+    the window closes unless a control event or a large backlog arrives.
+    """
+    buffer: deque = deque()
+    ready = asyncio.Event()
+    frame_open = False
+
+    async def pump():
+        try:
+            async for event in events:
+                buffer.append(event)
+                payload = event[1] if isinstance(event, tuple) else event
+                if not frame_open or "token" not in payload or len(buffer) >= 64:
+                    ready.set()
+        except Exception as exc:
+            buffer.append(_Failure(exc))
+        else:
+            buffer.append(_END)
+        ready.set()
+
+    loop = asyncio.get_running_loop()
+    producer = asyncio.create_task(pump())
+    # Open frames keyed by their non-token metadata, e.g. one per ``field``.
+    frames: dict[tuple, tuple[dict, list[str]]] = {}
+    size = 0
+    deadline = 0.0
+    last_id = None
+
+    def flush():
+        nonlocal size, frame_open
+        for i, (meta, parts) in enumerate(frames.values(), start=1):
+            # Only the last frame carries the id: it covers everything pending.
+            yield format_event(
+                {**meta, "token": "".join(parts)},
+                last_id if i == len(frames) else None,
+            )
+        frames.clear()
+        size = 0
+        frame_open = False
+
+    try:
+        while True:
+            if not buffer:
+                ready.clear()
+                frame_open = bool(frames)
+                timeout = max(0.0, deadline - loop.time()) if frames else heartbeat
+                try:
+                    async with asyncio.timeout(timeout):
+                        await ready.wait()
+                except TimeoutError:
+                    if frames:
+                        for frame in flush():
+                            yield frame
+                    else:
+                        yield HEARTBEAT
+                    continue
+
+            while buffer:
+                event = buffer.popleft()
+                if event is _END:
+                    for frame in flush():
+                        yield frame
+                    return
+                if isinstance(event, _Failure):
+                    raise event.exc
+                if isinstance(event, tuple):
+                    event_id, event = event
+                else:
+                    event_id = None
+
+                token = event.get("token")
+                if token is None:
+                    for frame in flush():
+                        yield frame
+                    yield format_event(event, event_id)
+                    continue
+
+                meta = {k: v for k, v in event.items() if k != "token"}
+                key = tuple(meta.items())
+                if not frames:
+                    deadline = loop.time() + window
+                if key in frames:
+                    frames[key][1].append(token)
+                else:
+                    frames[key] = (meta, [token])
+                size += len(token)
+                last_id = event_id
+                if size >= max_bytes:
+                    for frame in flush():
+                        yield frame
+
+            if frames and loop.time() >= deadline:
+                for frame in flush():
+                    yield frame
+    finally:
+        producer.cancel()
+
+
+class _EventStreamResponse(StreamingResponse):
+    """Runs ``on_close`` once the response is over, however it ended, even if
+    the client left before the event source was ever iterated."""
+
+    on_close: Callable[[], None] | None = None
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.on_close:
+                self.on_close()
+
+
+def response(
+    events: AsyncIterable[dict] | AsyncIterable[tuple[int, dict]],
+    headers: dict | None = None,
+    on_close: Callable[[], None] | None = None,
+    **kwargs,
+) -> StreamingResponse:
+    """Wrap an event stream in a coalescing ``text/event-stream`` response.
+
+    ``on_close`` (e.g. releasing a scheduler ticket) runs when the response
+    ends, since a source generator that never started has no ``finally``.
+    """
+    streaming = _EventStreamResponse(
+        coalesce(events, **kwargs),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **(headers or {})},
+    )
+    streaming.on_close = on_close
+    return streaming
@@ -27,8 +27,17 @@ if [ -z "${ANTHROPIC_API_KEY:-}" ]; then
     echo ""
 fi
 
+# Build the autocomplete index once; it is memory-mapped at startup
+INDEX_PATH="${AUTOCOMPLETE_INDEX_PATH:-productai/data/autocomplete.idx}"
+if [ ! -f "$INDEX_PATH" ]; then
+    echo "Building autocomplete index at ${INDEX_PATH}..."
+    uv run python -m productai.ai.autocomplete build --output "$INDEX_PATH"
+fi
+
 echo "Starting ProductAI on http://localhost:${PORT}"
 echo "Press Ctrl+C to stop"
 echo ""
 
+# One worker: AI stream resume (/api/ai/streams/{id}) is served from the
+# memory of the process that started the stream.
 uv run uvicorn productai.app:app --host 0.0.0.0 --port "$PORT" $RELOAD